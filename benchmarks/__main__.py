@@ -0,0 +1,74 @@
+"""
+Runs the pymoof benchmark suite.
+
+Usage::
+
+    python -m benchmarks [prefix ...] [--latency MS] [--json results.json]
+    python -m benchmarks --compare results.json --threshold 1.25
+
+Pass benchmark name prefixes such as ``crypto`` or ``client.get`` to run a subset. With
+``--compare``, exits with status 1 if any benchmark got slower than the threshold allows.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks import client  # noqa: F401
+from benchmarks import crypto  # noqa: F401
+from benchmarks import decoding  # noqa: F401
+from benchmarks import fleet  # noqa: F401
+from benchmarks import imports  # noqa: F401
+from benchmarks import resolution  # noqa: F401
+from benchmarks import telemetry  # noqa: F401
+from benchmarks.harness import compare
+from benchmarks.harness import Config
+from benchmarks.harness import dump
+from benchmarks.harness import run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("prefixes", nargs="*", help="only run benchmarks with these prefixes")
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated latency in ms")
+    parser.add_argument("--bikes", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--json", help="write machine readable results to this file")
+    parser.add_argument("--compare", help="results of a previous run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    config = Config(
+        iterations=args.iterations,
+        requests=args.requests,
+        latency=args.latency / 1000,
+        bikes=args.bikes,
+        max_concurrency=args.concurrency,
+    )
+    results = run(config, args.prefixes)
+
+    print(f"{'benchmark':50} {'mean':>12} {'p50':>12} {'p99':>12} {'ops/s':>12}")
+    for result in results:
+        print(
+            f"{result.name:50} "
+            f"{result.mean * 1e6:9.2f} us "
+            f"{result.percentile(50) * 1e6:9.2f} us "
+            f"{result.percentile(99) * 1e6:9.2f} us "
+            f"{1 / result.mean:12.0f}",
+        )
+
+    if args.json:
+        dump(config, results, args.json)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for regression in regressions:
+            print("Regression:", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
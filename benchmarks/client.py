@@ -0,0 +1,159 @@
+"""
+Every SX3Client getter and setter against a simulated bike with the configured latency, a
+whole bike snapshot versus reading the same characteristics one by one, acknowledged versus
+pipelined writes, an inventory sweep with and without a read cache, and the overhead of
+instrumentation on a getter with no latency.
+"""
+import functools
+
+from benchmarks.harness import benchmark
+from benchmarks.harness import Result
+from benchmarks.harness import time_awaits
+from pymoof.clients.sx3 import BellTone
+from pymoof.clients.sx3 import LockState
+from pymoof.clients.sx3 import SNAPSHOT_CHARACTERISTICS
+from pymoof.clients.sx3 import Sound
+from pymoof.clients.sx3 import SX3Client
+from pymoof.profiles.sx3 import SX3Profile
+from pymoof.simulators.sx3 import Simulator
+from pymoof.util import caching
+from pymoof.util.instrumentation import InMemoryInstrumentation
+from pymoof.util.instrumentation import NULL_INSTRUMENTATION
+
+KEY = "a" * 32
+
+
+def _operations(client):
+    return {
+        "authenticate": functools.partial(client.authenticate, force=True),
+        # Skipped, the client is already authenticated
+        "authenticate_again": client.authenticate,
+        "get_frame_number": client.get_frame_number,
+        "get_battery_level": client.get_battery_level,
+        "get_lock_state": client.get_lock_state,
+        "get_distance_travelled": client.get_distance_travelled,
+        "get_power_level": client.get_power_level,
+        "get_sound_volume": client.get_sound_volume,
+        "get_speed": client.get_speed,
+        "get_light_mode": client.get_light_mode,
+        "set_bell_tone": functools.partial(client.set_bell_tone, BellTone.BELL),
+        "set_lock_state": functools.partial(client.set_lock_state, LockState.LOCKED),
+        "set_power_level": functools.partial(client.set_power_level, 3),
+        "play_sound": functools.partial(client.play_sound, Sound.BEEP_POSITIVE),
+    }
+
+
+@benchmark("client")
+async def client(config):
+    simulator = Simulator(latency=config.latency, seed=0)
+    simulator.add_bike("bike", KEY, 1)
+
+    results = []
+    async with simulator.client("bike") as bleak_client:
+        sx3_client = SX3Client(bleak_client, KEY, 1)
+        await sx3_client.authenticate()
+
+        for name, operation in _operations(sx3_client).items():
+            samples = await time_awaits(operation, config.requests)
+            results.append(Result(f"client.{name}", samples, latency=config.latency))
+
+    return results
+
+
+@benchmark("snapshot")
+async def snapshot(config):
+    simulator = Simulator(latency=config.latency, seed=0)
+    simulator.add_bike("bike", KEY, 1)
+
+    async with simulator.client("bike") as bleak_client:
+        sx3_client = SX3Client(bleak_client, KEY, 1)
+        await sx3_client.authenticate()
+
+        async def one_by_one():
+            for characteristic in SNAPSHOT_CHARACTERISTICS:
+                await sx3_client.snapshot([characteristic])
+
+        requests = max(1, config.requests // len(SNAPSHOT_CHARACTERISTICS))
+        params = dict(latency=config.latency, characteristics=len(SNAPSHOT_CHARACTERISTICS))
+        return [
+            Result("snapshot.one_by_one", await time_awaits(one_by_one, requests), **params),
+            Result("snapshot.all", await time_awaits(sx3_client.snapshot, requests), **params),
+        ]
+
+
+@benchmark("writes")
+async def writes(config):
+    simulator = Simulator(latency=config.latency, seed=0)
+    simulator.add_bike("bike", KEY, 1)
+    commands = 10
+    tones = [BellTone.BELL, BellTone.PARTY]
+
+    async with simulator.client("bike") as bleak_client:
+        sx3_client = SX3Client(bleak_client, KEY, 1)
+        await sx3_client.authenticate()
+
+        def run(response):
+            # A batch of commands sharing one nonce, checked with a single read afterwards
+            async def operation():
+                await sx3_client.batch(
+                    functools.partial(sx3_client.set_bell_tone, tones[i % 2], response=response)
+                    for i in range(commands)
+                )
+                mismatches = await sx3_client.confirm({SX3Profile.Sound.BELL_SOUND: tones[1]})
+                assert not mismatches, mismatches
+
+            return operation
+
+        requests = max(1, config.requests // commands)
+        results = []
+        for name, response in (("acknowledged", True), ("pipelined", False)):
+            samples = await time_awaits(run(response), requests)
+            results.append(
+                Result(
+                    f"writes.{name}",
+                    [sample / commands for sample in samples],
+                    latency=config.latency,
+                    commands=commands,
+                ),
+            )
+        return results
+
+
+@benchmark("inventory")
+async def inventory(config):
+    simulator = Simulator(latency=config.latency, seed=0)
+    bike = simulator.add_bike("bike", KEY, 1)
+    bike.set_value(SX3Profile.Sound.BELL_SOUND, [BellTone.BELL.value])
+    characteristics = tuple(caching.DEFAULT_TTLS)
+
+    results = []
+    async with simulator.client("bike") as bleak_client:
+        for name, cache in (("uncached", None), ("cached", caching.ReadCache())):
+            sx3_client = SX3Client(bleak_client, KEY, 1, cache=cache)
+            await sx3_client.authenticate()
+            samples = await time_awaits(
+                lambda: sx3_client.snapshot(characteristics),
+                config.requests,
+            )
+            results.append(Result(f"inventory.{name}", samples, latency=config.latency))
+
+    return results
+
+
+@benchmark("instrumentation")
+async def instrumentation(config):
+    simulator = Simulator(seed=0)
+    simulator.add_bike("bike", KEY, 1)
+
+    results = []
+    async with simulator.client("bike") as bleak_client:
+        for name, metrics in (
+            ("none", NULL_INSTRUMENTATION),
+            ("in_memory", InMemoryInstrumentation()),
+        ):
+            sx3_client = SX3Client(bleak_client, KEY, 1, instrumentation=metrics)
+            await sx3_client.authenticate()
+            samples = await time_awaits(sx3_client.get_speed, config.iterations)
+            results.append(Result(f"instrumentation.{name}.get_speed", samples))
+
+    return results
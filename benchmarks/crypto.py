@@ -0,0 +1,103 @@
+"""
+The SX3Profile crypto hot path.
+
+``legacy`` is the original implementation, which created a new cipher context per call and
+padded payloads byte by byte, kept here as a baseline. ``current`` is
+``pymoof.profiles.sx3.SX3Profile``. The ``bulk`` benchmarks report time per record when
+decrypting recorded payloads one by one versus with the bulk APIs.
+"""
+import math
+
+from cryptography.hazmat.primitives.ciphers import algorithms
+from cryptography.hazmat.primitives.ciphers import Cipher
+from cryptography.hazmat.primitives.ciphers import modes
+
+from benchmarks.harness import benchmark
+from benchmarks.harness import Result
+from benchmarks.harness import time_calls
+from pymoof.profiles.sx3 import SX3Profile
+
+KEY = "a" * 32
+NONCE = b"\x12\x34"
+PAYLOAD = bytes(range(16))
+RECORDS = 1000
+
+
+class LegacyProfile:
+    def __init__(self, key: str, user_key_id: int) -> None:
+        self._cipher = Cipher(algorithms.AES(bytes.fromhex(key)), modes.ECB())
+        self._user_key_id = user_key_id
+
+    def build_authentication_payload(self, nonce: bytes) -> bytes:
+        encryptor = self._cipher.encryptor()
+
+        data = bytearray(16)
+        data[0:2] = nonce
+        data = bytearray(encryptor.update(data) + encryptor.finalize())
+        data.extend([0, 0, 0, self._user_key_id])
+
+        return bytes(data)
+
+    def decrypt_payload(self, data: bytes) -> bytes:
+        decryptor = self._cipher.decryptor()
+        return decryptor.update(data) + decryptor.finalize()
+
+    def build_encrypted_payload(self, nonce: bytes, data: bytes) -> bytes:
+        encryptor = self._cipher.encryptor()
+
+        payload = bytearray(16)
+        payload[0:2] = nonce
+        payload[2:] = data
+
+        for _ in range(math.ceil(len(payload) / 16) * 16 - len(payload)):
+            payload.append(0)
+
+        return bytes(encryptor.update(payload) + encryptor.finalize())
+
+
+def _operations(profile):
+    return {
+        "build_authentication_payload": lambda: profile.build_authentication_payload(NONCE),
+        "build_encrypted_payload": lambda: profile.build_encrypted_payload(NONCE, [0x1, 0x2]),
+        "decrypt_payload": lambda: profile.decrypt_payload(PAYLOAD),
+        "decrypt_payload_memoryview": lambda: profile.decrypt_payload(memoryview(PAYLOAD)),
+    }
+
+
+@benchmark("crypto.legacy")
+def legacy(config):
+    return [
+        Result(f"crypto.legacy.{name}", time_calls(operation, config.iterations))
+        for name, operation in _operations(LegacyProfile(KEY, 1)).items()
+    ]
+
+
+@benchmark("crypto.current")
+def current(config):
+    return [
+        Result(f"crypto.current.{name}", time_calls(operation, config.iterations))
+        for name, operation in _operations(SX3Profile(KEY, 1)).items()
+    ]
+
+
+@benchmark("crypto.bulk")
+def bulk(config):
+    profile = SX3Profile(KEY, 1)
+    payloads = [bytes(profile.encrypt_buffer(PAYLOAD)) for _ in range(RECORDS)]
+    buffer = b"".join(payloads)
+    batches = max(1, config.iterations // RECORDS)
+
+    operations = {
+        "decrypt_payload_loop": lambda: [profile.decrypt_payload(p) for p in payloads],
+        "decrypt_payloads": lambda: profile.decrypt_payloads(payloads),
+        "decrypt_buffer": lambda: profile.decrypt_buffer(buffer),
+    }
+
+    return [
+        Result(
+            f"crypto.bulk.{name}",
+            [sample / RECORDS for sample in time_calls(operation, batches * 5, batches=5)],
+            records=RECORDS,
+        )
+        for name, operation in operations.items()
+    ]
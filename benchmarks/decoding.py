@@ -0,0 +1,36 @@
+"""
+Decoding recorded payloads into values: the hand rolled ``int.from_bytes`` parser the client
+used before, ``codecs.decode`` per record, and ``codecs.decode_many`` over one buffer. Times
+are per record.
+"""
+from benchmarks.harness import benchmark
+from benchmarks.harness import Result
+from benchmarks.harness import time_calls
+from pymoof.profiles import codecs
+from pymoof.profiles.sx3 import SX3Profile
+
+RECORDS = 1000
+
+
+@benchmark("decoding")
+def decoding(config):
+    characteristic = SX3Profile.Movement.DISTANCE
+    payloads = [distance.to_bytes(4, "little").ljust(16, b"\x00") for distance in range(RECORDS)]
+    buffer = b"".join(payloads)
+    codec = codecs.CODECS[characteristic]
+    batches = max(1, config.iterations // RECORDS)
+
+    operations = {
+        "int_from_bytes": lambda: [int.from_bytes(p, "little") / 10 for p in payloads],
+        "decode": lambda: [codec.decode(p) for p in payloads],
+        "decode_many": lambda: codecs.decode_many(characteristic, buffer),
+    }
+
+    return [
+        Result(
+            f"decoding.{name}",
+            [sample / RECORDS for sample in time_calls(operation, batches * 5, batches=5)],
+            records=RECORDS,
+        )
+        for name, operation in operations.items()
+    ]
@@ -0,0 +1,173 @@
+"""
+Fleet scale concurrency: one command against every simulated bike through FleetManager.
+
+Each sample is the wall time of one ``run_all`` round over the whole fleet. The adapters
+benchmark compares a fixed round robin assignment of bikes to adapters with AdapterScheduler
+when one adapter is slow. The sharded benchmarks run rounds through ShardedFleet with 1, 2,
+4... worker processes, up to the number of cores, and report seconds per bike, so operations
+per second are bikes per second: ``latency`` reads one value with the configured latency,
+``cpu`` takes a full snapshot without latency, which is bound by decryption and decoding.
+"""
+import operator
+import os
+import statistics
+import time
+
+from benchmarks.harness import benchmark
+from benchmarks.harness import Result
+from pymoof.fleet.adapters import AdapterScheduler
+from pymoof.fleet.manager import FleetManager
+from pymoof.fleet.pool import ConnectionPool
+from pymoof.fleet.sharding import ShardedFleet
+from pymoof.simulators.sx3 import Simulator
+from pymoof.util.instrumentation import NULL_INSTRUMENTATION
+
+KEY = "a" * 32
+ROUNDS = 10
+
+
+@benchmark("fleet")
+async def fleet(config):
+    simulator = Simulator(latency=config.latency, seed=0)
+    for i in range(config.bikes):
+        simulator.add_bike(f"bike-{i}", KEY, 1)
+
+    async with FleetManager(simulator, max_concurrency=config.max_concurrency) as manager:
+        for address in simulator.bikes:
+            manager.add_bike(address, KEY, 1)
+
+        start = time.perf_counter()
+        await manager.connect_all()
+        connect = time.perf_counter() - start
+
+        samples = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            await manager.run_all(lambda client: client.get_battery_level())
+            samples.append(time.perf_counter() - start)
+
+    params = {
+        "bikes": config.bikes,
+        "max_concurrency": config.max_concurrency,
+        "latency": config.latency,
+    }
+    return [
+        Result("fleet.connect_all", [connect], **params),
+        Result("fleet.run_all.get_battery_level", samples, **params),
+    ]
+
+
+@benchmark("fleet.adapters")
+async def adapters(config):
+    # One of three adapters is four times slower, e.g. a dongle behind a busy USB hub
+    latency = config.latency or 0.002
+    simulator = Simulator(seed=0)
+    for i in range(config.bikes):
+        simulator.add_bike(f"bike-{i}", KEY, 1)
+    for i, slowdown in enumerate((1, 1, 4)):
+        simulator.add_adapter(f"hci{i}", latency=latency * slowdown)
+
+    def round_robin(address, **kwargs):
+        return simulator(address, adapter=f"hci{int(address.split('-')[1]) % 3}", **kwargs)
+
+    scheduler = AdapterScheduler(
+        simulator.adapters,
+        client_factory=simulator,
+        scan=simulator.discover,
+        max_latency=2 * latency,
+    )
+    await scheduler.discover()
+
+    results = []
+    for name, factory, instrumentation in (
+        ("round_robin", round_robin, NULL_INSTRUMENTATION),
+        ("scheduled", scheduler, scheduler.instrumentation()),
+    ):
+        pool = ConnectionPool(factory, instrumentation=instrumentation)
+        async with FleetManager(pool=pool, max_concurrency=config.max_concurrency) as manager:
+            for address in simulator.bikes:
+                manager.add_bike(address, KEY, 1)
+            await manager.connect_all()
+            # Bikes start spread evenly, until the slow adapter is measured and drained
+            await scheduler.rebalance(pool)
+
+            samples = []
+            for _ in range(ROUNDS):
+                start = time.perf_counter()
+                await manager.run_all(lambda client: client.get_battery_level())
+                samples.append(time.perf_counter() - start)
+
+        results.append(
+            Result(
+                f"fleet.adapters.{name}",
+                samples,
+                bikes=config.bikes,
+                max_concurrency=config.max_concurrency,
+                latency=latency,
+            ),
+        )
+    return results
+
+
+async def _sharded_round(config, simulator, workers, operation, name):
+    async with ShardedFleet(
+        simulator,
+        workers=workers,
+        max_concurrency=config.max_concurrency,
+    ) as fleet:
+        for address in simulator.bikes:
+            fleet.add_bike(address, KEY, 1)
+        await fleet.connect_all()
+
+        samples = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            results = await fleet.run_all(operation)
+            # Seconds per bike, so the reported operations per second are bikes per second
+            samples.append((time.perf_counter() - start) / config.bikes)
+            # Timing the error path instead would report meaningless numbers
+            errors = [result for result in results.values() if isinstance(result, BaseException)]
+            assert not errors, f"fleet.sharded.{name} failed: {errors[0]!r}"
+
+    bikes_per_second = 1 / statistics.mean(samples)
+    return Result(
+        f"fleet.sharded.{name}.workers_{workers}",
+        samples,
+        bikes=config.bikes,
+        workers=workers,
+        bikes_per_second=bikes_per_second,
+        bikes_per_second_per_worker=bikes_per_second / workers,
+        max_concurrency=config.max_concurrency,
+        latency=simulator.latency,
+    )
+
+
+@benchmark("fleet.sharded")
+async def sharded(config):
+    # Worker counts doubling up to the number of cores, to see how bikes per core scale
+    cores = os.cpu_count() or 1
+    counts = sorted({1, cores, *(2**i for i in range(cores.bit_length()) if 2**i < cores)})
+
+    # Waiting on the radio: one read per bike with the configured latency
+    waiting = Simulator(latency=config.latency, seed=0)
+    # CPU bound: no latency, and a snapshot decrypting and decoding every characteristic
+    busy = Simulator(seed=0)
+    for i in range(config.bikes):
+        waiting.add_bike(f"bike-{i}", KEY, 1)
+        busy.add_bike(f"bike-{i}", KEY, 1)
+
+    results = []
+    for workers in counts:
+        results.append(
+            await _sharded_round(
+                config,
+                waiting,
+                workers,
+                operator.methodcaller("get_battery_level"),
+                "latency",
+            ),
+        )
+        results.append(
+            await _sharded_round(config, busy, workers, operator.methodcaller("snapshot"), "cpu"),
+        )
+    return results
@@ -0,0 +1,188 @@
+"""
+A small benchmark harness with machine readable output.
+
+Benchmarks are functions registered with ``@benchmark`` that receive the run ``Config`` and
+return one or more ``Result`` objects. They may be coroutines.
+"""
+import asyncio
+import inspect
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+class Config:
+    """
+    Settings shared by every benchmark in a run.
+
+    :param iterations: Number of operations timed per CPU bound benchmark.
+    :param requests: Number of operations timed per benchmark against the simulator.
+    :param latency: Simulated round trip time in seconds for benchmarks against the simulator.
+    :param bikes: Number of simulated bikes for fleet benchmarks.
+    :param max_concurrency: Concurrency limit for fleet benchmarks.
+    """
+
+    def __init__(
+        self,
+        iterations: int = 10000,
+        requests: int = 200,
+        latency: float = 0.0,
+        bikes: int = 100,
+        max_concurrency: int = 8,
+    ) -> None:
+        self.iterations = iterations
+        self.requests = requests
+        self.latency = latency
+        self.bikes = bikes
+        self.max_concurrency = max_concurrency
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class Result:
+    """
+    Timing samples of one benchmark, in seconds per operation.
+    """
+
+    def __init__(self, name: str, samples: List[float], **params) -> None:
+        self.name = name
+        self.samples = sorted(samples)
+        self.params = params
+
+    def percentile(self, percent: float) -> float:
+        index = min(len(self.samples) - 1, int(len(self.samples) * percent / 100))
+        return self.samples[index]
+
+    @property
+    def mean(self) -> float:
+        return statistics.mean(self.samples)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "unit": "seconds",
+            "samples": len(self.samples),
+            "mean": self.mean,
+            "min": self.samples[0],
+            "median": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.samples[-1],
+            "ops_per_second": 1 / self.mean if self.mean else None,
+            "params": self.params,
+        }
+
+
+def benchmark(name: str):
+    """
+    Registers a benchmark function under a dotted name, e.g. ``crypto.decrypt_payload``.
+    """
+
+    def register(function):
+        if name in BENCHMARKS:
+            raise ValueError(f"Benchmark {name} is already registered")
+        BENCHMARKS[name] = function
+        return function
+
+    return register
+
+
+def time_calls(operation: Callable[[], object], iterations: int, batches: int = 20) -> List[float]:
+    """
+    Times a cheap synchronous operation in batches, returning the mean time per call of
+    each batch. Batching keeps timer overhead out of sub-microsecond measurements.
+    """
+    per_batch = max(1, iterations // batches)
+    samples = []
+    for _ in range(batches):
+        start = time.perf_counter()
+        for _ in range(per_batch):
+            operation()
+        samples.append((time.perf_counter() - start) / per_batch)
+    return samples
+
+
+async def time_awaits(operation: Callable[[], object], iterations: int) -> List[float]:
+    """
+    Times every call of an asynchronous operation, so tail latencies are visible.
+    """
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await operation()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _selects(name: str, selected: List[str]) -> bool:
+    return not selected or any(name.startswith(prefix) for prefix in selected)
+
+
+def run(config: Config, selected: List[str] = ()) -> List[Result]:
+    """
+    Runs the benchmarks whose results may match one of the ``selected`` prefixes, e.g.
+    ``client.get`` runs the ``client`` benchmark and keeps only its getter results.
+    """
+    results = []
+    for name, function in BENCHMARKS.items():
+        # A prefix may select the whole benchmark, or only some of the results it returns
+        if selected and not any(
+            name.startswith(prefix) or prefix.startswith(name) for prefix in selected
+        ):
+            continue
+
+        if inspect.iscoroutinefunction(function):
+            result = asyncio.run(function(config))
+        else:
+            result = function(config)
+
+        results.extend(
+            result
+            for result in (result if isinstance(result, list) else [result])
+            if _selects(result.name, selected)
+        )
+    return results
+
+
+def report(config: Config, results: List[Result]) -> dict:
+    """
+    Builds the machine readable report of a run.
+    """
+    return {
+        "created": time.time(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "config": config.to_dict(),
+        "results": [result.to_dict() for result in results],
+    }
+
+
+def dump(config: Config, results: List[Result], path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(report(config, results), f, indent=2)
+
+
+def compare(baseline: dict, results: List[Result], threshold: float) -> List[str]:
+    """
+    Compares results with a report written by a previous run.
+
+    :param baseline: A report as written by ``dump``.
+    :param threshold: Allowed ratio of new to old mean time, e.g. 1.25 for 25% slower.
+    :return: A description of every benchmark whose mean regressed beyond the threshold.
+    """
+    previous = {result["name"]: result["mean"] for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get(result.name)
+        if old and result.mean / old > threshold:
+            regressions.append(f"{result.name}: {old * 1e6:.2f} us -> {result.mean * 1e6:.2f} us")
+    return regressions
@@ -0,0 +1,43 @@
+"""
+Import time of pymoof modules in a fresh interpreter, as reported by ``python -X importtime``.
+Only the module's own cumulative time counts, not interpreter startup.
+"""
+import subprocess
+import sys
+
+from benchmarks.harness import benchmark
+from benchmarks.harness import Result
+
+MODULES = (
+    "pymoof",
+    "pymoof.clients.sx3_enums",
+    "pymoof.profiles.sx3",
+    "pymoof.clients.sx3",
+)
+
+# Every sample starts an interpreter, so take a fixed small number of them
+SAMPLES = 10
+
+
+def import_time(module: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stderr
+
+    # Lines look like "import time: <self us> | <cumulative us> | <indented name>"
+    for line in reversed(output.splitlines()):
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            return int(cumulative) / 1e6
+    raise RuntimeError(f"{module} was not imported")
+
+
+@benchmark("imports")
+def imports(config):
+    return [
+        Result(f"imports.{module}", [import_time(module) for _ in range(SAMPLES)])
+        for module in MODULES
+    ]
@@ -0,0 +1,56 @@
+"""
+Characteristic resolution: walking the GATT services on every call with
+``bleak_utils.get_characteristic`` versus the per-connection ``CharacteristicResolver``, and
+reading characteristic metadata through the enums versus the precomputed registry.
+"""
+from benchmarks.harness import benchmark
+from benchmarks.harness import Result
+from benchmarks.harness import time_awaits
+from benchmarks.harness import time_calls
+from pymoof.profiles.registry import SX3_CHARACTERISTICS
+from pymoof.profiles.sx3 import SX3Profile
+from pymoof.simulators.sx3 import Simulator
+from pymoof.util import bleak_utils
+
+
+@benchmark("resolution")
+async def resolution(config):
+    simulator = Simulator()
+    simulator.add_bike("bike", "a" * 32, 1)
+
+    async with simulator.client("bike") as gatt_client:
+        resolver = bleak_utils.CharacteristicResolver(gatt_client, SX3Profile.SERVICES)
+        char_uuid = SX3Profile.Defense.LOCK_STATE
+
+        return [
+            Result(
+                "resolution.get_characteristic",
+                await time_awaits(
+                    lambda: bleak_utils.get_characteristic(gatt_client, char_uuid),
+                    config.iterations,
+                ),
+            ),
+            Result(
+                "resolution.resolver",
+                await time_awaits(
+                    lambda: resolver.get_characteristic(char_uuid),
+                    config.iterations,
+                ),
+            ),
+        ]
+
+
+@benchmark("resolution.metadata")
+def metadata(config):
+    char_uuid = SX3Profile.Defense.LOCK_STATE
+
+    return [
+        Result(
+            "resolution.metadata.enum",
+            time_calls(lambda: (char_uuid.SERVICE_UUID.value, char_uuid.value), config.iterations),
+        ),
+        Result(
+            "resolution.metadata.registry",
+            time_calls(lambda: SX3_CHARACTERISTICS[char_uuid].service_uuid, config.iterations),
+        ),
+    ]
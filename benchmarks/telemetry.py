@@ -0,0 +1,44 @@
+"""
+Telemetry logs: appending records with ``TelemetryWriter`` and scanning a log with
+``TelemetryLog``, record by record and as a NumPy array. Times are per record.
+"""
+import tempfile
+
+from benchmarks.harness import benchmark
+from benchmarks.harness import Result
+from benchmarks.harness import time_calls
+from pymoof.telemetry.log import TelemetryLog
+from pymoof.telemetry.log import TelemetryWriter
+
+
+@benchmark("telemetry")
+def telemetry(config):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        with TelemetryWriter(directory, fsync_interval=1.0) as writer:
+            samples = time_calls(
+                lambda: writer.append(0.0, 1, distance=12.3, speed=25, battery=80, lock_state=1),
+                config.iterations,
+            )
+            results.append(Result("telemetry.append", samples))
+            path = writer.path
+
+        with TelemetryLog(path) as log:
+            count = len(log)
+            operations = {"records": lambda: list(log)}
+            try:
+                import numpy  # noqa: F401
+            except ImportError:
+                pass
+            else:
+                operations["numpy"] = lambda: log.to_numpy()["speed"].sum()
+
+            for name, operation in operations.items():
+                results.append(
+                    Result(
+                        f"telemetry.scan.{name}",
+                        [sample / count for sample in time_calls(operation, 5, batches=5)],
+                        records=count,
+                    ),
+                )
+    return results
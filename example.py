@@ -1,22 +1,25 @@
 import asyncio
-
-import bleak
+import getpass
 
 from pymoof.clients.sx3 import Sound
 from pymoof.clients.sx3 import SX3Client
-from pymoof.tools import discover_bike
+from pymoof.tools import address_cache
 from pymoof.tools import retrieve_encryption_key
 
 
 async def example():
     print("Getting key from vanmoof servers")
-    key, user_key_id = retrieve_encryption_key.query()
+    username = input("Username: ")
+    password = getpass.getpass()
+    async with retrieve_encryption_key.KeyClient() as key_client:
+        bikes = await key_client.fetch_keys(username, password)
+    key, user_key_id = bikes[0].encryption_key, bikes[0].user_key_id
 
-    print("Discovering nearby vanmoof bikes")
-    device = await discover_bike.query()
+    print("Connecting to the last used bike, or discovering nearby vanmoof bikes")
+    bleak_client = await address_cache.connect()
 
     print("Doing example commands")
-    async with bleak.BleakClient(device) as bleak_client:
+    try:
         client = SX3Client(bleak_client, key, user_key_id)
 
         print("Frame Number:", await client.get_frame_number())
@@ -29,6 +32,8 @@ async def example():
         print("Power level:", await client.get_power_level())
         print("Sound Volume:", await client.get_sound_volume())
         print("Lock State:", await client.get_lock_state())
+    finally:
+        await bleak_client.disconnect()
 
 
 asyncio.run(example())
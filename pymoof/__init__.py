@@ -0,0 +1,30 @@
+"""
+Connect to your Vanmoof S3/X3 bike.
+
+The names below are imported on first access, so ``import pymoof`` stays cheap for code that
+only needs a few enums.
+"""
+import importlib
+
+_LAZY = {
+    "BellTone": "pymoof.clients.sx3_enums",
+    "LockState": "pymoof.clients.sx3_enums",
+    "Sound": "pymoof.clients.sx3_enums",
+    "SX3Client": "pymoof.clients.sx3",
+    "SX3Profile": "pymoof.profiles.sx3",
+}
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -1,57 +1,312 @@
-from enum import Enum
-
-import bleak.backends.client
+from __future__ import annotations
 
+import asyncio
+import contextvars
+import time
+from enum import Enum
+from types import MappingProxyType
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+from typing import TYPE_CHECKING
+
+from pymoof.clients.sx3_enums import BellTone
+from pymoof.clients.sx3_enums import LockState
+from pymoof.clients.sx3_enums import Sound
+from pymoof.profiles.registry import SX3_CHARACTERISTICS
+from pymoof.profiles.sx3 import BLOCK_SIZE
 from pymoof.profiles.sx3 import SX3Profile
 from pymoof.util import bleak_utils
+from pymoof.util.caching import ReadCache
+from pymoof.util.instrumentation import Instrumentation
+from pymoof.util.instrumentation import NULL_INSTRUMENTATION
+from pymoof.util.scheduling import Priority
+from pymoof.util.scheduling import PriorityLock
+
+if TYPE_CHECKING:
+    import bleak.backends.client
+
+
+class AuthenticationError(Exception):
+    """
+    Raised when the bike accepted the authentication write but the session does not work,
+    usually because the encryption key or user key id is wrong.
+    """
+
+
+class Notification(NamedTuple):
+    """
+    A decrypted notification pushed by the bike.
+
+    :param characteristic: The characteristic enum that changed, e.g. ``SX3Profile.Movement.SPEED``
+    :param value: The parsed value, using the same types as the matching getter.
+        Characteristics without a known format are delivered as decrypted bytes.
+    :param timestamp: ``time.monotonic()`` when the notification was received.
+    """
+
+    characteristic: Enum
+    value: Any
+    timestamp: float
+
+
+class Subscription:
+    """
+    A subscription to bike notifications, created by ``SX3Client.subscribe``.
+
+    Use it as an async context manager to start and stop notifications, and iterate over it
+    to receive ``Notification`` objects. Notifications are buffered in a bounded queue; once
+    the queue is full the oldest notification is dropped so a slow consumer always sees the
+    most recent state. ``dropped`` counts how many were discarded.
+
+    Example::
+
+        async with client.subscribe([SX3Profile.Movement.SPEED]) as notifications:
+            async for notification in notifications:
+                print(notification.value)
+    """
+
+    def __init__(
+        self,
+        client: "SX3Client",
+        characteristics: Iterable[Enum],
+        max_queue_size: int,
+        callback: Optional[Callable[[Notification], None]],
+    ) -> None:
+        self._client = client
+        self._characteristics = tuple(characteristics)
+        self._callback = callback
+        self._queue = asyncio.Queue(max_queue_size)
+        self._started = []
+        self.dropped = 0
+
+    def _make_handler(self, characteristic):
+        record = SX3_CHARACTERISTICS[characteristic]
+
+        def handler(_sender, data: bytearray) -> None:
+            value = _parse(record, self._client._bike_profile.decrypt_payload(data))
+            self._deliver(Notification(characteristic, value, time.monotonic()))
+
+        return handler
+
+    def _deliver(self, notification: Notification) -> None:
+        if self._callback is not None:
+            self._callback(notification)
+            return
+
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(notification)
+
+    async def start(self) -> None:
+        """
+        Enables notifications for every subscribed characteristic. If one fails, the ones
+        already enabled are disabled again before the error is raised.
+        """
+        await self._client._ensure_authenticated()
+        try:
+            for characteristic in self._characteristics:
+                await self._client._start_notify(
+                    characteristic,
+                    self._make_handler(characteristic),
+                )
+                self._started.append(characteristic)
+        except BaseException:
+            try:
+                await self.stop()
+            except Exception:
+                # The error that failed the start is the one worth raising
+                pass
+            raise
+
+    async def stop(self) -> None:
+        """
+        Disables notifications for every subscribed characteristic.
+        """
+        while self._started:
+            await self._client._stop_notify(self._started.pop())
+
+    async def __aenter__(self) -> "Subscription":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> Notification:
+        return await self._queue.get()
+
+
+class Snapshot:
+    """
+    The state of a bike, as read by ``SX3Client.snapshot``. Snapshots are immutable.
+
+    Values are looked up by characteristic enum member or name, e.g.
+    ``snapshot[SX3Profile.Movement.SPEED]`` or ``snapshot["SPEED"]``, and use the same types as
+    the matching getters. A characteristic that could not be read or decoded has no value;
+    its exception is in ``errors`` instead.
+
+    :param timestamp: ``time.time()`` when the reads were sent.
+    :param values: Mapping of characteristic enum member to decoded value.
+    :param errors: Mapping of characteristic enum member to the exception it raised.
+    """
+
+    __slots__ = ("timestamp", "_values", "_errors")
+
+    def __init__(
+        self,
+        timestamp: float,
+        values: Dict[Enum, Any],
+        errors: Dict[Enum, BaseException],
+    ) -> None:
+        set_attribute = super().__setattr__
+        set_attribute("timestamp", timestamp)
+        set_attribute("_values", MappingProxyType(dict(values)))
+        set_attribute("_errors", MappingProxyType(dict(errors)))
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("Snapshot is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Snapshot is immutable")
+
+    def __reduce__(self):
+        # Mapping proxies cannot be pickled, e.g. to send a snapshot to another process
+        return (Snapshot, (self.timestamp, dict(self._values), dict(self._errors)))
+
+    @property
+    def values(self) -> Mapping[Enum, Any]:
+        return self._values
+
+    @property
+    def errors(self) -> Mapping[Enum, BaseException]:
+        return self._errors
+
+    @property
+    def complete(self) -> bool:
+        """
+        True if every characteristic was read successfully.
+        """
+        return not self._errors
+
+    def __getitem__(self, key) -> Any:
+        return self._values[SX3_CHARACTERISTICS[key].member]
+
+    def get(self, key, default=None) -> Any:
+        record = SX3_CHARACTERISTICS.get(key)
+        if record is None:
+            return default
+        return self._values.get(record.member, default)
+
+    def __contains__(self, key) -> bool:
+        record = SX3_CHARACTERISTICS.get(key)
+        return record is not None and record.member in self._values
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Returns the values keyed by characteristic name, e.g. ``{"SPEED": 23, ...}``.
+        """
+        return {SX3_CHARACTERISTICS[member].name: value for member, value in self._values.items()}
+
+    def __repr__(self) -> str:
+        return f"Snapshot({self.timestamp}, {self.as_dict()}, errors={len(self._errors)})"
+
+
+# Everything the bike reports, the challenge nonce is only part of the protocol
+SNAPSHOT_CHARACTERISTICS = tuple(
+    record.member
+    for record in SX3_CHARACTERISTICS
+    if record.readable and record.member is not SX3Profile.Security.CHALLENGE
+)
+
+
+# Marks a cache miss
+_MISSING = object()
+
+# Characteristics decoded to an enum value. A value the enum does not list, e.g. a state added
+# by a firmware update, is returned as the plain integer instead of failing the read
+_ENUMS = {
+    SX3Profile.Defense.LOCK_STATE: LockState,
+    SX3Profile.Sound.BELL_SOUND: BellTone,
+}
+
+
+def _parse(record, payload) -> Any:
+    if record.parser is None:
+        return bytes(payload)
+    value = record.parser(payload)
+    enum = _ENUMS.get(record.member)
+    if enum is not None:
+        try:
+            value = enum(value)
+        except ValueError:
+            pass
+    return value
+
+
+class _BatchNonce:
+    # The nonce shared by the writes of one batch
+    __slots__ = ("nonce",)
+
+    def __init__(self) -> None:
+        self.nonce: Optional[bytes] = None
+
+
+# The batches running in the current task, keyed by client id. Kept per task so writes that
+# other tasks send to the same client while a batch runs read their own nonce
+_BATCHES: contextvars.ContextVar[Mapping[int, _BatchNonce]] = contextvars.ContextVar(
+    "pymoof_sx3_batches",
+    default=MappingProxyType({}),
+)
+
+
+# ``bleak.exc.BleakError``, bound on first use so importing this module does not load bleak
+_BleakError: Optional[type] = None
+
 
+def _bleak_error() -> type:
+    global _BleakError
+    if _BleakError is None:
+        # bleak is already loaded by the connected client, this only binds the name
+        import bleak.exc
 
-class BellTone(Enum):
-
-    BOAT = 0x18
-    PARTY = 0x17
-    BELL = 0x16
-
-
-class LockState(Enum):
-
-    UNLOCKED = 0x00
-    LOCKED = 0x01
-    AWAITING_UNLOCK = 0x02
-
-
-class Sound(Enum):
-
-    SCROLLING_TONE = 0x1
-    BEEP_NEGATIVE = 0x2
-    BEEP_POSITIVE = 0x3
-    UNLOCK_COUNTDOWN = 0x4
-    PAIRING = 0x5
-    ENTER_BACKUP_CODE_MODE = 0x6
-    RESET_COUNTDOWN = 0x7
-    PAIRING_SUCCESSFUL = 0x8
-    PAIRING_FAILED = 0x9
-    HORN_1 = 0xA
-    HORN_URGENT = 0xB
-    LOCK = 0xC
-    UNLOCK = 0xD
-    ALARM_STAGE_ONE = 0xE
-    ALARM_STAGE_TWO = 0xF
-    SYSTEM_STARTUP = 0x10
-    SYSTEM_SHUTDOWN = 0x11
-    CHARGING = 0x12
-    DIAGNOSE = 0x13
-    FIRMWARE_DOWNLOAD = 0x14
-    FIRMWARE_FAILED = 0x15
-    HORN_2 = 0x16
-    HORN_3 = 0x17
-    HORN_4 = 0x17
-    FIRMWARE_SUCCESSFUL = 0x18
-    NOISE = 0x19
-    UNPAIRING = 0x1A
-    FM_DISABLE = 0x1B
-    FM_ENABLE = 0x1C
-    FM_NOISE = 0x1D
+        _BleakError = bleak.exc.BleakError
+    return _BleakError
+
+
+# Number of reads a snapshot sends per hold of the command lock
+_SNAPSHOT_CHUNK_SIZE = 4
+
+
+# Read after authenticating to check the session works. Its plaintext is a LockState value
+# followed by zero padding, which a payload decrypted with the wrong key is very unlikely to be
+_VERIFY_CHARACTERISTIC = SX3Profile.Defense.LOCK_STATE
+_LOCK_STATES = frozenset(state.value for state in LockState)
+
+
+def _malformed(payload: bytes) -> bool:
+    # An encrypted payload is always whole cipher blocks
+    return not payload or len(payload) % BLOCK_SIZE != 0
+
+
+# Locking and unlocking jump ahead of every other queued command
+DEFAULT_PRIORITIES = {
+    SX3Profile.Security.KEY_INDEX: Priority.HIGH,
+    SX3Profile.Defense.LOCK_STATE: Priority.HIGH,
+}
+
+# Commands that can be sent without waiting for a write response: losing one has no effect on
+# the bike's security, and its effect can be checked afterwards with ``SX3Client.confirm``
+IDEMPOTENT_WRITES = frozenset((SX3Profile.Sound.PLAY_SOUND, SX3Profile.Sound.BELL_SOUND))
 
 
 class SX3Client:
@@ -61,9 +316,37 @@ class SX3Client:
     You must provide this object with a connected BleakClient and a hexidecimal string formatted key
     for the bike.
 
+    Once ``authenticate`` has succeeded, the client remembers it for the connection and
+    authenticates again by itself before the next command after the link was reset with
+    ``handle_disconnect``, or after an encrypted read returns a payload that does not parse.
+
+    The client is safe to share between coroutines. Commands that need a nonce, and reads of
+    encrypted characteristics, are queued and sent one at a time so a write is never signed
+    with a nonce another command already used. Queued commands run in priority order: writes
+    use ``Priority.NORMAL`` unless configured otherwise, locking and unlocking use
+    ``Priority.HIGH``, and encrypted reads use ``Priority.LOW`` so telemetry polls wait.
+    Unencrypted reads such as ``get_frame_number`` bypass the queue.
+
     :param bleak_client: Connected bleak.backends.client.BaseBleakClient
     :param key: The encryption key for the bike from Vanmoof servers
     :param user_key_id: The user key id for the bike from Vanmoof servers
+    :param nonce_ttl: Optional number of seconds to reuse a challenge nonce across writes.
+        By default every write reads a fresh nonce. When set, the nonce is cached and only
+        refreshed once it expires or the bike rejects a write signed with it, in which case
+        the write is transparently retried once with a fresh nonce. Writes without response
+        always read a fresh nonce, unless they run in a ``batch``.
+    :param instrumentation: Optional ``pymoof.util.instrumentation.Instrumentation`` that
+        receives timings, byte counts, retries and authentication failures.
+    :param priorities: Optional mapping of characteristic enum to
+        ``pymoof.util.scheduling.Priority`` for writes, merged over ``DEFAULT_PRIORITIES``.
+    :param write_without_response: Characteristic enums written without waiting for the bike
+        to acknowledge the write, e.g. ``IDEMPOTENT_WRITES``. Such writes return as soon as
+        they are sent, but a write the bike rejects or never receives is not reported. Use
+        ``confirm`` to check their effect. Outside a ``batch`` every such write still waits
+        for a fresh nonce read, so writes only go out back to back inside a ``batch``.
+    :param cache: Optional ``pymoof.util.caching.ReadCache`` serving reads of slow changing
+        characteristics, such as firmware versions, without going over the air. One cache can
+        be shared by every client of a fleet; values are kept per bike address.
     """
 
     def __init__(
@@ -71,56 +354,537 @@ class SX3Client:
         bleak_client: bleak.backends.client.BaseBleakClient,
         key: str,
         user_key_id: int,
+        nonce_ttl: Optional[float] = None,
+        instrumentation: Instrumentation = NULL_INSTRUMENTATION,
+        priorities: Optional[Dict[Enum, Priority]] = None,
+        write_without_response: Iterable[Enum] = (),
+        cache: Optional[ReadCache] = None,
     ) -> None:
 
         self._gatt_client = bleak_client
         self._bike_profile = SX3Profile(key, user_key_id)
-
-    async def _get_nonce(self) -> bytes:
-        return await self._read(
-            self._bike_profile.Security.CHALLENGE,
-            needs_decryption=False,
+        self._instrumentation = instrumentation
+        self._priorities = {**DEFAULT_PRIORITIES, **(priorities or {})}
+        self._write_without_response = frozenset(write_without_response)
+        self._command_lock = PriorityLock()
+        self._nonce_ttl = nonce_ttl
+        self._nonce = None
+        self._nonce_expires_at = 0.0
+        self._resolver = bleak_utils.CharacteristicResolver(bleak_client, SX3_CHARACTERISTICS)
+        self._cache = cache
+        self._cache_key = getattr(bleak_client, "address", None) or id(bleak_client)
+        self._authenticated = False
+        # Whether the caller authenticated once, so the client re-authenticates by itself
+        self._keep_authenticated = False
+
+    def handle_disconnect(self, _bleak_client=None) -> None:
+        """
+        Resets any per-connection state held by this client. Call this when the bike
+        disconnects or its GATT services change. The signature matches bleak's disconnected
+        callback, so it can be registered directly with ``set_disconnected_callback``.
+        """
+        self._resolver.invalidate()
+        self._nonce = None
+        self._authenticated = False
+        if self._cache is not None:
+            self._cache.invalidate(self._cache_key)
+
+    @property
+    def authenticated(self) -> bool:
+        """
+        Whether the client authenticated over the current connection.
+        """
+        return self._authenticated
+
+    async def _ensure_authenticated(self) -> None:
+        if self._keep_authenticated and not self._authenticated:
+            await self.authenticate()
+
+    def _cached_nonce(self, session: bool = True) -> Optional[bytes]:
+        batch = _BATCHES.get().get(id(self))
+        if batch is not None and batch.nonce is not None:
+            return batch.nonce
+        if session and self._nonce is not None and time.monotonic() < self._nonce_expires_at:
+            return self._nonce
+        return None
+
+    def _forget_nonce(self) -> None:
+        self._nonce = None
+        batch = _BATCHES.get().get(id(self))
+        if batch is not None:
+            batch.nonce = None
+
+    async def _get_nonce(self, session: bool = True) -> bytes:
+        # Without ``session`` the nonce cached for ``nonce_ttl`` is neither used nor refreshed
+        nonce = self._cached_nonce(session)
+        if nonce is not None:
+            return nonce
+
+        nonce = await self._read(self._bike_profile.Security.CHALLENGE)
+
+        batch = _BATCHES.get().get(id(self))
+        if batch is not None:
+            batch.nonce = nonce
+        if session and self._nonce_ttl is not None:
+            self._nonce = nonce
+            self._nonce_expires_at = time.monotonic() + self._nonce_ttl
+
+        return nonce
+
+    async def _gatt_read(self, characteristic_uuid) -> bytes:
+        if not self._instrumentation.enabled:
+            return await bleak_utils.read_from_characteristic(
+                self._gatt_client,
+                characteristic_uuid,
+                self._resolver,
+            )
+
+        start = time.perf_counter()
+        result = b""
+        error = None
+        try:
+            result = await bleak_utils.read_from_characteristic(
+                self._gatt_client,
+                characteristic_uuid,
+                self._resolver,
+            )
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._instrumentation.record_operation(
+                "read",
+                characteristic_uuid.name,
+                time.perf_counter() - start,
+                bytes_received=len(result),
+                error=error,
+            )
+
+    async def _gatt_write(self, characteristic_uuid, payload: bytes, response: bool = True) -> None:
+        if not self._instrumentation.enabled:
+            return await bleak_utils.write_to_characteristic(
+                self._gatt_client,
+                characteristic_uuid,
+                payload,
+                self._resolver,
+                response,
+            )
+
+        start = time.perf_counter()
+        error = None
+        try:
+            await bleak_utils.write_to_characteristic(
+                self._gatt_client,
+                characteristic_uuid,
+                payload,
+                self._resolver,
+                response,
+            )
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._instrumentation.record_operation(
+                "write" if response else "write_command",
+                characteristic_uuid.name,
+                time.perf_counter() - start,
+                bytes_sent=len(payload),
+                error=error,
+            )
+
+    def _timed_crypto(self, operation: str, characteristic_uuid, function, *args) -> bytes:
+        if not self._instrumentation.enabled:
+            return function(*args)
+
+        start = time.perf_counter()
+        result = function(*args)
+        self._instrumentation.record_operation(
+            operation,
+            characteristic_uuid.name,
+            time.perf_counter() - start,
         )
+        return result
 
-    async def _read(self, characteristic_uuid, needs_decryption: bool = True) -> bytes:
-        result = await bleak_utils.read_from_characteristic(
-            self._gatt_client,
+    async def _read(self, characteristic_uuid) -> bytes:
+        if not SX3_CHARACTERISTICS[characteristic_uuid].encrypted:
+            return await self._gatt_read(characteristic_uuid)
+
+        await self._ensure_authenticated()
+        async with self._command_lock.hold(Priority.LOW):
+            result = await self._gatt_read(characteristic_uuid)
+
+        return self._timed_crypto(
+            "decrypt",
             characteristic_uuid,
+            self._bike_profile.decrypt_payload,
+            result,
         )
 
-        if needs_decryption:
-            result = self._bike_profile.decrypt_payload(result)
+    async def _read_value(self, characteristic_uuid):
+        cache = self._cache
+        if cache is not None:
+            value = cache.get(self._cache_key, characteristic_uuid, _MISSING)
+            if value is not _MISSING:
+                return value
+
+        record = SX3_CHARACTERISTICS[characteristic_uuid]
+        try:
+            result = await self._read(characteristic_uuid)
+        except ValueError:
+            if not (record.encrypted and self._keep_authenticated):
+                raise
+            # A payload that is not whole cipher blocks means the bike no longer considers us
+            # authenticated. Values that merely fail to decode do not retry.
+            await self.authenticate(force=True)
+            result = await self._read(characteristic_uuid)
+        value = _parse(record, result)
+
+        if cache is not None:
+            cache.put(self._cache_key, characteristic_uuid, value)
+        return value
+
+    async def _write_with_nonce(
+        self,
+        characteristic_uuid,
+        nonce: bytes,
+        data: bytes,
+        response: bool = True,
+    ) -> None:
+        payload = self._timed_crypto(
+            "encrypt",
+            characteristic_uuid,
+            self._bike_profile.build_encrypted_payload,
+            nonce,
+            data,
+        )
 
-        return result
+        await self._gatt_write(characteristic_uuid, payload, response)
 
-    async def _write(self, characteristic_uuid, data: bytes) -> None:
-        nonce = await self._get_nonce()
-        payload = self._bike_profile.build_encrypted_payload(nonce, data)
+    async def _write(
+        self,
+        characteristic_uuid,
+        data: bytes,
+        response: Optional[bool] = None,
+    ) -> None:
+        if response is None:
+            response = characteristic_uuid not in self._write_without_response
+        await self._ensure_authenticated()
+        priority = self._priorities.get(characteristic_uuid, Priority.NORMAL)
+        try:
+            async with self._command_lock.hold(priority):
+                await self._signed_write(characteristic_uuid, data, response)
+        finally:
+            # Even a failed write may have reached the bike
+            if self._cache is not None:
+                self._cache.invalidate(self._cache_key, characteristic_uuid)
+
+    async def _signed_write(self, characteristic_uuid, data: bytes, response: bool = True) -> None:
+        # Nothing reports a write without response the bike rejects, so such writes do not
+        # share the session nonce, which would stay stale for every write after them. Outside
+        # a batch they read a fresh nonce each, only a batch pipelines them
+        nonce_was_cached = self._cached_nonce(session=response) is not None
+        nonce = await self._get_nonce(session=response)
+
+        try:
+            await self._write_with_nonce(characteristic_uuid, nonce, data, response)
+        except _bleak_error():
+            self._forget_nonce()
+            if not nonce_was_cached:
+                raise
+
+            # The bike may have rotated its challenge, retry once with a fresh nonce
+            if self._instrumentation.enabled:
+                self._instrumentation.record_retry("write", characteristic_uuid.name)
+            nonce = await self._get_nonce(session=response)
+            await self._write_with_nonce(characteristic_uuid, nonce, data, response)
+
+    async def _start_notify(self, characteristic_uuid, callback) -> None:
+        await bleak_utils.start_notify(
+            self._gatt_client,
+            characteristic_uuid,
+            callback,
+            self._resolver,
+        )
 
-        await bleak_utils.write_to_characteristic(
+    async def _stop_notify(self, characteristic_uuid) -> None:
+        await bleak_utils.stop_notify(
             self._gatt_client,
             characteristic_uuid,
-            payload,
+            self._resolver,
         )
 
-    async def authenticate(self) -> None:
+    def subscribe(
+        self,
+        characteristics: Iterable[Enum],
+        max_queue_size: int = 64,
+        callback: Optional[Callable[[Notification], None]] = None,
+    ) -> Subscription:
+        """
+        **Must be authenticated to call**
+
+        Subscribes to notifications instead of polling the getters. Speed, distance, battery
+        level and lock state are parsed into the same types their getters return.
+
+        :param characteristics: Characteristic enums to subscribe to, e.g.
+            ``[SX3Profile.Movement.SPEED, SX3Profile.Defense.LOCK_STATE]``
+        :param max_queue_size: Maximum number of undelivered notifications to buffer.
+        :param callback: Optional function called with each ``Notification`` as it arrives,
+            instead of queueing it for iteration.
+
+        :return: A ``pymoof.clients.sx3.Subscription`` that must be started, either with
+            ``async with`` or ``await subscription.start()``.
         """
-        Attempts to authenticate with the bike by performing the nonce challenge.
+        return Subscription(self, characteristics, max_queue_size, callback)
 
-        .. warning::
-            This method will not check if you have successfully authenticated
-            and will silently return.
+    async def batch(
+        self,
+        operations: Iterable[Callable[[], Awaitable[Any]]],
+        return_exceptions: bool = False,
+    ) -> List[Any]:
         """
-        nonce = await self._get_nonce()
-        payload = self._bike_profile.build_authentication_payload(nonce)
+        Runs several client operations in one call and returns their results in order.
 
-        await bleak_utils.write_to_characteristic(
-            self._gatt_client,
-            self._bike_profile.Security.KEY_INDEX,
+        Every write in the batch is signed with a single challenge nonce, which is read at most
+        once. If the bike rejects the shared nonce, the write is retried with a fresh one.
+        Writes other tasks send to the client while the batch runs do not use its nonce.
+
+        Example::
+
+            battery, lock_state, _ = await client.batch([
+                client.get_battery_level,
+                client.get_lock_state,
+                functools.partial(client.play_sound, Sound.BEEP_POSITIVE),
+            ])
+
+        :param operations: Zero argument callables returning an awaitable, usually bound
+            methods of this client or ``functools.partial`` objects wrapping them.
+        :param return_exceptions: If true, an exception raised by an operation is returned in
+            its place instead of aborting the batch.
+
+        :return: A list with the result of each operation.
+        """
+        results = []
+        batches = _BATCHES.get()
+        # A nested batch shares the nonce of the outer one
+        token = None if id(self) in batches else _BATCHES.set({**batches, id(self): _BatchNonce()})
+        try:
+            for operation in operations:
+                try:
+                    results.append(await operation())
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results.append(e)
+        finally:
+            if token is not None:
+                _BATCHES.reset(token)
+
+        return results
+
+    async def _read_payloads(self, records) -> List[Any]:
+        # Raw payloads, or the exception of each read that failed. The lock is taken per
+        # chunk of reads, so commands with a better priority get in between chunks
+        results = []
+        for start in range(0, len(records), _SNAPSHOT_CHUNK_SIZE):
+            end = start + _SNAPSHOT_CHUNK_SIZE
+            chunk = records[start:end]
+            async with self._command_lock.hold(Priority.LOW):
+                results.extend(
+                    await asyncio.gather(
+                        *(self._gatt_read(record.member) for record in chunk),
+                        return_exceptions=True,
+                    ),
+                )
+        return results
+
+    async def snapshot(self, characteristics: Optional[Iterable[Enum]] = None) -> Snapshot:
+        """
+        **Must be authenticated to call**
+
+        Reads many characteristics at once and returns them as a ``Snapshot``.
+
+        All reads are issued together during a single ``Priority.LOW`` turn of the command
+        queue, so the bleak backend can send them back to back instead of waiting on the
+        client between reads. The encrypted results are decrypted with one cipher call. A read
+        that fails does not fail the snapshot; its exception is recorded in
+        ``Snapshot.errors``. Values held by the client's cache are not read again.
+
+        Example::
+
+            snapshot = await client.snapshot()
+            print(snapshot["MOTOR_BATTERY_LEVEL"], snapshot.get("SPEED"))
+
+        :param characteristics: Optional characteristic enums to read. Defaults to
+            ``SNAPSHOT_CHARACTERISTICS``, every readable characteristic of the bike.
+        :return: A ``Snapshot`` of the values.
+        """
+        if characteristics is None:
+            characteristics = SNAPSHOT_CHARACTERISTICS
+        records = [SX3_CHARACTERISTICS[characteristic] for characteristic in characteristics]
+
+        decoded = {}
+        errors = {}
+        cache = self._cache
+        unread = records
+        if cache is not None:
+            unread = []
+            for record in records:
+                value = cache.get(self._cache_key, record.member, _MISSING)
+                if value is _MISSING:
+                    unread.append(record)
+                else:
+                    decoded[record.member] = value
+
+        timestamp = time.time()
+        results = ()
+        if unread:
+            if any(record.encrypted for record in unread):
+                await self._ensure_authenticated()
+            results = await self._read_payloads(unread)
+
+        retry = [
+            index
+            for index, (record, result) in enumerate(zip(unread, results))
+            if record.encrypted and not isinstance(result, BaseException) and _malformed(result)
+        ]
+        if retry and self._keep_authenticated:
+            # Like the getters, authenticate again once if the session looks lost
+            results = list(results)
+            try:
+                await self.authenticate(force=True)
+            except Exception as e:
+                for index in retry:
+                    results[index] = e
+            else:
+                retried = await self._read_payloads([unread[index] for index in retry])
+                for index, result in zip(retry, retried):
+                    results[index] = result
+
+        def decode(record, payload) -> None:
+            try:
+                value = decoded[record.member] = _parse(record, payload)
+            except Exception as e:
+                errors[record.member] = e
+            else:
+                if cache is not None:
+                    cache.put(self._cache_key, record.member, value)
+
+        encrypted = []
+        for record, result in zip(unread, results):
+            if isinstance(result, BaseException):
+                errors[record.member] = result
+            elif not record.encrypted:
+                decode(record, result)
+            elif _malformed(result):
+                errors[record.member] = ValueError(
+                    f"The payload of {record.name} is not a multiple of {BLOCK_SIZE} bytes",
+                )
+            else:
+                encrypted.append((record, result))
+
+        if encrypted:
+            start = time.perf_counter()
+            plaintexts = self._bike_profile.decrypt_payloads(result for _, result in encrypted)
+            if self._instrumentation.enabled:
+                self._instrumentation.record_operation(
+                    "decrypt",
+                    "SNAPSHOT",
+                    time.perf_counter() - start,
+                )
+            for (record, _), plaintext in zip(encrypted, plaintexts):
+                decode(record, plaintext)
+
+        # Keep the order the characteristics were asked for
+        values = {
+            record.member: decoded[record.member] for record in records if record.member in decoded
+        }
+        return Snapshot(timestamp, values, errors)
+
+    async def confirm(self, expected: Mapping[Enum, Any]) -> Dict[Enum, Any]:
+        """
+        **Must be authenticated to call**
+
+        Reads characteristics back and reports the ones that do not hold the expected value,
+        to check writes sent without a response. The bike handles requests in the order they
+        were sent, so the reads see every write sent before them.
+
+        Example::
+
+            await client.batch([
+                functools.partial(client.set_bell_tone, BellTone.BELL, response=False),
+                functools.partial(client.play_sound, Sound.BEEP_POSITIVE, response=False),
+            ])
+            failed = await client.confirm({SX3Profile.Sound.BELL_SOUND: BellTone.BELL})
+
+        :param expected: Mapping of characteristic enum to its expected value, of the type the
+            matching getter returns.
+        :return: A dict mapping every characteristic that did not match to the value read, or
+            to the exception raised reading it. Empty if every value matched.
+        """
+        snapshot = await self.snapshot(expected)
+        mismatches = dict(snapshot.errors)
+        for characteristic, value in snapshot.values.items():
+            if value != expected[characteristic]:
+                mismatches[characteristic] = value
+        if mismatches:
+            # A write may have been dropped for a stale nonce, do not sign later writes with it
+            self._forget_nonce()
+        return mismatches
+
+    async def authenticate(self, force: bool = False) -> None:
+        """
+        Authenticates with the bike by performing the nonce challenge, then checks the session
+        works by reading and decrypting the lock state.
+
+        Does nothing if the client already authenticated over the current connection, so it is
+        cheap to call before every operation.
+
+        :param force: Authenticate again even if already authenticated, e.g. after the bike
+            was reset.
+        :raises ``bleak.exc.BleakError``: if the bike rejects the authentication.
+        :raises AuthenticationError: if the bike accepts it but the session does not work.
+        """
+        if self._authenticated and not force:
+            return
+
+        priority = self._priorities[self._bike_profile.Security.KEY_INDEX]
+        try:
+            async with self._command_lock.hold(priority):
+                if self._authenticated and not force:
+                    # Another coroutine authenticated while this one waited
+                    return
+                self._authenticated = False
+                # Always authenticate against a fresh challenge
+                self._forget_nonce()
+                nonce = await self._get_nonce()
+                payload = self._bike_profile.build_authentication_payload(nonce)
+                await self._gatt_write(self._bike_profile.Security.KEY_INDEX, payload)
+                await self._verify_authentication()
+                self._authenticated = True
+                self._keep_authenticated = True
+        except Exception:
+            if self._instrumentation.enabled:
+                self._instrumentation.record_auth_failure()
+            raise
+
+    async def _verify_authentication(self) -> None:
+        # Called with the command lock held, so reads the characteristic directly
+        payload = await self._gatt_read(_VERIFY_CHARACTERISTIC)
+        if _malformed(payload):
+            raise AuthenticationError("The bike sent a malformed payload after authenticating")
+
+        plaintext = self._timed_crypto(
+            "decrypt",
+            _VERIFY_CHARACTERISTIC,
+            self._bike_profile.decrypt_payload,
             payload,
         )
+        # One in about 85 wrong keys gives a valid first byte, the padding rules those out
+        if plaintext[0] not in _LOCK_STATES or any(plaintext[1:]):
+            raise AuthenticationError("The bike sent garbage after authenticating, check the key")
 
-    async def set_bell_tone(self, bell_tone: BellTone) -> None:
+    async def set_bell_tone(self, bell_tone: BellTone, response: Optional[bool] = None) -> None:
         """
         **Must be authenticated to call**
 
@@ -128,11 +892,15 @@ class SX3Client:
 
         :param bell_tone: The type of bell tone to use.
             See ``pymoof.clients.sx3.BellTone`` for a list of valid bell tones.
+        :param response: Whether to wait for the bike to acknowledge the write. Defaults to the
+            client's ``write_without_response`` setting. Without a response, the write is
+            only pipelined with other writes inside ``batch``.
         :raises ``bleak.exc.BleakError``: if the client is not authenticated.
         """
         await self._write(
             self._bike_profile.Sound.BELL_SOUND,
             [bell_tone.value],
+            response,
         )
 
     async def set_lock_state(self, state: LockState) -> None:
@@ -167,7 +935,7 @@ class SX3Client:
             [level, 0x1],
         )
 
-    async def play_sound(self, sound: Sound, count: int = 1):
+    async def play_sound(self, sound: Sound, count: int = 1, response: Optional[bool] = None):
         """
         **Must be authenticated to call**
 
@@ -175,6 +943,9 @@ class SX3Client:
 
         :param sound: The sound to use. See ``pymoof.clients.sx3.Sound`` for a list of valid sounds.
         :param count: An integer greater than 1. Defaults to 1.
+        :param response: Whether to wait for the bike to acknowledge the write. Defaults to the
+            client's ``write_without_response`` setting. Without a response, the write is
+            only pipelined with other writes inside ``batch``.
 
         :raises ``bleak.exc.BleakError``: if the client is not authenticated.
         :raises AssertionError: if count is outside the valid range.
@@ -183,6 +954,7 @@ class SX3Client:
         await self._write(
             self._bike_profile.Sound.PLAY_SOUND,
             [sound.value, count],
+            response,
         )
 
     async def get_battery_level(self) -> int:
@@ -195,11 +967,7 @@ class SX3Client:
 
         :return: Battery level as an integer between 0 and 100 inclusive.
         """
-        result = await self._read(
-            self._bike_profile.BikeInfo.MOTOR_BATTERY_LEVEL,
-        )
-
-        return int(result[0])
+        return await self._read_value(self._bike_profile.BikeInfo.MOTOR_BATTERY_LEVEL)
 
     async def get_lock_state(self) -> LockState:
         """
@@ -209,13 +977,10 @@ class SX3Client:
 
         :raises ``bleak.exc.BleakError``: if the client is not authenticated.
 
-        :return: A ``pymoof.clients.sx3.LockState`` of the lock state of the bike.
+        :return: A ``pymoof.clients.sx3.LockState`` of the lock state of the bike, or the raw
+            integer for a state the enum does not list.
         """
-        result = await self._read(
-            self._bike_profile.Defense.LOCK_STATE,
-        )
-
-        return LockState(result[0])
+        return await self._read_value(self._bike_profile.Defense.LOCK_STATE)
 
     async def get_distance_travelled(self) -> float:
         """
@@ -227,26 +992,19 @@ class SX3Client:
 
         :return: A float that represents the distance travelled in kilometers.
         """
-        # Returns kilometers, stored as hectometers
-        result = await self._read(
-            self._bike_profile.Movement.DISTANCE,
-        )
-        return int.from_bytes(result, "little") / 10
+        return await self._read_value(self._bike_profile.Movement.DISTANCE)
 
     async def get_power_level(self) -> int:
         """
         **Must be authenticated to call**
 
-        TODO: Need to figure out what this actually returns
+        Gets the power level of the bike, as set by ``set_power_level``.
 
         :raises ``bleak.exc.BleakError``: if the client is not authenticated.
 
-        :return: N/A
+        :return: An integer between 0 and 5 inclusive.
         """
-        result = await self._read(
-            self._bike_profile.Movement.POWER_LEVEL,
-        )
-        return result
+        return await self._read_value(self._bike_profile.Movement.POWER_LEVEL)
 
     async def get_frame_number(self) -> str:
         """
@@ -258,27 +1016,19 @@ class SX3Client:
 
         :return: A string that represents the frame number.
         """
-        result = await self._read(
-            self._bike_profile.BikeInfo.FRAME_NUMBER,
-            needs_decryption=False,
-        )
-
-        return result.decode("ascii")
+        return await self._read_value(self._bike_profile.BikeInfo.FRAME_NUMBER)
 
     async def get_sound_volume(self) -> int:
         """
         **Must be authenticated to call**
 
-        Gets the sound volume. TODO: parse output
+        Gets the sound volume.
 
         :raises ``bleak.exc.BleakError``: if the client is not authenticated.
 
-        :return: N/A
+        :return: The sound volume as an integer.
         """
-        result = await self._read(
-            self._bike_profile.Sound.SOUND_VOLUME,
-        )
-        return result
+        return await self._read_value(self._bike_profile.Sound.SOUND_VOLUME)
 
     async def get_speed(self) -> int:
         """
@@ -290,22 +1040,16 @@ class SX3Client:
 
         :return: An integer that represents the speed of the bike in kilometers per hour.
         """
-        result = await self._read(
-            self._bike_profile.Movement.SPEED,
-        )
-        return int.from_bytes(result, "little")
+        return await self._read_value(self._bike_profile.Movement.SPEED)
 
     async def get_light_mode(self) -> int:
         """
         **Must be authenticated to call**
 
-        Gets the light mode. TODO: parse output
+        Gets the light mode.
 
         :raises ``bleak.exc.BleakError``: if the client is not authenticated.
 
-        :return: N/A
+        :return: The light mode as an integer.
         """
-        result = await self._read(
-            self._bike_profile.Movement.SPEED,
-        )
-        return result
+        return await self._read_value(self._bike_profile.Light.LIGHT_MODE)
@@ -0,0 +1,362 @@
+import asyncio
+import time
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+
+import bleak
+
+from pymoof.fleet.pool import ConnectionPool
+from pymoof.fleet.pool import RECONNECT_ERRORS
+from pymoof.tools import discover_bike
+from pymoof.util.instrumentation import Instrumentation
+from pymoof.util.instrumentation import NULL_INSTRUMENTATION
+
+# Operations that measure the radio link, as opposed to encrypting or decrypting
+_LINK_OPERATIONS = frozenset(("connect", "read", "write", "write_command"))
+
+
+def _scan_with_bleak(adapter: str, timeout: float) -> AsyncIterator:
+    return discover_bike.stream(timeout=timeout, adapter=adapter)
+
+
+class AdapterStats:
+    """
+    The live load and health of one bluetooth adapter, as seen by ``AdapterScheduler``.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        # Addresses of the bikes connected, or connecting, through this adapter
+        self.connections: Set[str] = set()
+        # Exponentially weighted moving average of link operations, in seconds
+        self.latency: Optional[float] = None
+        # Failed link operations in a row
+        self.failures = 0
+        self.degraded_until = 0.0
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self.degraded_until
+
+    def __repr__(self) -> str:
+        return (
+            f"AdapterStats({self.name}, connections={len(self.connections)}, "
+            f"latency={self.latency}, degraded={self.degraded})"
+        )
+
+
+class _SchedulerInstrumentation(Instrumentation):
+    enabled = True
+
+    def __init__(
+        self,
+        scheduler: "AdapterScheduler",
+        forward: Instrumentation,
+        bike: Optional[str] = None,
+    ) -> None:
+        self._scheduler = scheduler
+        self._forward = forward
+        self._bike = bike
+
+    def labeled(self, **labels: str) -> Instrumentation:
+        return _SchedulerInstrumentation(
+            self._scheduler,
+            self._forward.labeled(**labels),
+            labels.get("bike", self._bike),
+        )
+
+    def record_operation(
+        self,
+        operation: str,
+        characteristic: str,
+        seconds: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        if self._bike is not None and operation in _LINK_OPERATIONS:
+            self._scheduler.record(self._bike, seconds, error)
+            if operation == "connect" and error is not None:
+                # The link never came up, so it does not count towards the adapter's load
+                self._scheduler._release(self._bike)
+        if self._forward.enabled:
+            self._forward.record_operation(
+                operation,
+                characteristic,
+                seconds,
+                bytes_sent,
+                bytes_received,
+                error,
+            )
+
+    def record_retry(self, operation: str, characteristic: str) -> None:
+        if self._forward.enabled:
+            self._forward.record_retry(operation, characteristic)
+
+    def record_auth_failure(self) -> None:
+        if self._forward.enabled:
+            self._forward.record_auth_failure()
+
+
+class AdapterScheduler:
+    """
+    Spreads bike connections over several bluetooth adapters of one host, e.g. a gateway with
+    a few USB dongles.
+
+    The scheduler is a bleak client factory: pass it as the ``client_factory`` of a
+    ``ConnectionPool`` or ``FleetManager`` and every new connection goes through the adapter
+    with the lowest expected wait, its number of connections times its average latency,
+    among the healthy adapters that saw the bike during ``discover``. Latencies and failures
+    are measured through the instrumentation returned by ``instrumentation``, which must be
+    given to the pool as well.
+
+    An adapter whose average latency exceeds ``max_latency``, or whose link operations fail
+    ``max_failures`` times in a row, is degraded for ``cooldown`` seconds: no new connections
+    go through it, and ``rebalance`` moves its bikes to other adapters.
+
+    Example::
+
+        scheduler = AdapterScheduler(["hci0", "hci1", "hci2"])
+        await scheduler.discover()
+        pool = ConnectionPool(scheduler, instrumentation=scheduler.instrumentation())
+        # At most 4 commands in flight through each of the 3 adapters
+        async with FleetManager(pool=pool, max_concurrency=4) as fleet:
+            ...
+            await scheduler.rebalance(pool)
+
+    Bikes must be added to the pool or fleet without an ``adapter``, otherwise that adapter
+    is always used.
+
+    :param adapters: Names of the adapters to use, e.g. ``["hci0", "hci1"]``.
+    :param client_factory: Callable creating a bleak client for an address, defaults to
+        ``bleak.BleakClient``. Receives the ``adapter`` keyword argument.
+    :param scan: Optional callable receiving an adapter name and a timeout and returning an
+        async iterator of discovered devices. Defaults to ``discover_bike.stream``.
+    :param max_latency: Average latency in seconds above which an adapter is degraded.
+    :param max_failures: Number of failures in a row after which an adapter is degraded.
+    :param cooldown: Number of seconds a degraded adapter is avoided.
+    :param smoothing: Weight between 0 and 1 of the newest sample in the average latency.
+    """
+
+    def __init__(
+        self,
+        adapters: Iterable[str],
+        client_factory: Callable[..., Any] = bleak.BleakClient,
+        scan: Optional[Callable[[str, float], AsyncIterator]] = None,
+        max_latency: float = 1.0,
+        max_failures: int = 3,
+        cooldown: float = 60.0,
+        smoothing: float = 0.2,
+    ) -> None:
+        self.adapters: Dict[str, AdapterStats] = {name: AdapterStats(name) for name in adapters}
+        if not self.adapters:
+            raise ValueError("At least one adapter is needed")
+
+        self._client_factory = client_factory
+        self._scan = scan or _scan_with_bleak
+        self.max_latency = max_latency
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+
+        # Address to the adapters that saw the bike, and to the adapter it is connected through
+        self._visible: Dict[str, Set[str]] = {}
+        self._assignments: Dict[str, str] = {}
+        self._clients: Dict[str, Any] = {}
+
+    async def discover(self, timeout: float = 10.0) -> Dict[str, List[str]]:
+        """
+        Scans on every adapter at the same time, and remembers which adapters see which bikes.
+        An adapter whose scan fails counts a failure.
+
+        :param timeout: Maximum number of seconds to scan.
+        :return: A dict mapping each bike address found to the adapters that saw it.
+        """
+
+        async def scan(name: str) -> List[str]:
+            scan = self._scan(name, timeout)
+            try:
+                return [device.address async for device in scan]
+            finally:
+                await scan.aclose()
+
+        names = list(self.adapters)
+        results = await asyncio.gather(*(scan(name) for name in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                self._record_adapter(self.adapters[name], None, result)
+                continue
+            for address in result:
+                self._visible.setdefault(address, set()).add(name)
+
+        return {
+            address: [name for name in names if name in adapters]
+            for address, adapters in self._visible.items()
+        }
+
+    def adapter(self, address: str) -> Optional[str]:
+        """
+        Returns the adapter a bike is connected through, or None.
+        """
+        return self._assignments.get(address)
+
+    def _candidates(self, address: str) -> List[AdapterStats]:
+        # The adapters that saw the bike, or every adapter if none did
+        return [
+            stats
+            for name, stats in self.adapters.items()
+            if name in self._visible.get(address, self.adapters)
+        ] or list(self.adapters.values())
+
+    def choose(self, address: str) -> str:
+        """
+        Returns the adapter a new connection to a bike should go through.
+        """
+        candidates = self._candidates(address)
+        healthy = [stats for stats in candidates if not stats.degraded] or candidates
+
+        known = [stats.latency for stats in healthy if stats.latency is not None]
+        # Adapters without measurements yet are assumed to be as fast as the fastest one
+        default = min(known) if known else 0.0
+
+        def expected_wait(stats: AdapterStats):
+            connections = len(stats.connections - {address})
+            latency = default if stats.latency is None else stats.latency
+            return ((connections + 1) * latency, connections)
+
+        return min(healthy, key=expected_wait).name
+
+    def _release(self, address: str) -> None:
+        name = self._assignments.pop(address, None)
+        self._clients.pop(address, None)
+        if name is not None:
+            self.adapters[name].connections.discard(address)
+
+    def __call__(
+        self,
+        address: str,
+        disconnected_callback: Optional[Callable[[Any], None]] = None,
+        adapter: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        Creates a bleak client for a bike, through the adapter chosen by ``choose`` unless
+        ``adapter`` is given.
+        """
+        if adapter is None:
+            adapter = self.choose(address)
+
+        def handle_disconnect(bleak_client) -> None:
+            if self._clients.get(address) is bleak_client:
+                self._release(address)
+            if disconnected_callback is not None:
+                disconnected_callback(bleak_client)
+
+        self._release(address)
+        bleak_client = self._client_factory(
+            address,
+            disconnected_callback=handle_disconnect,
+            adapter=adapter,
+            **kwargs,
+        )
+        self._assignments[address] = adapter
+        self._clients[address] = bleak_client
+        if adapter in self.adapters:
+            self.adapters[adapter].connections.add(address)
+        return bleak_client
+
+    def instrumentation(self, forward: Instrumentation = NULL_INSTRUMENTATION) -> Instrumentation:
+        """
+        Returns an instrumentation feeding link latencies and failures to the scheduler. Give
+        it to the ``ConnectionPool`` or ``FleetManager`` using the scheduler.
+
+        :param forward: Optional instrumentation that also receives every measurement.
+        """
+        return _SchedulerInstrumentation(self, forward)
+
+    def record(self, address: str, seconds: float, error: Optional[BaseException] = None) -> None:
+        """
+        Records a link operation of a bike against the adapter it is connected through.
+
+        :param address: The bike address.
+        :param seconds: How long the operation took.
+        :param error: The exception the operation raised, if it failed.
+        """
+        name = self._assignments.get(address)
+        if name in self.adapters:
+            self._record_adapter(self.adapters[name], seconds, error)
+
+    def _record_adapter(
+        self,
+        stats: AdapterStats,
+        seconds: Optional[float],
+        error: Optional[BaseException],
+    ) -> None:
+        if error is not None:
+            stats.failures += 1
+        else:
+            stats.failures = 0
+        if seconds is not None:
+            if stats.latency is None:
+                stats.latency = seconds
+            else:
+                stats.latency += self.smoothing * (seconds - stats.latency)
+
+        unhealthy = stats.failures >= self.max_failures or (
+            stats.latency is not None and stats.latency > self.max_latency
+        )
+        if unhealthy and not stats.degraded:
+            stats.degraded_until = time.monotonic() + self.cooldown
+            # Start afresh once the cooldown is over
+            stats.failures = 0
+            stats.latency = None
+
+    @property
+    def degraded(self) -> List[str]:
+        """
+        The names of the adapters currently degraded.
+        """
+        return [name for name, stats in self.adapters.items() if stats.degraded]
+
+    async def rebalance(self, pool: ConnectionPool) -> Dict[str, str]:
+        """
+        Moves the bikes connected through degraded adapters to healthy ones, by disconnecting
+        and reconnecting them. Commands in flight on a moved bike fail. Bikes no healthy
+        adapter can reach stay where they are.
+
+        :param pool: The pool holding the connections, created with this scheduler.
+        :return: A dict mapping each moved bike address to its new adapter.
+        """
+        moved = {}
+        for name in self.degraded:
+            for address in list(self.adapters[name].connections):
+                if address not in pool:
+                    continue
+                if all(stats.degraded for stats in self._candidates(address)):
+                    # Reconnecting would only go through a degraded adapter again
+                    continue
+                await pool.disconnect(address)
+                self._release(address)
+                try:
+                    await pool.acquire(address)
+                except RECONNECT_ERRORS:
+                    # Left down, the next acquire tries again
+                    continue
+                adapter = self._assignments.get(address)
+                if adapter is not None:
+                    moved[address] = adapter
+        return moved
+
+    async def monitor(self, pool: ConnectionPool, interval: float = 10.0) -> None:
+        """
+        Calls ``rebalance`` every ``interval`` seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            await self.rebalance(pool)
@@ -0,0 +1,264 @@
+import asyncio
+import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import TypeVar
+
+import bleak
+
+from pymoof.clients.sx3 import SX3Client
+from pymoof.fleet.pool import ConnectionPool
+from pymoof.util.instrumentation import Instrumentation
+from pymoof.util.instrumentation import NULL_INSTRUMENTATION
+
+T = TypeVar("T")
+
+
+class LatencyStats:
+    """
+    Running latency statistics for the operations executed against one bike, in seconds.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.last = None
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if self.minimum is None or seconds < self.minimum:
+            self.minimum = seconds
+        if self.maximum is None or seconds > self.maximum:
+            self.maximum = seconds
+
+    @property
+    def mean(self) -> Optional[float]:
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+
+class _Bike:
+    def __init__(self, address: str) -> None:
+        self.address = address
+        # asyncio locks wake waiters in FIFO order, so commands for a bike run in submission
+        # order. Created by the first command, since before Python 3.10 a lock binds to the
+        # event loop running when it is created
+        self.lock: Optional[asyncio.Lock] = None
+        self.latency = LatencyStats()
+
+
+class FleetManager:
+    """
+    Manages connections to many S3/X3 bikes from one host.
+
+    Commands for the same bike run one at a time in submission order. Across bikes, at most
+    ``max_concurrency`` connections or commands are in flight per bluetooth adapter. Since each
+    bike holds at most one slot request at a time, slots are handed out round robin between
+    bikes, so a bike with a long queue cannot starve the others.
+
+    Connections are held by a ``pymoof.fleet.pool.ConnectionPool``, so commands transparently
+    reconnect and re-authenticate bikes whose link dropped.
+
+    Example::
+
+        async with FleetManager() as fleet:
+            fleet.add_bike(address, key, user_key_id)
+            await fleet.connect_all()
+            levels = await fleet.run_all(lambda client: client.get_battery_level())
+
+    :param client_factory: Callable creating a bleak client for an address, defaults to
+        ``bleak.BleakClient``. Receives the address plus the keyword arguments
+        ``disconnected_callback`` and, if the bike was added with one, ``adapter``.
+    :param max_concurrency: Maximum number of concurrent operations per adapter.
+    :param client_options: Extra keyword arguments passed to every ``SX3Client``.
+    :param pool: Optional ``ConnectionPool`` to use instead of creating one from
+        ``client_factory``, ``client_options`` and ``instrumentation``.
+    :param instrumentation: Optional ``pymoof.util.instrumentation.Instrumentation`` for every
+        bike, labeled with the bike's address. Give it to the pool instead when passing one.
+    :raises ValueError: if ``pool`` is given along with ``client_options`` or
+        ``instrumentation``, which only apply to a pool the fleet creates.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[..., Any] = bleak.BleakClient,
+        max_concurrency: int = 4,
+        client_options: Optional[Dict[str, Any]] = None,
+        pool: Optional[ConnectionPool] = None,
+        instrumentation: Instrumentation = NULL_INSTRUMENTATION,
+    ) -> None:
+        if pool is not None:
+            if client_options is not None or instrumentation is not NULL_INSTRUMENTATION:
+                raise ValueError(
+                    "client_options and instrumentation must be given to the pool, not the fleet",
+                )
+        else:
+            pool = ConnectionPool(
+                client_factory,
+                client_options=client_options,
+                instrumentation=instrumentation,
+            )
+
+        self._pool = pool
+        self._max_concurrency = max_concurrency
+        self._bikes = {}
+        self._adapter_slots = {}
+
+    def add_bike(
+        self,
+        address: str,
+        key: str,
+        user_key_id: int,
+        adapter: Optional[str] = None,
+    ) -> None:
+        """
+        Registers a bike with the fleet. This does not connect to it.
+
+        :param address: The bluetooth address of the bike.
+        :param key: The encryption key for the bike from Vanmoof servers
+        :param user_key_id: The user key id for the bike from Vanmoof servers
+        :param adapter: Optional bluetooth adapter to connect through, e.g. ``hci1``.
+        """
+        if address in self._bikes:
+            raise ValueError(f"Bike {address} is already part of the fleet")
+        self._pool.register(address, key, user_key_id, adapter)
+        self._bikes[address] = _Bike(address)
+
+    @property
+    def addresses(self):
+        return list(self._bikes)
+
+    def client(self, address: str) -> SX3Client:
+        """
+        Returns the ``SX3Client`` of a connected bike.
+
+        :raises KeyError: if the bike is not part of the fleet.
+        :raises RuntimeError: if the bike is not connected.
+        """
+        if address not in self._bikes:
+            raise KeyError(f"Bike {address} is not part of the fleet")
+        client = self._pool.client(address)
+        if client is None:
+            raise RuntimeError(f"Bike {address} is not connected")
+        return client
+
+    def latency(self, address: str) -> LatencyStats:
+        """
+        Returns the latency statistics of the commands run against a bike.
+        """
+        return self._bikes[address].latency
+
+    @property
+    def latencies(self) -> Dict[str, LatencyStats]:
+        return {address: bike.latency for address, bike in self._bikes.items()}
+
+    def _slot(self, adapter: Optional[str]) -> asyncio.Semaphore:
+        # Keyed by the adapter the pool connects through, which an ``AdapterScheduler`` picks.
+        # Like the bike locks, slots are created inside the running event loop
+        slot = self._adapter_slots.get(adapter)
+        if slot is None:
+            slot = self._adapter_slots[adapter] = asyncio.Semaphore(self._max_concurrency)
+        return slot
+
+    async def _submit(
+        self,
+        bike: _Bike,
+        operation: Optional[Callable[[SX3Client], Awaitable[T]]] = None,
+    ) -> T:
+        if bike.lock is None:
+            bike.lock = asyncio.Lock()
+        async with bike.lock:
+            start = time.perf_counter()
+            try:
+                # The slot is held while connecting, but not while backing off between attempts
+                client = await self._pool.acquire(bike.address, self._slot)
+                if operation is None:
+                    return client
+                async with self._slot(self._pool.adapter(bike.address)):
+                    return await operation(client)
+            finally:
+                bike.latency.record(time.perf_counter() - start)
+
+    async def _gather(self, coroutines, return_exceptions: bool) -> Dict[str, Any]:
+        results = await asyncio.gather(*coroutines, return_exceptions=return_exceptions)
+        return dict(zip(self._bikes, results))
+
+    async def connect(self, address: str) -> SX3Client:
+        """
+        Connects to and authenticates with a bike if it is not already connected.
+
+        :return: The ``SX3Client`` for the bike.
+        """
+        return await self._submit(self._bikes[address])
+
+    async def connect_all(self, return_exceptions: bool = False) -> Dict[str, Any]:
+        """
+        Connects to every bike concurrently.
+
+        :param return_exceptions: If true, exceptions are returned in place of failed
+            connections instead of being raised.
+        :return: A dictionary of bike address to ``SX3Client``.
+        """
+        return await self._gather(
+            [self.connect(address) for address in self._bikes],
+            return_exceptions,
+        )
+
+    async def disconnect_all(self) -> None:
+        """
+        Disconnects from every bike, ignoring errors.
+        """
+        await self._pool.close()
+
+    async def run(self, address: str, operation: Callable[[SX3Client], Awaitable[T]]) -> T:
+        """
+        Queues an operation for a bike and waits for its result. The bike is connected and
+        authenticated first if its link is down.
+
+        :param address: The bluetooth address of the bike.
+        :param operation: Callable receiving the bike's ``SX3Client`` and returning an awaitable,
+            e.g. ``lambda client: client.get_battery_level()``.
+        """
+        return await self._submit(self._bikes[address], operation)
+
+    async def run_all(
+        self,
+        operation: Callable[[SX3Client], Awaitable[Any]],
+        return_exceptions: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Runs an operation against every bike concurrently.
+
+        :param operation: Callable receiving a ``SX3Client`` and returning an awaitable.
+        :param return_exceptions: If true (the default), exceptions are returned in place of
+            failed results so one unreachable bike does not abort the whole fleet.
+        :return: A dictionary of bike address to result.
+        """
+        return await self._gather(
+            [self.run(address, operation) for address in self._bikes],
+            return_exceptions,
+        )
+
+    async def authenticate_all(self, return_exceptions: bool = True) -> Dict[str, Any]:
+        """
+        Authenticates again with every bike concurrently. Bikes are already authenticated when
+        they connect, so this is only needed after changing keys.
+        """
+        return await self.run_all(
+            lambda client: client.authenticate(force=True),
+            return_exceptions,
+        )
+
+    async def __aenter__(self) -> "FleetManager":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.disconnect_all()
@@ -0,0 +1,288 @@
+import asyncio
+import random
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+
+import bleak
+import bleak.exc
+
+from pymoof.clients.sx3 import SX3Client
+from pymoof.util.instrumentation import Instrumentation
+from pymoof.util.instrumentation import NULL_INSTRUMENTATION
+
+# Errors that mean the link is gone or could not be established, and are worth retrying
+RECONNECT_ERRORS = (bleak.exc.BleakError, asyncio.TimeoutError, OSError)
+
+
+class _NoSlot:
+    async def __aenter__(self) -> None:
+        pass
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+
+class _Connection:
+    def __init__(
+        self,
+        address: str,
+        key: str,
+        user_key_id: int,
+        adapter: Optional[str],
+    ) -> None:
+        self.address = address
+        self.key = key
+        self.user_key_id = user_key_id
+        self.adapter = adapter
+        self.bleak_client = None
+        self.client = None
+        # Created by the first connection attempt, since before Python 3.10 a lock binds to
+        # the event loop running when it is created
+        self.lock: Optional[asyncio.Lock] = None
+        self.reconnect_task = None
+        self.closed = False
+        self.connects = 0
+        # The adapter of the current or last connection attempt
+        self.connected_adapter: Optional[str] = adapter
+        self.instrumentation = NULL_INSTRUMENTATION
+
+
+class ConnectionPool:
+    """
+    Keeps authenticated connections to bikes, keyed by bluetooth address.
+
+    ``acquire`` returns a connected and authenticated ``SX3Client``, connecting first if needed.
+    Concurrent callers for the same bike share a single connection attempt. When a link drops
+    unexpectedly, its client is discarded and, if ``keep_alive`` is set, a background task
+    reconnects and re-authenticates with exponential backoff so the next caller finds a warm
+    link. Backoff delays are jittered so that many bikes dropping at once do not reconnect in
+    lockstep.
+
+    :param client_factory: Callable creating a bleak client for an address, defaults to
+        ``bleak.BleakClient``. Receives the address plus the keyword arguments
+        ``disconnected_callback`` and, if the bike was registered with one, ``adapter``. A
+        factory with a ``choose`` method, like ``pymoof.fleet.adapters.AdapterScheduler``, is
+        asked for the adapter of each bike registered without one.
+    :param max_attempts: Number of connection attempts before giving up.
+    :param initial_backoff: Delay in seconds after the first failed attempt.
+    :param max_backoff: Upper bound in seconds for the delay between attempts.
+    :param keep_alive: Whether to reconnect in the background after a link drops.
+    :param client_options: Extra keyword arguments passed to every ``SX3Client``.
+    :param instrumentation: Optional ``pymoof.util.instrumentation.Instrumentation``. Each
+        client gets a copy labeled with its bike's address, and connection attempts and
+        retries are recorded as the ``connect`` operation.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[..., Any] = bleak.BleakClient,
+        max_attempts: int = 5,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        keep_alive: bool = True,
+        client_options: Optional[Dict[str, Any]] = None,
+        instrumentation: Instrumentation = NULL_INSTRUMENTATION,
+    ) -> None:
+        self._client_factory = client_factory
+        self._instrumentation = instrumentation
+        self._max_attempts = max_attempts
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+        self._keep_alive = keep_alive
+        self._client_options = client_options or {}
+        self._connections = {}
+
+    def register(
+        self,
+        address: str,
+        key: str,
+        user_key_id: int,
+        adapter: Optional[str] = None,
+    ) -> None:
+        """
+        Registers a bike with the pool. This does not connect to it.
+
+        :param address: The bluetooth address of the bike.
+        :param key: The encryption key for the bike from Vanmoof servers
+        :param user_key_id: The user key id for the bike from Vanmoof servers
+        :param adapter: Optional bluetooth adapter to connect through, e.g. ``hci1``.
+        """
+        if address in self._connections:
+            raise ValueError(f"Bike {address} is already registered")
+        connection = _Connection(address, key, user_key_id, adapter)
+        connection.instrumentation = self._instrumentation.labeled(bike=address)
+        self._connections[address] = connection
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._connections
+
+    def client(self, address: str) -> Optional[SX3Client]:
+        """
+        Returns the current ``SX3Client`` for a bike, or None if it is not connected.
+        """
+        return self._connections[address].client
+
+    def adapter(self, address: str) -> Optional[str]:
+        """
+        Returns the adapter a bike is connected through, or was last connected through. None
+        if the bike never connected through a named adapter.
+        """
+        return self._connections[address].connected_adapter
+
+    def connect_count(self, address: str) -> int:
+        """
+        Returns how many times a connection to the bike was established.
+        """
+        return self._connections[address].connects
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns the delay in seconds before retrying after ``attempt`` failed attempts.
+        """
+        delay = min(self._max_backoff, self._initial_backoff * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _choose_adapter(self, connection: _Connection) -> Optional[str]:
+        if connection.adapter is not None:
+            return connection.adapter
+        # A factory spreading connections over adapters, like ``AdapterScheduler``, picks one
+        choose = getattr(self._client_factory, "choose", None)
+        return None if choose is None else choose(connection.address)
+
+    async def _connect_once(self, connection: _Connection, adapter: Optional[str]) -> None:
+        kwargs = {
+            "disconnected_callback": lambda client: self._handle_disconnect(connection, client),
+        }
+        if adapter is not None:
+            kwargs["adapter"] = adapter
+
+        bleak_client = self._client_factory(connection.address, **kwargs)
+        await bleak_client.connect()
+
+        options = dict(self._client_options)
+        if connection.instrumentation.enabled:
+            options["instrumentation"] = connection.instrumentation
+
+        client = SX3Client(bleak_client, connection.key, connection.user_key_id, **options)
+        try:
+            await client.authenticate()
+        except BaseException:
+            await bleak_client.disconnect()
+            raise
+
+        connection.bleak_client = bleak_client
+        connection.client = client
+        connection.connects += 1
+
+    async def _connect(self, connection: _Connection, slot=None) -> SX3Client:
+        if connection.lock is None:
+            connection.lock = asyncio.Lock()
+        async with connection.lock:
+            attempt = 0
+            instrumentation = connection.instrumentation
+            while connection.client is None:
+                attempt += 1
+                start = time.perf_counter()
+                adapter = connection.connected_adapter = self._choose_adapter(connection)
+                try:
+                    async with _NoSlot() if slot is None else slot(adapter):
+                        await self._connect_once(connection, adapter)
+                except RECONNECT_ERRORS as e:
+                    if instrumentation.enabled:
+                        instrumentation.record_operation(
+                            "connect",
+                            "",
+                            time.perf_counter() - start,
+                            error=e,
+                        )
+                    if attempt >= self._max_attempts:
+                        raise
+                    if instrumentation.enabled:
+                        instrumentation.record_retry("connect", "")
+                    await asyncio.sleep(self.backoff(attempt))
+                else:
+                    if instrumentation.enabled:
+                        instrumentation.record_operation(
+                            "connect",
+                            "",
+                            time.perf_counter() - start,
+                        )
+
+            return connection.client
+
+    def _handle_disconnect(self, connection: _Connection, bleak_client) -> None:
+        if bleak_client is not connection.bleak_client:
+            # A late callback from a link that was already replaced or torn down
+            return
+
+        if connection.client is not None:
+            connection.client.handle_disconnect()
+        connection.client = None
+        connection.bleak_client = None
+
+        if self._keep_alive and not connection.closed and connection.reconnect_task is None:
+            connection.reconnect_task = asyncio.ensure_future(self._reconnect(connection))
+
+    async def _reconnect(self, connection: _Connection) -> None:
+        try:
+            await self._connect(connection)
+        except RECONNECT_ERRORS:
+            # Leave the link down, the next acquire will try again
+            pass
+        finally:
+            connection.reconnect_task = None
+
+    async def acquire(self, address: str, slot=None) -> SX3Client:
+        """
+        Returns a connected and authenticated client for a bike.
+
+        :param address: The bluetooth address of a registered bike.
+        :param slot: Optional callable receiving the adapter of each connection attempt, or
+            None, and returning an async context manager, e.g. an ``asyncio.Semaphore``. It is
+            held during the attempt but not while backing off between attempts.
+        :raises KeyError: if the bike is not registered.
+        :raises ``bleak.exc.BleakError``: if no connection could be made within ``max_attempts``.
+        """
+        connection = self._connections[address]
+        connection.closed = False
+        if connection.client is not None:
+            return connection.client
+        return await self._connect(connection, slot)
+
+    async def disconnect(self, address: str) -> None:
+        """
+        Disconnects from a bike without reconnecting. A later ``acquire`` connects again.
+        """
+        connection = self._connections[address]
+        connection.closed = True
+
+        if connection.reconnect_task is not None:
+            connection.reconnect_task.cancel()
+            connection.reconnect_task = None
+
+        bleak_client = connection.bleak_client
+        if connection.client is not None:
+            connection.client.handle_disconnect()
+        connection.client = None
+        connection.bleak_client = None
+
+        if bleak_client is not None:
+            await bleak_client.disconnect()
+
+    async def close(self) -> None:
+        """
+        Disconnects from every bike, ignoring errors.
+        """
+        await asyncio.gather(
+            *[self.disconnect(address) for address in self._connections],
+            return_exceptions=True,
+        )
+
+    async def __aenter__(self) -> "ConnectionPool":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
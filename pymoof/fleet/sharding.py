@@ -0,0 +1,506 @@
+"""
+Runs a fleet across several processes, each with its own event loop, so that decrypting,
+parsing and scheduling for hundreds of bikes is not limited to one core.
+
+Processes talk over pipes. Every message is one kind byte followed by its payload:
+
+====  ===============  ==============================================================
+Kind  Direction        Payload
+====  ===============  ==============================================================
+a     to worker        Pickled ``(address, key, user_key_id, adapter)`` of a new bike
+r     to worker        Request id (uint32), then pickled ``(addresses, operation)``
+r     to parent        Request id (uint32), then the pickled list of results
+t     to worker        Telemetry interval in seconds (float64), 0 to stop
+t     to parent        Telemetry records, packed as in ``pymoof.telemetry.log``
+q     to worker        Stop
+====  ===============  ==============================================================
+"""
+import asyncio
+import itertools
+import multiprocessing
+import os
+import pickle
+import struct
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import bleak
+
+from pymoof.fleet.manager import FleetManager
+from pymoof.telemetry.log import bike_id
+from pymoof.telemetry.log import pack_record
+from pymoof.telemetry.recorder import FIELDS
+
+_ADD = b"a"
+_RUN = b"r"
+_TELEMETRY = b"t"
+_STOP = b"q"
+
+_REQUEST = struct.Struct("<cI")
+_INTERVAL = struct.Struct("<cd")
+
+
+def _dumps(results: List[Any]) -> bytes:
+    try:
+        return pickle.dumps(results, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        pass
+
+    picklable = []
+    for result in results:
+        try:
+            pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            result = RuntimeError(f"Result cannot be sent to the parent process: {result!r}")
+        picklable.append(result)
+    return pickle.dumps(picklable, pickle.HIGHEST_PROTOCOL)
+
+
+def _snapshot(client):
+    return client.snapshot(FIELDS)
+
+
+class _Worker:
+    def __init__(self, connection, fleet: FleetManager) -> None:
+        self._connection = connection
+        self._fleet = fleet
+        self._tasks = set()
+        self._telemetry = None
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        inbox = asyncio.Queue()
+
+        def receive() -> None:
+            # Blocking reads happen on a thread, so the event loop never waits on the pipe
+            try:
+                while True:
+                    frame = self._connection.recv_bytes()
+                    loop.call_soon_threadsafe(inbox.put_nowait, frame)
+                    if frame[:1] == _STOP:
+                        return
+            except (EOFError, OSError):
+                loop.call_soon_threadsafe(inbox.put_nowait, _STOP)
+
+        threading.Thread(target=receive, daemon=True).start()
+        try:
+            while True:
+                frame = await inbox.get()
+                kind = frame[:1]
+                if kind == _STOP:
+                    break
+                elif kind == _ADD:
+                    self._fleet.add_bike(*pickle.loads(memoryview(frame)[1:]))
+                elif kind == _RUN:
+                    self._spawn(self._run(frame))
+                elif kind == _TELEMETRY:
+                    self._set_telemetry(_INTERVAL.unpack(frame)[1])
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self._fleet.disconnect_all()
+            self._connection.close()
+
+    async def _run(self, frame: bytes) -> None:
+        request = _REQUEST.unpack_from(frame)[1]
+        addresses, operation = pickle.loads(memoryview(frame)[_REQUEST.size :])
+
+        async def call(address: str) -> Any:
+            if operation is None:
+                await self._fleet.connect(address)
+                return None
+            return await self._fleet.run(address, operation)
+
+        results = await asyncio.gather(*map(call, addresses), return_exceptions=True)
+        self._connection.send_bytes(_REQUEST.pack(_RUN, request) + _dumps(results))
+
+    def _set_telemetry(self, interval: float) -> None:
+        if self._telemetry is not None:
+            self._telemetry.cancel()
+            self._telemetry = None
+        if interval > 0:
+            self._telemetry = self._spawn(self._record(interval))
+
+    async def _record(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            addresses = self._fleet.addresses
+            snapshots = await asyncio.gather(
+                *(self._fleet.run(address, _snapshot) for address in addresses),
+                return_exceptions=True,
+            )
+
+            records = bytearray()
+            for address, snapshot in zip(addresses, snapshots):
+                if isinstance(snapshot, BaseException):
+                    # Sent with every field missing, so gaps stay visible
+                    records += pack_record(time.time(), bike_id(address))
+                else:
+                    records += pack_record(
+                        snapshot.timestamp,
+                        bike_id(address),
+                        **{name: snapshot.get(member) for member, name in FIELDS.items()},
+                    )
+            if records:
+                self._connection.send_bytes(_TELEMETRY + records)
+
+            await asyncio.sleep(max(0.0, interval - (loop.time() - start)))
+
+
+def _worker(
+    connection,
+    client_factory: Callable[..., Any],
+    max_concurrency: int,
+    client_options: Optional[Dict[str, Any]],
+) -> None:
+    fleet = FleetManager(
+        client_factory,
+        max_concurrency=max_concurrency,
+        client_options=client_options,
+    )
+    asyncio.run(_Worker(connection, fleet).serve())
+
+
+class _Shard:
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.bikes: List[Tuple[str, str, int, Optional[str]]] = []
+        self.process = None
+        self.connection = None
+        self.reader = None
+
+
+class ShardedFleet:
+    """
+    Manages connections to many S3/X3 bikes from one host, spread over worker processes.
+
+    Each worker runs a ``FleetManager`` on its own event loop with its own ``SX3Client``
+    objects, and bikes are assigned to the worker with the fewest bikes. The parent sends
+    operations to the workers over pipes and gathers the results, so the API mirrors
+    ``FleetManager`` except that clients never leave their worker: operations must be
+    picklable, e.g. ``operator.methodcaller("get_battery_level")``, ``functools.partial`` or
+    a module level function, and so must their results.
+
+    Workers are started with the ``spawn`` method by default, so scripts using this must guard
+    their entry point with ``if __name__ == "__main__":``.
+
+    Example::
+
+        async with ShardedFleet(workers=4) as fleet:
+            fleet.add_bike(address, key, user_key_id)
+            await fleet.connect_all()
+            levels = await fleet.run_all(operator.methodcaller("get_battery_level"))
+
+    :param client_factory: Picklable callable creating a bleak client for an address,
+        defaults to ``bleak.BleakClient``. A ``pymoof.simulators.sx3.Simulator`` without
+        connected clients works too, each worker getting its own copy.
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+    :param max_concurrency: Maximum number of concurrent operations per adapter and worker.
+    :param client_options: Extra keyword arguments passed to every ``SX3Client``. Must be
+        picklable.
+    :param context: Optional ``multiprocessing`` context to start workers with.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[..., Any] = bleak.BleakClient,
+        workers: Optional[int] = None,
+        max_concurrency: int = 4,
+        client_options: Optional[Dict[str, Any]] = None,
+        context: Optional[multiprocessing.context.BaseContext] = None,
+    ) -> None:
+        self._client_factory = client_factory
+        self._max_concurrency = max_concurrency
+        self._client_options = client_options
+        self._context = context or multiprocessing.get_context("spawn")
+        self._shards = [_Shard(index) for index in range(workers or os.cpu_count() or 1)]
+        self._bikes: Dict[str, _Shard] = {}
+        self._pending: Dict[int, Tuple[_Shard, asyncio.Future]] = {}
+        self._requests = itertools.count()
+        self._telemetry_callback = None
+        self._loop = None
+
+    @property
+    def workers(self) -> int:
+        return len(self._shards)
+
+    @property
+    def addresses(self) -> List[str]:
+        return list(self._bikes)
+
+    def shard(self, address: str) -> int:
+        """
+        Returns the index of the worker handling a bike.
+
+        :raises KeyError: if the bike is not part of the fleet.
+        """
+        return self._bikes[address].index
+
+    def add_bike(
+        self,
+        address: str,
+        key: str,
+        user_key_id: int,
+        adapter: Optional[str] = None,
+    ) -> None:
+        """
+        Registers a bike with the fleet. This does not connect to it.
+
+        :param address: The bluetooth address of the bike.
+        :param key: The encryption key for the bike from Vanmoof servers
+        :param user_key_id: The user key id for the bike from Vanmoof servers
+        :param adapter: Optional bluetooth adapter to connect through, e.g. ``hci1``.
+        """
+        if address in self._bikes:
+            raise ValueError(f"Bike {address} is already part of the fleet")
+        shard = min(self._shards, key=lambda shard: len(shard.bikes))
+        bike = (address, key, user_key_id, adapter)
+        shard.bikes.append(bike)
+        self._bikes[address] = shard
+        if shard.connection is not None:
+            shard.connection.send_bytes(_ADD + pickle.dumps(bike, pickle.HIGHEST_PROTOCOL))
+
+    async def start(self) -> None:
+        """
+        Starts the worker processes. Called by ``async with``.
+        """
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+
+        # Every worker is started before any reader thread, so no thread is forked
+        for shard in self._shards:
+            shard.connection, child = self._context.Pipe()
+            shard.process = self._context.Process(
+                target=_worker,
+                args=(child, self._client_factory, self._max_concurrency, self._client_options),
+                name=f"pymoof-shard-{shard.index}",
+                daemon=True,
+            )
+            shard.process.start()
+            child.close()
+
+        for shard in self._shards:
+            shard.reader = threading.Thread(target=self._receive, args=(shard,), daemon=True)
+            shard.reader.start()
+            for bike in shard.bikes:
+                shard.connection.send_bytes(_ADD + pickle.dumps(bike, pickle.HIGHEST_PROTOCOL))
+
+    def _receive(self, shard: _Shard) -> None:
+        try:
+            while True:
+                frame = shard.connection.recv_bytes()
+                self._loop.call_soon_threadsafe(self._dispatch, frame)
+        except (EOFError, OSError):
+            pass
+
+        try:
+            self._loop.call_soon_threadsafe(self._fail_pending, shard)
+        except RuntimeError:
+            # The event loop is already closed
+            pass
+
+    def _dispatch(self, frame: bytes) -> None:
+        kind = frame[:1]
+        if kind == _RUN:
+            request = _REQUEST.unpack_from(frame)[1]
+            shard, future = self._pending.pop(request, (None, None))
+            if future is not None and not future.done():
+                future.set_result(pickle.loads(memoryview(frame)[_REQUEST.size :]))
+        elif kind == _TELEMETRY and self._telemetry_callback is not None:
+            self._telemetry_callback(memoryview(frame)[1:])
+
+    def _fail_pending(self, shard: _Shard) -> None:
+        for request, (owner, future) in list(self._pending.items()):
+            if owner is shard:
+                del self._pending[request]
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Worker {shard.index} exited"))
+
+    async def _request(self, shard: _Shard, addresses: List[str], operation) -> List[Any]:
+        if shard.connection is None:
+            raise RuntimeError("The fleet is not started")
+        if not shard.process.is_alive():
+            raise RuntimeError(f"Worker {shard.index} exited")
+
+        try:
+            payload = pickle.dumps((addresses, operation), pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            raise TypeError(
+                f"{operation!r} cannot be sent to a worker process, use a module level "
+                "function, functools.partial or operator.methodcaller",
+            ) from e
+
+        request = next(self._requests) & 0xFFFFFFFF
+        future = self._loop.create_future()
+        self._pending[request] = (shard, future)
+        try:
+            shard.connection.send_bytes(_REQUEST.pack(_RUN, request) + payload)
+            return await future
+        finally:
+            self._pending.pop(request, None)
+
+    async def _run_all(self, operation, return_exceptions: bool) -> Dict[str, Any]:
+        # Bikes added while the request is in flight are not part of it
+        requests = [
+            (shard, [bike[0] for bike in shard.bikes]) for shard in self._shards if shard.bikes
+        ]
+        responses = await asyncio.gather(
+            *(self._request(shard, addresses, operation) for shard, addresses in requests),
+            return_exceptions=True,
+        )
+
+        results = {}
+        for (shard, addresses), response in zip(requests, responses):
+            if isinstance(response, BaseException):
+                # A worker that failed as a whole fails each of its bikes
+                response = [response] * len(addresses)
+            results.update(zip(addresses, response))
+
+        results = {address: results[address] for address in self._bikes if address in results}
+        if not return_exceptions:
+            for result in results.values():
+                if isinstance(result, BaseException):
+                    raise result
+        return results
+
+    async def _run(self, address: str, operation) -> Any:
+        (result,) = await self._request(self._bikes[address], [address], operation)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    async def connect(self, address: str) -> None:
+        """
+        Connects to and authenticates with a bike if it is not already connected.
+        """
+        await self._run(address, None)
+
+    async def connect_all(self, return_exceptions: bool = False) -> Dict[str, Any]:
+        """
+        Connects to every bike concurrently.
+
+        :param return_exceptions: If true, exceptions are returned in place of failed
+            connections instead of being raised.
+        :return: A dictionary of bike address to None, or the exception.
+        """
+        return await self._run_all(None, return_exceptions)
+
+    async def run(self, address: str, operation: Callable[[Any], Any]) -> Any:
+        """
+        Runs an operation for a bike in its worker and waits for its result. The bike is
+        connected and authenticated first if its link is down.
+
+        :param address: The bluetooth address of the bike.
+        :param operation: Picklable callable receiving the bike's ``SX3Client`` and returning
+            an awaitable, e.g. ``operator.methodcaller("get_battery_level")``.
+        :raises TypeError: if the operation cannot be pickled.
+        """
+        return await self._run(address, operation)
+
+    async def run_all(
+        self,
+        operation: Callable[[Any], Any],
+        return_exceptions: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Runs an operation against every bike concurrently. The operation is sent once to each
+        worker, with the addresses of its bikes.
+
+        :param operation: Picklable callable receiving a ``SX3Client`` and returning an
+            awaitable.
+        :param return_exceptions: If true (the default), exceptions are returned in place of
+            failed results so one unreachable bike does not abort the whole fleet.
+        :return: A dictionary of bike address to result.
+        """
+        return await self._run_all(operation, return_exceptions)
+
+    def _broadcast(self, frame: bytes) -> None:
+        if self._loop is None:
+            raise RuntimeError("The fleet is not started")
+        for shard in self._shards:
+            shard.connection.send_bytes(frame)
+
+    def start_telemetry(
+        self,
+        callback: Callable[[memoryview], None],
+        interval: float = 1.0,
+    ) -> None:
+        """
+        Makes every worker sample speed, distance, battery level and lock state of its bikes
+        every ``interval`` seconds, and send them to the parent as packed telemetry records.
+
+        Example::
+
+            with TelemetryWriter("logs") as writer:
+                autosync = asyncio.ensure_future(writer.autosync())
+                fleet.start_telemetry(writer.extend, interval=5)
+
+        :param callback: Called on the event loop with each batch of records, a whole number
+            of ``pymoof.telemetry.log.RECORD`` structs. Decode them with
+            ``pymoof.telemetry.log.unpack_records`` or append them with
+            ``TelemetryWriter.extend``, with the writer's ``autosync`` running so the
+            callback never blocks on ``fsync``. The view is only valid during the call.
+        :param interval: Number of seconds between samples.
+        """
+        self._telemetry_callback = callback
+        self._broadcast(_INTERVAL.pack(_TELEMETRY, interval))
+
+    def stop_telemetry(self) -> None:
+        """
+        Stops sampling telemetry. Batches already sent are still passed to the callback.
+        """
+        self._broadcast(_INTERVAL.pack(_TELEMETRY, 0.0))
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """
+        Disconnects from every bike and stops the workers. Workers that do not stop within
+        ``timeout`` seconds are terminated.
+        """
+        if self._loop is None:
+            return
+
+        for shard in self._shards:
+            try:
+                shard.connection.send_bytes(_STOP)
+            except OSError:
+                pass
+
+        def join(shard: _Shard) -> None:
+            shard.process.join(timeout)
+            if shard.process.is_alive():
+                shard.process.terminate()
+                shard.process.join()
+            shard.reader.join()
+
+        await asyncio.gather(
+            *(self._loop.run_in_executor(None, join, shard) for shard in self._shards),
+        )
+        for shard in self._shards:
+            self._fail_pending(shard)
+            shard.connection.close()
+            shard.connection = None
+            shard.process = None
+            shard.reader = None
+        self._loop = None
+
+    async def __aenter__(self) -> "ShardedFleet":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
@@ -0,0 +1,197 @@
+"""
+Decoders turning S3/X3 characteristic payloads into typed values.
+
+``CODECS`` holds a codec for every characteristic of ``SX3Profile`` whose format is known,
+either from the values the bike returns or from the payloads ``SX3Client`` writes. Fixed
+layout values use a precompiled ``struct.Struct``, so decoding is a single C call.
+``decode_many`` decodes a buffer of many records at once, e.g. the output of
+``SX3Profile.decrypt_buffer`` over a recorded log, where every record is one 16 byte block.
+
+Characteristics whose format is not known, such as ``ERRORS`` or ``WHEEL_SIZE``, have no
+codec and decode to ``bytes``. Enum values are decoded to integers; ``SX3Client`` turns
+them into enums.
+"""
+import struct
+from typing import Callable
+from typing import List
+from typing import Optional
+
+from pymoof.profiles.sx3 import BLOCK_SIZE
+from pymoof.profiles.sx3 import SX3Profile
+
+
+class Codec:
+    """
+    Decodes a payload to ``bytes`` unchanged. Base class of the other codecs.
+
+    :param record_size: Size in bytes of one record in buffers given to ``decode_many``.
+    """
+
+    __slots__ = ("record_size",)
+
+    def __init__(self, record_size: int = BLOCK_SIZE) -> None:
+        self.record_size = record_size
+
+    def decode(self, data) -> object:
+        """
+        Decodes one payload. Bytes after the value, such as block padding, are ignored.
+        """
+        return bytes(data)
+
+    def _check_records(self, buffer) -> memoryview:
+        view = memoryview(buffer)
+        if view.nbytes % self.record_size:
+            raise ValueError(
+                f"The length of the provided data is not a multiple of {self.record_size} bytes",
+            )
+        return view
+
+    def decode_many(self, buffer) -> List[object]:
+        """
+        Decodes a contiguous buffer of ``record_size`` byte records.
+
+        :param buffer: A bytes-like object. Must be a multiple of ``record_size`` bytes long.
+        :return: A list of values, one per record, in order.
+        """
+        view = self._check_records(buffer)
+        size = self.record_size
+        return [self.decode(view[offset : offset + size]) for offset in range(0, len(view), size)]
+
+
+class TextCodec(Codec):
+    """
+    Decodes an ASCII string, dropping trailing NUL padding. Bytes that are not ASCII are
+    replaced with U+FFFD rather than failing.
+    """
+
+    __slots__ = ()
+
+    def decode(self, data) -> str:
+        return bytes(data).rstrip(b"\x00").decode("ascii", errors="replace")
+
+
+class StructCodec(Codec):
+    """
+    Decodes a fixed layout value with a precompiled ``struct`` format.
+
+    :param format: A ``struct`` format string, e.g. ``"<I"``.
+    :param convert: Optional callable receiving the unpacked fields and returning the value.
+        Without it, a single field is returned as is and several fields as a tuple.
+    :param record_size: Size in bytes of one record in buffers given to ``decode_many``.
+    """
+
+    __slots__ = ("format", "convert", "_struct", "_records", "_single")
+
+    def __init__(
+        self,
+        format: str,
+        convert: Optional[Callable[..., object]] = None,
+        record_size: int = BLOCK_SIZE,
+    ) -> None:
+        super().__init__(record_size)
+        self.format = format
+        self.convert = convert
+        self._struct = struct.Struct(format)
+        if self._struct.size > record_size:
+            raise ValueError(f"Format {format!r} does not fit in {record_size} bytes")
+        # Skips the rest of each record, so a whole buffer unpacks with one iter_unpack
+        self._records = struct.Struct(f"{format}{record_size - self._struct.size}x")
+        self._single = len(self._struct.unpack_from(bytes(self._struct.size))) == 1
+
+    @property
+    def size(self) -> int:
+        return self._struct.size
+
+    def decode(self, data) -> object:
+        values = self._struct.unpack_from(data)
+        if self.convert is not None:
+            return self.convert(*values)
+        return values[0] if self._single else values
+
+    def decode_many(self, buffer) -> List[object]:
+        rows = self._records.iter_unpack(self._check_records(buffer))
+        if self.convert is not None:
+            convert = self.convert
+            return [convert(*row) for row in rows]
+        if self._single:
+            return [row[0] for row in rows]
+        return list(rows)
+
+
+def _uint128(low: int, high: int) -> int:
+    # The whole 16 byte block, as one little endian integer
+    return low | high << 64
+
+
+def _hectometers(low: int, high: int) -> float:
+    # Returns kilometers, stored as hectometers
+    return _uint128(low, high) / 10
+
+
+RAW = Codec()
+TEXT = TextCodec()
+UINT8 = StructCodec("<B")
+
+CODECS = {
+    # A LockState value
+    SX3Profile.Defense.LOCK_STATE: UINT8,
+    SX3Profile.Defense.ALARM_STATE: UINT8,
+    SX3Profile.Defense.ALARM_MODE: UINT8,
+    # Kilometers, as a float
+    SX3Profile.Movement.DISTANCE: StructCodec("<QQ", _hectometers),
+    # Kilometers per hour
+    SX3Profile.Movement.SPEED: StructCodec("<QQ", _uint128),
+    SX3Profile.Movement.UNIT_SYSTEM: UINT8,
+    # As written by SX3Client.set_power_level
+    SX3Profile.Movement.POWER_LEVEL: UINT8,
+    SX3Profile.Movement.SPEED_LIMIT: UINT8,
+    SX3Profile.Movement.E_SHIFTER_GEAR: UINT8,
+    # The speeds in kilometers per hour at which the e-shifter changes gear, as a tuple
+    SX3Profile.Movement.E_SHIFTIG_POINTS: StructCodec("<3B"),
+    SX3Profile.Movement.E_SHIFTER_MODE: UINT8,
+    # Percent
+    SX3Profile.BikeInfo.MOTOR_BATTERY_LEVEL: UINT8,
+    SX3Profile.BikeInfo.MODULE_BATTERY_LEVEL: UINT8,
+    SX3Profile.BikeInfo.BIKE_FIRMWARE_VERSION: TEXT,
+    SX3Profile.BikeInfo.BLE_CHIP_FIRMWARE_VERSION: TEXT,
+    SX3Profile.BikeInfo.CONTROLLER_FIRMWARE_VERSION: TEXT,
+    SX3Profile.BikeInfo.PCBA_HARDWARE_VERSION: TEXT,
+    SX3Profile.BikeInfo.GSM_FIRMWARE_VERSION: TEXT,
+    SX3Profile.BikeInfo.E_SHIFTER_FIRMWARE_VERSION: TEXT,
+    SX3Profile.BikeInfo.BATTERY_FIRMWARE_VERSION: TEXT,
+    SX3Profile.BikeInfo.FRAME_NUMBER: TEXT,
+    SX3Profile.BikeState.MODULE_MODE: UINT8,
+    SX3Profile.BikeState.MODULE_STATE: UINT8,
+    # Seconds since the unix epoch
+    SX3Profile.BikeState.CLOCK: StructCodec("<I"),
+    SX3Profile.Sound.SOUND_VOLUME: UINT8,
+    # A BellTone value, as written by SX3Client.set_bell_tone
+    SX3Profile.Sound.BELL_SOUND: UINT8,
+    SX3Profile.Light.LIGHT_MODE: UINT8,
+}
+
+
+def decode(characteristic, data) -> object:
+    """
+    Decodes one payload of a characteristic.
+
+    :param characteristic: A characteristic enum member, e.g. ``SX3Profile.Movement.SPEED``.
+    :param data: The decrypted payload.
+    """
+    return CODECS.get(characteristic, RAW).decode(data)
+
+
+def decode_many(characteristic, buffer) -> List[object]:
+    """
+    Decodes many payloads of one characteristic at once.
+
+    Example::
+
+        plaintext = profile.decrypt_buffer(b"".join(recorded_speed_payloads))
+        speeds = codecs.decode_many(SX3Profile.Movement.SPEED, plaintext)
+
+    :param characteristic: A characteristic enum member, e.g. ``SX3Profile.Movement.SPEED``.
+    :param buffer: Decrypted payloads joined together, each 16 bytes long.
+    :return: A list of values, one per payload, in order.
+    """
+    return CODECS.get(characteristic, RAW).decode_many(buffer)
@@ -0,0 +1,197 @@
+"""
+A precomputed, read-only table of every characteristic in a GATT profile.
+
+The profile enums are convenient to write but slow to inspect: reaching a characteristic's
+service goes through ``type(member).SERVICE_UUID.value``, and every ``.value`` or ``.name``
+is a Python level property. The registry walks the enums once and stores the results in
+plain records, indexed by enum member, characteristic UUID and name.
+"""
+import enum
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+
+from pymoof.profiles.codecs import CODECS
+from pymoof.profiles.sx3 import SX3Profile
+
+
+class Characteristic:
+    """
+    Everything known about one characteristic. Records are immutable.
+
+    :param member: The characteristic enum member, e.g. ``SX3Profile.Movement.SPEED``.
+    :param name: The member name, e.g. ``SPEED``.
+    :param uuid: The characteristic UUID.
+    :param service: The service enum the characteristic belongs to.
+    :param service_uuid: The UUID of that service.
+    :param encrypted: Whether payloads are AES encrypted with the bike key.
+    :param readable: Whether the characteristic can be read, as opposed to only written.
+    :param parser: Optional callable turning a decrypted payload into a value, or None if the
+        format is unknown.
+    """
+
+    __slots__ = (
+        "member",
+        "name",
+        "uuid",
+        "service",
+        "service_uuid",
+        "encrypted",
+        "readable",
+        "parser",
+    )
+
+    def __init__(
+        self,
+        member: enum.Enum,
+        name: str,
+        uuid: str,
+        service: type,
+        service_uuid: str,
+        encrypted: bool = True,
+        readable: bool = True,
+        parser: Optional[Callable[[bytes], object]] = None,
+    ) -> None:
+        set_attribute = super().__setattr__
+        set_attribute("member", member)
+        set_attribute("name", name)
+        set_attribute("uuid", uuid)
+        set_attribute("service", service)
+        set_attribute("service_uuid", service_uuid)
+        set_attribute("encrypted", encrypted)
+        set_attribute("readable", readable)
+        set_attribute("parser", parser)
+
+    @classmethod
+    def from_enum(cls, member: enum.Enum, **kwargs) -> "Characteristic":
+        return cls(
+            member,
+            member.name,
+            member.value,
+            type(member),
+            member.SERVICE_UUID.value,
+            **kwargs,
+        )
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return f"Characteristic({self.service.__name__}.{self.name}, {self.uuid})"
+
+
+class CharacteristicRegistry:
+    """
+    An immutable set of ``Characteristic`` records with O(1) lookups.
+
+    Records can be looked up by enum member, by characteristic UUID, by qualified name such
+    as ``Movement.SPEED``, or by bare name such as ``SPEED`` when it is unique.
+
+    :param services: Service enums, e.g. ``SX3Profile.SERVICES``. Each must have a
+        ``SERVICE_UUID`` member; every other member is a characteristic.
+    :param unencrypted: Characteristic members whose payloads are sent in plaintext.
+    :param write_only: Characteristic members that cannot be read.
+    :param parsers: Optional mapping of characteristic member to parser.
+    """
+
+    __slots__ = ("_records", "_index", "_service_uuids")
+
+    def __init__(
+        self,
+        services: Iterable[type],
+        unencrypted: Iterable[enum.Enum] = (),
+        write_only: Iterable[enum.Enum] = (),
+        parsers: Optional[Dict[enum.Enum, Callable[[bytes], object]]] = None,
+    ) -> None:
+        unencrypted = frozenset(unencrypted)
+        write_only = frozenset(write_only)
+        parsers = parsers or {}
+
+        records = []
+        service_uuids = []
+        for service in services:
+            service_uuids.append(service.SERVICE_UUID.value)
+            for member in service:
+                if member is service.SERVICE_UUID:
+                    continue
+                records.append(
+                    Characteristic.from_enum(
+                        member,
+                        encrypted=member not in unencrypted,
+                        readable=member not in write_only,
+                        parser=parsers.get(member),
+                    ),
+                )
+
+        names = {}
+        for record in records:
+            names[record.name] = names.get(record.name, 0) + 1
+
+        index = {}
+        for record in records:
+            index[record.member] = record
+            index[record.uuid] = record
+            index[f"{record.service.__name__}.{record.name}"] = record
+            if names[record.name] == 1:
+                index[record.name] = record
+
+        set_attribute = super().__setattr__
+        set_attribute("_records", tuple(records))
+        set_attribute("_index", index)
+        set_attribute("_service_uuids", tuple(service_uuids))
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __getitem__(self, key) -> Characteristic:
+        return self._index[key]
+
+    def get(self, key, default=None) -> Optional[Characteristic]:
+        """
+        Returns the record for an enum member, UUID or name, or ``default`` if unknown.
+        """
+        return self._index.get(key, default)
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator[Characteristic]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def service_uuids(self):
+        """
+        The UUIDs of every service, in the order they were given.
+        """
+        return self._service_uuids
+
+
+SX3_CHARACTERISTICS = CharacteristicRegistry(
+    SX3Profile.SERVICES,
+    unencrypted=(SX3Profile.Security.CHALLENGE, SX3Profile.BikeInfo.FRAME_NUMBER),
+    write_only=(
+        SX3Profile.Security.KEY_INDEX,
+        SX3Profile.Defense.UNLOCK_REQUEST,
+        SX3Profile.Sound.PLAY_SOUND,
+    ),
+    parsers={member: codec.decode for member, codec in CODECS.items()},
+)
+
+
+def lookup(member: enum.Enum) -> Characteristic:
+    """
+    Returns the record of an S3/X3 characteristic. Members of other profiles get a record
+    built on the fly, assuming they are encrypted and have no parser.
+    """
+    record = SX3_CHARACTERISTICS.get(member)
+    if record is None:
+        record = Characteristic.from_enum(member)
+    return record
@@ -1,9 +1,8 @@
 import enum
-import math
+from typing import Iterable
+from typing import List
 
-from cryptography.hazmat.primitives.ciphers import algorithms
-from cryptography.hazmat.primitives.ciphers import Cipher
-from cryptography.hazmat.primitives.ciphers import modes
+BLOCK_SIZE = 16
 
 
 class SX3Profile:
@@ -11,13 +10,65 @@ class SX3Profile:
     Represents the profile for the GATT UUIDs for the S3/X3. Also contains functionality
     to encrypt and decrypt BLE payloads, as well as building the authentication payload.
 
+    The cipher contexts and buffers are reused between calls, so a profile must not be
+    shared between threads.
+
     :param key: The hexidecimal string of the encrypted key from Vanmoof servers.
     :param user_key_id: Int of the user key id from Vanmoof servers.
     """
 
     def __init__(self, key: str, user_key_id: int) -> None:
+        # Imported here so the GATT UUIDs can be used without loading cryptography
+        from cryptography.hazmat.primitives.ciphers import algorithms
+        from cryptography.hazmat.primitives.ciphers import Cipher
+        from cryptography.hazmat.primitives.ciphers import modes
+
+        self._key = key
         self._cipher = Cipher(algorithms.AES(bytes.fromhex(key)), modes.ECB())
         self._user_key_id = user_key_id
+        self._key_id_suffix = bytes([0, 0, 0, user_key_id])
+
+        # ECB carries no state between blocks, so a single context of each kind can serve
+        # every payload as long as it is only ever fed whole blocks and never finalized.
+        self._encryptor = self._cipher.encryptor()
+        self._decryptor = self._cipher.decryptor()
+        self._plaintext = bytearray(BLOCK_SIZE)
+        self._output = bytearray(2 * BLOCK_SIZE - 1)
+
+    def __reduce__(self):
+        # Cipher contexts cannot be pickled, so an unpickled profile builds new ones
+        return (type(self), (self._key, self._user_key_id))
+
+    @staticmethod
+    def _check_blocks(data) -> None:
+        if len(data) % BLOCK_SIZE:
+            raise ValueError(
+                f"The length of the provided data is not a multiple of {BLOCK_SIZE} bytes",
+            )
+
+    def _update(self, context, data) -> bytes:
+        self._check_blocks(data)
+
+        # update_into needs room for one extra block, minus a byte
+        if len(self._output) < len(data) + BLOCK_SIZE - 1:
+            self._output = bytearray(len(data) + BLOCK_SIZE - 1)
+
+        length = context.update_into(data, self._output)
+        return bytes(memoryview(self._output)[:length])
+
+    def _signed_block(self, nonce: bytes, data: bytes) -> bytearray:
+        # Lays out nonce + data + zero padding to a multiple of the block size
+        length = 2 + len(data)
+        size = -(-length // BLOCK_SIZE) * BLOCK_SIZE
+
+        if len(self._plaintext) != size:
+            self._plaintext = bytearray(size)
+
+        payload = self._plaintext
+        payload[0:2] = nonce[:2]
+        payload[2:length] = data
+        payload[length:] = bytes(size - length)
+        return payload
 
     def build_authentication_payload(self, nonce: bytes) -> bytes:
         """
@@ -25,25 +76,17 @@ class SX3Profile:
 
         :param nonce: A bytes array that represents the nonce from a challenge response.
         """
-        encryptor = self._cipher.encryptor()
-
-        data = bytearray(16)
-        data[0:2] = nonce
-        data = bytearray(encryptor.update(data) + encryptor.finalize())
-
         # Append the user key id
-        data.extend([0, 0, 0, self._user_key_id])
-
-        return bytes(data)
+        return self._update(self._encryptor, self._signed_block(nonce, b"")) + self._key_id_suffix
 
     def decrypt_payload(self, data: bytes) -> bytes:
         """
         Decrypts a bluetooth payload.
 
-        :param data: A bytes array of data. Must be a multiple of 16 bytes long.
+        :param data: A bytes-like object, e.g. bytes, bytearray or memoryview.
+            Must be a multiple of 16 bytes long.
         """
-        decryptor = self._cipher.decryptor()
-        return decryptor.update(data) + decryptor.finalize()
+        return self._update(self._decryptor, data)
 
     def build_encrypted_payload(self, nonce: bytes, data: bytes) -> bytes:
         """
@@ -53,17 +96,55 @@ class SX3Profile:
         :param nonce: A bytes array that represents the nonce from a challenge response.
         :param data: A bytes array of data.
         """
-        encryptor = self._cipher.encryptor()
+        return self._update(self._encryptor, self._signed_block(nonce, data))
 
-        payload = bytearray(16)
-        payload[0:2] = nonce
-        payload[2:] = data
+    def decrypt_buffer(self, data) -> memoryview:
+        """
+        Decrypts a contiguous buffer of concatenated payloads with a single cipher call.
 
-        # Pad to the nearest cipher 16 byte block size
-        for _ in range(math.ceil(len(payload) / 16) * 16 - len(payload)):
-            payload.append(0)
+        The result supports the buffer protocol, so it can be viewed as a NumPy array of
+        16 byte blocks without copying, e.g.
+        ``numpy.frombuffer(result, dtype=numpy.uint8).reshape(-1, 16)``.
 
-        return bytes(encryptor.update(payload) + encryptor.finalize())
+        :param data: A bytes-like object. Must be a multiple of 16 bytes long.
+        :return: A read-only memoryview of the plaintext.
+        """
+        self._check_blocks(data)
+        return memoryview(self._decryptor.update(data))
+
+    def encrypt_buffer(self, data) -> memoryview:
+        """
+        Encrypts a contiguous buffer of 16 byte aligned records with a single cipher call.
+        This does not sign the records with a nonce.
+
+        :param data: A bytes-like object. Must be a multiple of 16 bytes long.
+        :return: A read-only memoryview of the ciphertext.
+        """
+        self._check_blocks(data)
+        return memoryview(self._encryptor.update(data))
+
+    def decrypt_payloads(self, payloads: Iterable[bytes]) -> List[memoryview]:
+        """
+        Decrypts many payloads at once, e.g. recorded characteristic reads.
+
+        The payloads are joined and decrypted with a single cipher call. Each result is a view
+        into the shared plaintext buffer, so no per-payload copies are made.
+
+        :param payloads: Bytes-like objects, each a multiple of 16 bytes long.
+        :return: A list of read-only memoryviews, one per payload, in order.
+        """
+        payloads = list(payloads)
+        for payload in payloads:
+            self._check_blocks(payload)
+
+        plaintext = self.decrypt_buffer(b"".join(payloads))
+
+        results = []
+        offset = 0
+        for payload in payloads:
+            results.append(plaintext[offset : offset + len(payload)])
+            offset += len(payload)
+        return results
 
     class Security(enum.Enum):
 
@@ -141,3 +222,6 @@ class SX3Profile:
 
         LIGHT_MODE = "6acc5581-e631-4069-944d-b8ca7598ad50"
         SENSOR = "6acc5584-e631-4069-944d-b8ca7598ad50"
+
+    # Every GATT service exposed by the bike, in the order they are advertised
+    SERVICES = (Security, Defense, Movement, BikeInfo, BikeState, Sound, Light)
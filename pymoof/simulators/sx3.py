@@ -0,0 +1,575 @@
+import asyncio
+import os
+import random
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+import bleak.exc
+
+from pymoof.clients.sx3_enums import LockState
+from pymoof.profiles import codecs
+from pymoof.profiles.registry import Characteristic
+from pymoof.profiles.registry import SX3_CHARACTERISTICS
+from pymoof.profiles.sx3 import BLOCK_SIZE
+from pymoof.profiles.sx3 import SX3Profile
+
+# Characteristics that are sent in plaintext, everything else is AES encrypted
+UNENCRYPTED = frozenset(record.uuid for record in SX3_CHARACTERISTICS if not record.encrypted)
+
+_CHALLENGE_UUID = SX3_CHARACTERISTICS[SX3Profile.Security.CHALLENGE].uuid
+_KEY_INDEX_UUID = SX3_CHARACTERISTICS[SX3Profile.Security.KEY_INDEX].uuid
+
+
+class SimulatedCharacteristic:
+    """
+    Mimics ``bleak.backends.characteristic.BleakGATTCharacteristic``.
+    """
+
+    def __init__(self, record: Characteristic, handle: int) -> None:
+        self.uuid = record.uuid
+        self.service_uuid = record.service_uuid
+        self.handle = handle
+        self.description = record.name
+
+    def __repr__(self) -> str:
+        return f"SimulatedCharacteristic({self.description}, {self.uuid})"
+
+
+class SimulatedService:
+    """
+    Mimics ``bleak.backends.service.BleakGATTService``.
+    """
+
+    def __init__(self, uuid: str, characteristics: List[SimulatedCharacteristic]) -> None:
+        self.uuid = uuid
+        self.characteristics = characteristics
+        self._by_uuid = {characteristic.uuid: characteristic for characteristic in characteristics}
+
+    def get_characteristic(self, uuid: str) -> Optional[SimulatedCharacteristic]:
+        return self._by_uuid.get(uuid)
+
+
+class SimulatedServiceCollection:
+    """
+    Mimics ``bleak.backends.service.BleakGATTServiceCollection`` for the S3/X3 profile.
+    """
+
+    def __init__(self) -> None:
+        characteristics = {uuid: [] for uuid in SX3_CHARACTERISTICS.service_uuids}
+        for handle, record in enumerate(SX3_CHARACTERISTICS, 1):
+            characteristics[record.service_uuid].append(SimulatedCharacteristic(record, handle))
+
+        self.services = {
+            uuid: SimulatedService(uuid, service_characteristics)
+            for uuid, service_characteristics in characteristics.items()
+        }
+
+    def __iter__(self):
+        return iter(self.services.values())
+
+    def get_service(self, uuid: str) -> Optional[SimulatedService]:
+        return self.services.get(uuid)
+
+    def get_characteristic(self, uuid: str) -> Optional[SimulatedCharacteristic]:
+        for service in self.services.values():
+            characteristic = service.get_characteristic(uuid)
+            if characteristic is not None:
+                return characteristic
+        return None
+
+
+class SimulatedBike:
+    """
+    The bike side of the S3/X3 protocol.
+
+    Issues challenge nonces, verifies authentication payloads and nonce signed writes with the
+    bike key, and keeps the state that reads and notifications report. State can be changed
+    from tests through the properties below, which also notifies subscribed clients.
+
+    :param key: The hexidecimal string of the bike's encryption key.
+    :param user_key_id: The user key id that is allowed to authenticate.
+    :param frame_number: The frame number reported to unauthenticated reads.
+    :param rotate_nonce: If true, the challenge changes after every accepted write, so a
+        write signed with an old nonce is rejected.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        user_key_id: int,
+        frame_number: str = "ASY1234567",
+        rotate_nonce: bool = False,
+    ) -> None:
+        self.profile = SX3Profile(key, user_key_id)
+        self.user_key_id = user_key_id
+        self.rotate_nonce = rotate_nonce
+        self.services = SimulatedServiceCollection()
+        self.client = None
+
+        self._nonce = os.urandom(2)
+        self._values = {}
+        self._subscribers = {}
+
+        # Commands received through writes, oldest first, as (characteristic, data) tuples
+        self.commands = []
+        self.rejected_writes = 0
+
+        self.set_value(SX3Profile.BikeInfo.FRAME_NUMBER, frame_number.encode("ascii"))
+        self.lock_state = LockState.LOCKED
+        self.battery_level = 100
+        self.speed = 0
+        self.distance = 0.0
+
+    @property
+    def nonce(self) -> bytes:
+        return self._nonce
+
+    def rotate(self) -> None:
+        """
+        Issues a new challenge nonce.
+        """
+        self._nonce = os.urandom(2)
+
+    def value(self, char_uuid) -> bytes:
+        """
+        Returns the plaintext value of a characteristic.
+        """
+        return self._values.get(SX3_CHARACTERISTICS[char_uuid].uuid, bytes(BLOCK_SIZE))
+
+    def set_value(self, char_uuid, data: bytes) -> None:
+        """
+        Sets the plaintext value of a characteristic and notifies subscribers.
+        """
+        self._store(SX3_CHARACTERISTICS[char_uuid].uuid, bytes(data))
+
+    def _decode(self, char_uuid):
+        # Values may be stored shorter than a block, decode them as the bike would send them
+        return codecs.decode(char_uuid, self.value(char_uuid).ljust(BLOCK_SIZE, b"\x00"))
+
+    def _store(self, uuid: str, data: bytes) -> None:
+        self._values[uuid] = data
+        for callback in list(self._subscribers.get(uuid, [])):
+            callback(self.encode(uuid))
+
+    @property
+    def lock_state(self) -> LockState:
+        return LockState(self._decode(SX3Profile.Defense.LOCK_STATE))
+
+    @lock_state.setter
+    def lock_state(self, state: LockState) -> None:
+        self.set_value(SX3Profile.Defense.LOCK_STATE, [state.value])
+
+    @property
+    def battery_level(self) -> int:
+        return self._decode(SX3Profile.BikeInfo.MOTOR_BATTERY_LEVEL)
+
+    @battery_level.setter
+    def battery_level(self, level: int) -> None:
+        self.set_value(SX3Profile.BikeInfo.MOTOR_BATTERY_LEVEL, [level])
+
+    @property
+    def speed(self) -> int:
+        return self._decode(SX3Profile.Movement.SPEED)
+
+    @speed.setter
+    def speed(self, speed: int) -> None:
+        self.set_value(SX3Profile.Movement.SPEED, speed.to_bytes(2, "little"))
+
+    @property
+    def distance(self) -> float:
+        return self._decode(SX3Profile.Movement.DISTANCE)
+
+    @distance.setter
+    def distance(self, kilometers: float) -> None:
+        # Stored as hectometers
+        self.set_value(SX3Profile.Movement.DISTANCE, round(kilometers * 10).to_bytes(4, "little"))
+
+    def encode(self, uuid: str) -> bytes:
+        """
+        Returns the over the air payload for a characteristic.
+        """
+        if uuid == _CHALLENGE_UUID:
+            return self._nonce
+
+        value = self._values.get(uuid, bytes(BLOCK_SIZE))
+        if uuid in UNENCRYPTED:
+            return value
+
+        size = max(BLOCK_SIZE, -(-len(value) // BLOCK_SIZE) * BLOCK_SIZE)
+        return bytes(self.profile.encrypt_buffer(value.ljust(size, b"\x00")))
+
+    def _verify_signed(self, payload: bytes) -> Optional[bytes]:
+        if len(payload) == 0 or len(payload) % BLOCK_SIZE:
+            return None
+        plaintext = bytes(self.profile.decrypt_buffer(payload))
+        if plaintext[:2] != self._nonce:
+            return None
+        return plaintext[2:]
+
+    def read(self, client, uuid: str) -> bytes:
+        if uuid not in UNENCRYPTED and not client.authenticated:
+            raise bleak.exc.BleakError(f"Read not permitted for {uuid}: not authenticated")
+        return self.encode(uuid)
+
+    def write(self, client, uuid: str, data: bytes) -> None:
+        data = bytes(data)
+
+        if uuid == _KEY_INDEX_UUID:
+            expected = self.profile.build_authentication_payload(self._nonce)
+            if data != expected:
+                self.rejected_writes += 1
+                raise bleak.exc.BleakError("Authentication failed")
+            client.authenticated = True
+            return
+
+        if not client.authenticated:
+            self.rejected_writes += 1
+            raise bleak.exc.BleakError(f"Write not permitted for {uuid}: not authenticated")
+
+        command = self._verify_signed(data)
+        if command is None:
+            self.rejected_writes += 1
+            raise bleak.exc.BleakError(f"Write not permitted for {uuid}: invalid nonce")
+
+        self.commands.append((uuid, command))
+        if self.rotate_nonce:
+            self.rotate()
+
+        self._store(uuid, command)
+
+    def subscribe(self, uuid: str, callback: Callable[[bytes], None]) -> None:
+        self._subscribers.setdefault(uuid, []).append(callback)
+
+    def unsubscribe(self, uuid: str, callback: Callable[[bytes], None]) -> None:
+        callbacks = self._subscribers.get(uuid, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def drop_connection(self) -> None:
+        """
+        Simulates the bike going out of range, disconnecting the connected client.
+        """
+        if self.client is not None:
+            self.client._drop()
+
+
+class SimulatedAdapter:
+    """
+    A bluetooth adapter of the simulated host, such as ``hci0``.
+
+    Its latency and loss add to those of every link through it, and can be changed while
+    clients are connected, e.g. to simulate a dongle that degrades.
+
+    :param name: The adapter name.
+    :param latency: Extra round trip time in seconds for requests through this adapter.
+    :param loss: Probability between 0 and 1 that a request through this adapter fails.
+    :param reachable: Optional addresses of the bikes in range of this adapter. Defaults to
+        every bike.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        latency: float = 0.0,
+        loss: float = 0.0,
+        reachable: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.name = name
+        self.latency = latency
+        self.loss = loss
+        self.reachable = None if reachable is None else set(reachable)
+
+    def reaches(self, address: str) -> bool:
+        return self.reachable is None or address in self.reachable
+
+
+class SimulatedDevice(NamedTuple):
+    """
+    A bike found by ``Simulator.discover``, like ``bleak.backends.device.BLEDevice``.
+    """
+
+    address: str
+    name: str
+
+
+class SimulatedBleakClient:
+    """
+    An in-process stand-in for ``bleak.BleakClient`` connected to a ``SimulatedBike``.
+
+    Like a real link, only one request is in flight at a time. Every request waits ``latency``
+    seconds plus up to ``jitter`` seconds, and fails with ``bleak.exc.BleakError`` with
+    probability ``loss``, as if the packet was lost and the request timed out.
+
+    Writes without a response are write commands: they return at once and reach the bike, in
+    order, half a round trip later. A lost or rejected command is silently dropped.
+
+    :param bike: The simulated bike to talk to.
+    :param latency: Round trip time in seconds.
+    :param jitter: Maximum extra random delay in seconds added to each round trip.
+    :param loss: Probability between 0 and 1 that a request fails.
+    :param disconnected_callback: Called with this client when the link drops.
+    :param adapter: Name of the bluetooth adapter, recorded but otherwise unused.
+    :param seed: Optional seed for the jitter and loss random number generator.
+    :param address: The address the client was created for, like ``bleak.BleakClient.address``.
+    :param controller: Optional ``SimulatedAdapter`` the link goes through.
+    """
+
+    def __init__(
+        self,
+        bike: SimulatedBike,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        disconnected_callback: Optional[Callable[["SimulatedBleakClient"], None]] = None,
+        adapter: Optional[str] = None,
+        seed: Optional[int] = None,
+        address: Optional[str] = None,
+        controller: Optional[SimulatedAdapter] = None,
+    ) -> None:
+        self.bike = bike
+        self.address = address
+        self.controller = controller
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.adapter = adapter
+        self.authenticated = False
+        self.requests = 0
+        self._disconnected_callback = disconnected_callback
+        self._random = random.Random(seed)
+        self._connected = False
+        self._link = asyncio.Lock()
+        self._command_arrives_at = 0.0
+        self._notifications = {}
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    @property
+    def services(self) -> SimulatedServiceCollection:
+        return self.bike.services
+
+    def set_disconnected_callback(self, callback) -> None:
+        self._disconnected_callback = callback
+
+    async def _round_trip(self, wait: bool = True) -> None:
+        async with self._link:
+            self.requests += 1
+            loss = self.loss
+            delay = self.latency
+            if self.controller is not None:
+                loss = 1 - (1 - loss) * (1 - self.controller.loss)
+                delay += self.controller.latency
+            if wait:
+                await asyncio.sleep(delay + self._random.uniform(0, self.jitter))
+            if loss and self._random.random() < loss:
+                raise bleak.exc.BleakError("Request timed out")
+
+    def _check_connected(self) -> None:
+        if not self._connected:
+            raise bleak.exc.BleakError("Not connected")
+
+    def _characteristic_uuid(self, characteristic) -> str:
+        if isinstance(characteristic, SimulatedCharacteristic):
+            return characteristic.uuid
+        return str(characteristic)
+
+    async def connect(self, **kwargs) -> bool:
+        if self._connected:
+            return True
+        if self.bike.client is not None:
+            raise bleak.exc.BleakError("Bike is already connected to another central")
+
+        await self._round_trip()
+        self.bike.client = self
+        self._connected = True
+        return True
+
+    def _teardown(self) -> None:
+        for uuid, callback in self._notifications.items():
+            self.bike.unsubscribe(uuid, callback)
+        self._notifications = {}
+        self._connected = False
+        self.authenticated = False
+        if self.bike.client is self:
+            self.bike.client = None
+
+    async def disconnect(self) -> bool:
+        if self._connected:
+            self._teardown()
+            if self._disconnected_callback is not None:
+                self._disconnected_callback(self)
+        return True
+
+    def _drop(self) -> None:
+        self._teardown()
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(self)
+
+    async def get_services(self, **kwargs) -> SimulatedServiceCollection:
+        self._check_connected()
+        return self.bike.services
+
+    async def read_gatt_char(self, characteristic, **kwargs) -> bytearray:
+        self._check_connected()
+        await self._round_trip()
+        self._check_connected()
+        return bytearray(self.bike.read(self, self._characteristic_uuid(characteristic)))
+
+    async def write_gatt_char(self, characteristic, data, response: bool = False) -> None:
+        self._check_connected()
+        if not response:
+            self._send_command(self._characteristic_uuid(characteristic), bytes(data))
+            return
+        await self._round_trip()
+        self._check_connected()
+        self.bike.write(self, self._characteristic_uuid(characteristic), data)
+
+    def _send_command(self, uuid: str, data: bytes) -> None:
+        self.requests += 1
+        loop = asyncio.get_running_loop()
+        delay = (self.latency + self._random.uniform(0, self.jitter)) / 2
+        # Commands never overtake each other
+        self._command_arrives_at = max(self._command_arrives_at, loop.time() + delay)
+        lost = self.loss and self._random.random() < self.loss
+        loop.call_at(self._command_arrives_at, self._deliver_command, uuid, data, lost)
+
+    def _deliver_command(self, uuid: str, data: bytes, lost: bool) -> None:
+        if lost or not self._connected:
+            return
+        try:
+            self.bike.write(self, uuid, data)
+        except bleak.exc.BleakError:
+            # Counted in rejected_writes, but there is no response to report it in
+            pass
+
+    async def start_notify(self, characteristic, callback, **kwargs) -> None:
+        self._check_connected()
+        await self._round_trip()
+        uuid = self._characteristic_uuid(characteristic)
+        handle = self.bike.services.get_characteristic(uuid).handle
+
+        def notify(payload: bytes) -> None:
+            callback(handle, bytearray(payload))
+
+        self._notifications[uuid] = notify
+        self.bike.subscribe(uuid, notify)
+
+    async def stop_notify(self, characteristic) -> None:
+        self._check_connected()
+        await self._round_trip()
+        uuid = self._characteristic_uuid(characteristic)
+        notify = self._notifications.pop(uuid, None)
+        if notify is not None:
+            self.bike.unsubscribe(uuid, notify)
+
+    async def __aenter__(self) -> "SimulatedBleakClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.disconnect()
+
+
+class Simulator:
+    """
+    A collection of simulated bikes, addressed like real ones.
+
+    An instance can be passed as the ``client_factory`` of
+    ``pymoof.fleet.manager.FleetManager`` or ``pymoof.fleet.pool.ConnectionPool``.
+
+    Example::
+
+        simulator = Simulator(latency=0.03)
+        simulator.add_bike("AA:BB:CC:DD:EE:FF", key, user_key_id)
+
+        async with simulator.client("AA:BB:CC:DD:EE:FF") as bleak_client:
+            client = SX3Client(bleak_client, key, user_key_id)
+            await client.authenticate()
+
+    :param latency: Round trip time in seconds for every client.
+    :param jitter: Maximum extra random delay in seconds added to each round trip.
+    :param loss: Probability between 0 and 1 that a request fails.
+    :param seed: Optional seed, making jitter and loss reproducible.
+
+    Adapters added with ``add_adapter`` are used by clients created with their name as the
+    ``adapter`` keyword argument, like ``bleak.BleakClient(address, adapter="hci1")``.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self._random = random.Random(seed)
+        self.bikes: Dict[str, SimulatedBike] = {}
+        self.adapters: Dict[str, SimulatedAdapter] = {}
+
+    def add_bike(self, address: str, key: str, user_key_id: int, **kwargs) -> SimulatedBike:
+        """
+        Adds a bike. Extra keyword arguments are passed to ``SimulatedBike``.
+        """
+        bike = SimulatedBike(key, user_key_id, **kwargs)
+        self.bikes[address] = bike
+        return bike
+
+    def add_adapter(self, name: str, **kwargs) -> SimulatedAdapter:
+        """
+        Adds a bluetooth adapter. Extra keyword arguments are passed to ``SimulatedAdapter``.
+        """
+        adapter = SimulatedAdapter(name, **kwargs)
+        self.adapters[name] = adapter
+        return adapter
+
+    async def discover(
+        self,
+        adapter: Optional[str] = None,
+        timeout: float = 0.0,
+    ) -> AsyncIterator[SimulatedDevice]:
+        """
+        Yields every bike in range of an adapter, like ``pymoof.tools.discover_bike.stream``.
+
+        :param adapter: Optional name of an adapter added with ``add_adapter``.
+        :param timeout: Unused, scans finish as soon as every bike was yielded.
+        """
+        controller = self.adapters.get(adapter)
+        for address in list(self.bikes):
+            if controller is None or controller.reaches(address):
+                await asyncio.sleep(0)
+                yield SimulatedDevice(address, "VanMoof")
+
+    def client(self, address: str, **kwargs) -> SimulatedBleakClient:
+        """
+        Creates a client for the bike at an address. Keyword arguments override the
+        simulator's latency, jitter and loss settings.
+
+        :raises ``bleak.exc.BleakError``: if there is no bike with that address, or it is out
+            of range of the requested adapter.
+        """
+        controller = self.adapters.get(kwargs.get("adapter"))
+        if address not in self.bikes or (controller and not controller.reaches(address)):
+            raise bleak.exc.BleakError(f"Device with address {address} was not found")
+
+        options = {
+            "latency": self.latency,
+            "jitter": self.jitter,
+            "loss": self.loss,
+            "seed": self._random.getrandbits(32),
+            "address": address,
+            "controller": controller,
+        }
+        options.update(kwargs)
+        return SimulatedBleakClient(self.bikes[address], **options)
+
+    __call__ = client
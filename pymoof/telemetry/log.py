@@ -0,0 +1,469 @@
+"""
+A compact, append-only binary log of bike telemetry.
+
+A log file starts with a 16 byte header followed by fixed width 24 byte records, all little
+endian:
+
+==========  ========  ============================================================
+Field       Type      Meaning
+==========  ========  ============================================================
+timestamp   float64   Unix time in seconds when the sample was taken
+bike        uint32    Bike id, see ``bike_id``
+distance    uint32    Distance travelled in hectometers
+speed       uint16    Speed in kilometers per hour
+battery     uint8     Motor battery level in percent
+lock_state  uint8     ``LockState`` value
+missing     uint8     Bit mask of the fields that could not be read, see ``MISSING``
+==========  ========  ============================================================
+
+Records are only ever appended, so a file can be read while it is written. A record cut
+short by a crash is ignored by readers.
+"""
+import asyncio
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+MAGIC = b"PYMOOFT1"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sHH4x")
+RECORD = struct.Struct("<dIIHBBB3x")
+HEADER_SIZE = _HEADER.size
+
+# Bits of the ``missing`` field
+MISSING = {
+    "distance": 0x1,
+    "speed": 0x2,
+    "battery": 0x4,
+    "lock_state": 0x8,
+}
+
+
+class Record(NamedTuple):
+    """
+    One decoded telemetry sample. Missing fields are None.
+    """
+
+    timestamp: float
+    bike: int
+    distance: Optional[float]
+    speed: Optional[int]
+    battery: Optional[int]
+    lock_state: Optional[int]
+
+
+def bike_id(address: str) -> int:
+    """
+    Returns the id stored in records for a bike address, a CRC32 of the upper case address.
+    """
+    return zlib.crc32(address.upper().encode("ascii"))
+
+
+def numpy_dtype():
+    """
+    Returns the NumPy structured dtype of a record. Requires NumPy.
+    """
+    import numpy
+
+    return numpy.dtype(
+        {
+            "names": ["timestamp", "bike", "distance", "speed", "battery", "lock_state", "missing"],
+            "formats": ["<f8", "<u4", "<u4", "<u2", "u1", "u1", "u1"],
+            "offsets": [0, 8, 12, 16, 18, 19, 20],
+            "itemsize": RECORD.size,
+        },
+    )
+
+
+def pack_record(
+    timestamp: float,
+    bike: int,
+    distance: Optional[float] = None,
+    speed: Optional[int] = None,
+    battery: Optional[int] = None,
+    lock_state: Optional[int] = None,
+) -> bytes:
+    """
+    Packs one record. Fields that are None are marked as missing.
+
+    :param timestamp: Unix time in seconds.
+    :param bike: The bike id, usually ``bike_id(address)``.
+    :param distance: Distance travelled in kilometers.
+    :param speed: Speed in kilometers per hour.
+    :param battery: Battery level in percent.
+    :param lock_state: A ``LockState`` or its integer value.
+    """
+    missing = 0
+    if distance is None:
+        missing |= MISSING["distance"]
+        distance = 0
+    if speed is None:
+        missing |= MISSING["speed"]
+        speed = 0
+    if battery is None:
+        missing |= MISSING["battery"]
+        battery = 0
+    if lock_state is None:
+        missing |= MISSING["lock_state"]
+        lock_state = 0
+
+    return RECORD.pack(
+        timestamp,
+        bike,
+        round(distance * 10),
+        speed,
+        battery,
+        getattr(lock_state, "value", lock_state),
+        missing,
+    )
+
+
+def unpack_records(records) -> Iterator[Record]:
+    """
+    Decodes packed records.
+
+    :param records: A bytes-like object holding whole records.
+    """
+    for timestamp, bike, distance, speed, battery, lock_state, missing in (
+        RECORD.iter_unpack(records)
+    ):
+        yield Record(
+            timestamp,
+            bike,
+            None if missing & 0x1 else distance / 10,
+            None if missing & 0x2 else speed,
+            None if missing & 0x4 else battery,
+            None if missing & 0x8 else lock_state,
+        )
+
+
+class TelemetryWriter:
+    """
+    Appends telemetry records to log files in a directory.
+
+    Records are buffered and written out with ``fsync`` at most every ``fsync_interval``
+    seconds, so a crash loses at most that much data. Once a file reaches ``max_bytes`` a new
+    one is started. Files are named ``<prefix>-<number>.bin`` and numbered in order; a new
+    writer continues the last file in the directory.
+
+    By default ``append`` and ``extend`` flush by themselves, blocking on ``fsync``. On an
+    event loop run ``autosync`` instead, which flushes on a timer and waits for ``fsync`` in
+    an executor.
+
+    Example::
+
+        with TelemetryWriter("logs") as writer:
+            writer.append(time.time(), bike_id(address), speed=23, battery=87)
+
+        with TelemetryWriter("logs") as writer:
+            autosync = asyncio.ensure_future(writer.autosync())
+            ...
+            autosync.cancel()
+
+    :param directory: Directory holding the log files. Created if missing.
+    :param prefix: File name prefix.
+    :param max_bytes: Size at which a file is rotated.
+    :param fsync_interval: Maximum number of seconds between writes to disk.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "telemetry",
+        max_bytes: int = 64 * 1024 * 1024,
+        fsync_interval: float = 1.0,
+    ) -> None:
+        if max_bytes < HEADER_SIZE + RECORD.size:
+            raise ValueError("max_bytes is too small to hold a single record")
+
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+
+        self._file = None
+        self._size = 0
+        self._number = 0
+        self._buffer = bytearray()
+        self._last_sync = time.monotonic()
+        # Number of ``autosync`` calls running, and duplicated descriptors of rotated files
+        # they still have to sync
+        self._autosyncs = 0
+        self._unsynced: List[int] = []
+
+        os.makedirs(directory, exist_ok=True)
+        existing = log_files(directory, prefix)
+        if existing:
+            self._number = _file_number(existing[-1], prefix)
+            self._open(existing[-1])
+        else:
+            self._open(self._path(self._number))
+
+    def _path(self, number: int) -> str:
+        return os.path.join(self.directory, f"{self.prefix}-{number:06d}.bin")
+
+    def _open(self, path: str) -> None:
+        # Unbuffered, records are batched in ``self._buffer`` instead
+        self._file = open(path, "ab", buffering=0)
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write(_HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self._size = HEADER_SIZE
+        else:
+            # Drop a record cut short by a crash, so later records stay aligned
+            partial = (self._size - HEADER_SIZE) % RECORD.size
+            if partial:
+                self._file.truncate(self._size - partial)
+                self._size -= partial
+
+    @property
+    def path(self) -> str:
+        """
+        The file records are currently appended to.
+        """
+        return self._file.name
+
+    def append(
+        self,
+        timestamp: float,
+        bike: int,
+        distance: Optional[float] = None,
+        speed: Optional[int] = None,
+        battery: Optional[int] = None,
+        lock_state: Optional[int] = None,
+    ) -> None:
+        """
+        Appends one record. Fields that are None are marked as missing.
+
+        :param timestamp: Unix time in seconds.
+        :param bike: The bike id, usually ``bike_id(address)``.
+        :param distance: Distance travelled in kilometers.
+        :param speed: Speed in kilometers per hour.
+        :param battery: Battery level in percent.
+        :param lock_state: A ``LockState`` or its integer value.
+        """
+        if self._size + len(self._buffer) + RECORD.size > self.max_bytes:
+            self._rotate()
+
+        self._buffer += pack_record(timestamp, bike, distance, speed, battery, lock_state)
+
+        self._maybe_flush()
+
+    def extend(self, records) -> None:
+        """
+        Appends records that are already packed, e.g. by ``pack_record`` in another process.
+
+        :param records: A bytes-like object holding whole records.
+        :raises ValueError: if ``records`` does not hold a whole number of records.
+        """
+        if len(records) % RECORD.size:
+            raise ValueError(f"Records must be a multiple of {RECORD.size} bytes")
+
+        with memoryview(records) as view:
+            offset = 0
+            while offset < len(view):
+                room = (self.max_bytes - self._size - len(self._buffer)) // RECORD.size
+                if room <= 0:
+                    self._rotate()
+                    continue
+                end = min(len(view), offset + room * RECORD.size)
+                self._buffer += view[offset:end]
+                offset = end
+
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        if self._autosyncs == 0 and time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.flush()
+
+    def _write_buffer(self) -> None:
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._size += len(self._buffer)
+            self._buffer.clear()
+
+    def _take_unsynced(self) -> List[int]:
+        # Descriptors of every file with unsynced writes, to sync and close
+        fds = self._unsynced + [os.dup(self._file.fileno())]
+        self._unsynced = []
+        return fds
+
+    def flush(self) -> None:
+        """
+        Writes buffered records and waits until they are on disk.
+        """
+        self._write_buffer()
+        _sync_and_close(self._take_unsynced())
+        self._last_sync = time.monotonic()
+
+    async def sync(self) -> None:
+        """
+        Like ``flush``, but waits for ``fsync`` in the default executor of the running loop
+        instead of blocking it.
+        """
+        self._write_buffer()
+        self._last_sync = time.monotonic()
+        fds = self._take_unsynced()
+        await asyncio.get_running_loop().run_in_executor(None, _sync_and_close, fds)
+
+    async def autosync(self) -> None:
+        """
+        Calls ``sync`` every ``fsync_interval`` seconds until cancelled. While it runs,
+        ``append`` and ``extend`` only buffer records.
+        """
+        self._autosyncs += 1
+        try:
+            while True:
+                await asyncio.sleep(self.fsync_interval)
+                await self.sync()
+        finally:
+            self._autosyncs -= 1
+
+    def _rotate(self) -> None:
+        if self._autosyncs:
+            # Left for the next ``sync``, rather than blocking the loop
+            self._write_buffer()
+            self._unsynced.append(os.dup(self._file.fileno()))
+        else:
+            self.flush()
+        self._file.close()
+        self._number += 1
+        self._open(self._path(self._number))
+
+    def close(self) -> None:
+        if self._file is not None and not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> "TelemetryWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _sync_and_close(fds: List[int]) -> None:
+    try:
+        for fd in fds:
+            os.fsync(fd)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+class TelemetryLog:
+    """
+    Reads one log file through a memory map, without copying records.
+
+    Close the log, or use it as a context manager, once done. Iterators, ``raw`` views and
+    arrays returned by ``to_numpy`` read the map directly. Closing the log while one of them
+    is still in use does not invalidate it; the file is unmapped once the last one is released.
+
+    Example::
+
+        with TelemetryLog(path) as log:
+            speeds = log.to_numpy()["speed"].mean()
+
+    :param path: Path of the log file.
+    :raises ValueError: if the file is not a telemetry log.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < HEADER_SIZE:
+            self._map.close()
+            raise ValueError(f"{path} is not a telemetry log")
+        magic, version, record_size = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} telemetry log")
+
+    def _mapped(self) -> mmap.mmap:
+        if self._map is None:
+            raise ValueError(f"{self.path} is closed")
+        return self._map
+
+    def __len__(self) -> int:
+        return (len(self._mapped()) - HEADER_SIZE) // RECORD.size
+
+    def raw(self) -> memoryview:
+        """
+        Returns a view of the complete records, ``len(self) * 24`` bytes.
+        """
+        end = HEADER_SIZE + len(self) * RECORD.size
+        return memoryview(self._mapped())[HEADER_SIZE:end]
+
+    def __iter__(self) -> Iterator[Record]:
+        with self.raw() as records:
+            yield from unpack_records(records)
+
+    def to_numpy(self):
+        """
+        Returns the records as a NumPy structured array that shares memory with the file.
+        Distance is in hectometers and missing fields are zero; check the ``missing`` bit
+        mask. Requires NumPy.
+        """
+        import numpy
+
+        return numpy.frombuffer(
+            self._mapped(),
+            dtype=numpy_dtype(),
+            count=len(self),
+            offset=HEADER_SIZE,
+        )
+
+    def close(self) -> None:
+        """
+        Closes the log. Iterators and views still in use keep the file mapped until released.
+        """
+        if self._map is None:
+            return
+        mapped, self._map = self._map, None
+        try:
+            mapped.close()
+        except BufferError:
+            # Exported to views that hold a reference, it is unmapped once the last is released
+            pass
+
+    def __enter__(self) -> "TelemetryLog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _file_number(path: str, prefix: str) -> int:
+    name = os.path.basename(path)
+    return int(name[len(prefix) + 1 : -len(".bin")])
+
+
+def log_files(directory: str, prefix: str = "telemetry") -> List[str]:
+    """
+    Returns the log files in a directory, oldest first.
+    """
+    paths = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix + "-") and name.endswith(".bin"):
+            number = name[len(prefix) + 1 : -len(".bin")]
+            if number.isdigit():
+                paths.append(os.path.join(directory, name))
+    return sorted(paths, key=lambda path: _file_number(path, prefix))
+
+
+def read_directory(directory: str, prefix: str = "telemetry") -> Iterator[Record]:
+    """
+    Yields every record of every log file in a directory, oldest first.
+    """
+    for path in log_files(directory, prefix):
+        with TelemetryLog(path) as log:
+            yield from log
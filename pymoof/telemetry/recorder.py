@@ -0,0 +1,148 @@
+"""
+Records bike telemetry into a ``TelemetryWriter`` log, by polling or from notifications.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Dict
+from typing import Optional
+from typing import TYPE_CHECKING
+
+from pymoof.profiles.sx3 import SX3Profile
+from pymoof.telemetry.log import bike_id
+from pymoof.telemetry.log import TelemetryWriter
+
+if TYPE_CHECKING:
+    from pymoof.clients.sx3 import Notification
+    from pymoof.clients.sx3 import Subscription
+    from pymoof.clients.sx3 import SX3Client
+
+# The characteristics stored in a record, and the ``TelemetryWriter.append`` argument for each
+FIELDS = {
+    SX3Profile.Movement.DISTANCE: "distance",
+    SX3Profile.Movement.SPEED: "speed",
+    SX3Profile.BikeInfo.MOTOR_BATTERY_LEVEL: "battery",
+    SX3Profile.Defense.LOCK_STATE: "lock_state",
+}
+
+
+class TelemetryRecorder:
+    """
+    Samples speed, distance, battery level and lock state of many bikes into a telemetry log.
+
+    Bikes are polled with ``SX3Client.snapshot`` every ``interval`` seconds, all bikes at the
+    same time. A field that fails to read is stored as missing rather than dropping the
+    record. Alternatively ``follow`` records a bike from its notifications.
+
+    Example::
+
+        with TelemetryWriter("logs") as writer:
+            recorder = TelemetryRecorder(writer, interval=5)
+            recorder.add(address, client)
+            await recorder.run()
+
+    :param writer: The log records are appended to.
+    :param interval: Number of seconds between samples when running.
+    """
+
+    def __init__(self, writer: TelemetryWriter, interval: float = 1.0) -> None:
+        self.writer = writer
+        self.interval = interval
+        self._clients: Dict[str, SX3Client] = {}
+        self._stopped: Optional[asyncio.Event] = None
+
+    def add(self, address: str, client: SX3Client) -> None:
+        """
+        Adds an authenticated client to sample.
+
+        :param address: The bike address, stored in records as ``bike_id(address)``.
+        :param client: An authenticated ``SX3Client`` for the bike.
+        """
+        self._clients[address] = client
+
+    def remove(self, address: str) -> None:
+        """
+        Stops sampling a bike.
+        """
+        self._clients.pop(address, None)
+
+    async def _sample_one(self, address: str, client: SX3Client) -> None:
+        try:
+            snapshot = await client.snapshot(FIELDS)
+        except Exception:
+            # Recorded with every field missing, so gaps stay visible in the log
+            self.writer.append(time.time(), bike_id(address))
+            return
+
+        self.writer.append(
+            snapshot.timestamp,
+            bike_id(address),
+            **{name: snapshot.get(characteristic) for characteristic, name in FIELDS.items()},
+        )
+
+    async def sample(self) -> int:
+        """
+        Samples every bike once.
+
+        :return: The number of records appended.
+        """
+        clients = list(self._clients.items())
+        await asyncio.gather(*(self._sample_one(address, client) for address, client in clients))
+        return len(clients)
+
+    async def run(self) -> None:
+        """
+        Samples every ``interval`` seconds until ``stop`` is called. A slow sample delays the
+        next one rather than piling up. The writer's ``autosync`` runs meanwhile, so records
+        reach the disk without blocking the event loop.
+        """
+        self._stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        autosync = asyncio.ensure_future(self.writer.autosync())
+        try:
+            while not self._stopped.is_set():
+                start = loop.time()
+                await self.sample()
+                delay = max(0.0, self.interval - (loop.time() - start))
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            autosync.cancel()
+        await self.writer.sync()
+
+    def stop(self) -> None:
+        """
+        Makes ``run`` return after the current sample.
+        """
+        if self._stopped is not None:
+            self._stopped.set()
+
+    def follow(self, address: str, client: SX3Client) -> Subscription:
+        """
+        **The client must be authenticated**
+
+        Records a bike from notifications instead of polling. Every notification appends a
+        record holding the latest known value of each field. Run the writer's ``autosync``
+        meanwhile, so appends do not block the event loop on ``fsync``.
+
+        Example::
+
+            async with recorder.follow(address, client):
+                await asyncio.sleep(60)
+
+        :param address: The bike address, stored in records as ``bike_id(address)``.
+        :param client: An authenticated ``SX3Client`` for the bike.
+        :return: A ``Subscription`` that must be started, either with ``async with`` or
+            ``await subscription.start()``.
+        """
+        bike = bike_id(address)
+        state = {name: None for name in FIELDS.values()}
+
+        def record(notification: Notification) -> None:
+            state[FIELDS[notification.characteristic]] = notification.value
+            self.writer.append(time.time(), bike, **state)
+
+        return client.subscribe(FIELDS, callback=record)
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+
+import bleak
+import bleak.exc
+
+from pymoof.profiles.registry import SX3_CHARACTERISTICS
+from pymoof.profiles.sx3 import SX3Profile
+from pymoof.tools import discover_bike
+from pymoof.util import bleak_utils
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pymoof", "addresses.json")
+
+# Bike addresses almost never change, so entries are kept for a month
+DEFAULT_TTL = 30 * 24 * 60 * 60
+
+CONNECT_ERRORS = (bleak.exc.BleakError, asyncio.TimeoutError, OSError)
+
+# A device without the bike's services fails the frame number lookup with an AttributeError
+_NOT_A_BIKE_ERRORS = CONNECT_ERRORS + (AttributeError,)
+
+
+class AddressCache:
+    """
+    An on-disk cache mapping bike frame numbers to bluetooth addresses.
+
+    Each entry stores the address plus ``last_seen``, a unix timestamp, and any extra metadata
+    given to ``put``. Entries not seen for ``ttl`` seconds are evicted. Changes are written to
+    disk immediately, replacing the file atomically.
+
+    :param path: Path of the JSON file backing the cache.
+    :param ttl: Number of seconds an entry stays valid after the bike was last seen.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = DEFAULT_TTL) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._entries = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(self._entries, f, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.path)
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("last_seen", 0) > self.ttl
+
+    def get(self, frame_number: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the entry for a frame number, or None if it is unknown or expired.
+        """
+        entry = self._entries.get(frame_number)
+        if entry is None or self._expired(entry):
+            return None
+        return dict(entry)
+
+    def most_recent(self) -> Optional[str]:
+        """
+        Returns the frame number of the most recently seen bike that has not expired.
+        """
+        entries = [
+            (entry.get("last_seen", 0), frame_number)
+            for frame_number, entry in self._entries.items()
+            if not self._expired(entry)
+        ]
+        return max(entries)[1] if entries else None
+
+    def put(self, frame_number: str, address: str, **metadata) -> None:
+        """
+        Records that a bike was seen at an address just now.
+
+        :param frame_number: The frame number of the bike.
+        :param address: The bluetooth address of the bike.
+        :param metadata: Extra JSON serializable information to store, e.g. ``rssi``.
+        """
+        self._entries[frame_number] = dict(metadata, address=address, last_seen=time.time())
+        self._save()
+
+    def remove(self, frame_number: str) -> None:
+        """
+        Forgets a bike, e.g. after connecting to its cached address failed.
+        """
+        if self._entries.pop(frame_number, None) is not None:
+            self._save()
+
+    def evict_expired(self) -> int:
+        """
+        Removes every expired entry.
+
+        :return: The number of removed entries.
+        """
+        expired = [number for number, entry in self._entries.items() if self._expired(entry)]
+        for frame_number in expired:
+            del self._entries[frame_number]
+        if expired:
+            self._save()
+        return len(expired)
+
+
+async def _read_frame_number(bleak_client) -> str:
+    record = SX3_CHARACTERISTICS[SX3Profile.BikeInfo.FRAME_NUMBER]
+    result = await bleak_utils.read_from_characteristic(bleak_client, record.member)
+    return record.parser(result)
+
+
+async def _try_connect(client_factory, address: str, frame_number: Optional[str]):
+    bleak_client = None
+    found = None
+    try:
+        bleak_client = client_factory(address)
+        await bleak_client.connect()
+        found = await _read_frame_number(bleak_client)
+    except _NOT_A_BIKE_ERRORS:
+        found = None
+    finally:
+        # Also disconnects if the connection attempt was cancelled or failed unexpectedly
+        matched = found is not None and frame_number in (None, found)
+        if bleak_client is not None and not matched:
+            await bleak_client.disconnect()
+
+    if not matched:
+        return None, None
+    return bleak_client, found
+
+
+async def connect(
+    frame_number: Optional[str] = None,
+    cache: Optional[AddressCache] = None,
+    client_factory: Callable[..., Any] = bleak.BleakClient,
+    timeout: float = 10.0,
+    **scanner_kwargs,
+):
+    """
+    Connects to a bike, using its cached address when possible.
+
+    If the cache knows the bike, this connects to the cached address directly and checks the
+    frame number. Only when that fails, or the bike is not cached, does it scan for bikes and
+    connect to each one found until the frame number matches. The cache is updated with the
+    address that worked.
+
+    Example::
+
+        bleak_client = await address_cache.connect("ASY1234567")
+        client = SX3Client(bleak_client, key, user_key_id)
+
+    :param frame_number: The frame number of the bike. If omitted, the most recently seen
+        cached bike is used, or the first bike found by scanning.
+    :param cache: The ``AddressCache`` to use. Defaults to one at ``DEFAULT_PATH``.
+    :param client_factory: Callable creating a bleak client for an address.
+    :param timeout: Maximum number of seconds to scan when the cache cannot be used.
+    :param scanner_kwargs: Extra keyword arguments for ``discover_bike.stream``.
+    :raises ``bleak.exc.BleakError``: if the bike could not be found.
+    :return: A connected bleak client.
+    """
+    if cache is None:
+        cache = AddressCache()
+
+    cached_frame_number = frame_number if frame_number is not None else cache.most_recent()
+    if cached_frame_number is not None:
+        entry = cache.get(cached_frame_number)
+        if entry is not None:
+            bleak_client, found = await _try_connect(
+                client_factory,
+                entry["address"],
+                cached_frame_number,
+            )
+            if bleak_client is not None:
+                cache.put(found, entry["address"])
+                return bleak_client
+            cache.remove(cached_frame_number)
+
+    devices = discover_bike.stream(timeout=timeout, **scanner_kwargs)
+    try:
+        async for device in devices:
+            bleak_client, found = await _try_connect(client_factory, device.address, frame_number)
+            if bleak_client is not None:
+                cache.put(found, device.address, rssi=device.rssi)
+                return bleak_client
+    finally:
+        await devices.aclose()
+
+    raise bleak.exc.BleakError(f"Could not find bike {frame_number or ''}".strip())
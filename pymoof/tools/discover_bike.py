@@ -1,26 +1,132 @@
 import asyncio
+from typing import AsyncIterator
+from typing import Iterable
+from typing import Optional
 
 from bleak import BleakScanner
 
+from pymoof.profiles.sx3 import SX3Profile
 
-async def query():
-    devices = await BleakScanner.discover(
-        service_uuids=[
-            "6acc5540-e631-4069-944d-b8ca7598ad50",
-            "8e7f1a50-087a-44c9-b292-a2c628fdd9aa",
-            "6acb5520-e631-4069-944d-b8ca7598ad50",
-        ],
+SX3_SERVICE_UUID = SX3Profile.BikeInfo.SERVICE_UUID.value
+SX1_SX2_SERVICE_UUID = "8e7f1a50-087a-44c9-b292-a2c628fdd9aa"
+SMART_SX1_SERVICE_UUID = "6acb5520-e631-4069-944d-b8ca7598ad50"
+
+
+async def _scan(
+    service_uuids,
+    timeout: float,
+    min_rssi: Optional[int] = None,
+    **scanner_kwargs,
+):
+    """
+    Yields ``(device, advertised service uuids)`` for every new device advertising one of
+    ``service_uuids``, as soon as it is detected, until ``timeout`` seconds have passed.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    seen = set()
+
+    def detection_callback(device, advertisement_data):
+        if device.address in seen:
+            return
+        uuids = advertisement_data.service_uuids
+        if not any(uuid in uuids for uuid in service_uuids):
+            return
+        if min_rssi is not None and device.rssi < min_rssi:
+            return
+        seen.add(device.address)
+        queue.put_nowait((device, uuids))
+
+    scanner = BleakScanner(
+        detection_callback=detection_callback,
+        service_uuids=list(service_uuids),
+        **scanner_kwargs,
     )
-    for device in devices:
-        if "6acc5540-e631-4069-944d-b8ca7598ad50" in device.metadata["uuids"]:
-            print("Found SX3:", device.address)
-            return device
-        if "8e7f1a50-087a-44c9-b292-a2c628fdd9aa" in device.metadata["uuids"]:
-            print("Found SX1/SX2:", device.address, "but it's not supported")
-            raise Exception()
-        if "6acb5520-e631-4069-944d-b8ca7598ad50" in device.metadata["uuids"]:
-            print("Found Smart SX1:", device.address, "but it's not supported")
-            raise Exception()
+
+    await scanner.start()
+    try:
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                yield await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                return
+    finally:
+        await scanner.stop()
+
+
+async def stream(
+    timeout: float = 10.0,
+    count: Optional[int] = None,
+    addresses: Optional[Iterable[str]] = None,
+    min_rssi: Optional[int] = None,
+    **scanner_kwargs,
+) -> AsyncIterator:
+    """
+    Scans for S3/X3 bikes and yields each one the moment it is first seen.
+
+    Each bike is yielded once. The scan stops as soon as ``count`` bikes or every address in
+    ``addresses`` has been found, or when ``timeout`` expires. If you stop iterating early,
+    call ``aclose()`` on the iterator to stop scanning immediately.
+
+    Example::
+
+        async for device in discover_bike.stream(count=1):
+            print(device.address)
+
+    :param timeout: Maximum number of seconds to scan.
+    :param count: Optional number of bikes after which to stop.
+    :param addresses: Optional bluetooth addresses to look for; other bikes are ignored.
+    :param min_rssi: Optional minimum signal strength in dBm; weaker bikes are ignored.
+    :param scanner_kwargs: Extra keyword arguments for ``bleak.BleakScanner``, e.g. ``adapter``.
+    :return: An async iterator of ``bleak.backends.device.BLEDevice``.
+    """
+    wanted = None
+    if addresses is not None:
+        wanted = {address.upper() for address in addresses}
+        if not wanted:
+            return
+
+    found = 0
+    scan = _scan([SX3_SERVICE_UUID], timeout, min_rssi, **scanner_kwargs)
+    try:
+        async for device, _ in scan:
+            if wanted is not None:
+                if device.address.upper() not in wanted:
+                    continue
+                wanted.discard(device.address.upper())
+
+            yield device
+            found += 1
+
+            if count is not None and found >= count:
+                return
+            if wanted is not None and not wanted:
+                return
+    finally:
+        # Stop scanning right away instead of when the generator is garbage collected
+        await scan.aclose()
+
+
+async def query(timeout: float = 10.0):
+    scan = _scan([SX3_SERVICE_UUID, SX1_SX2_SERVICE_UUID, SMART_SX1_SERVICE_UUID], timeout)
+    try:
+        # Stops at the first Vanmoof bike instead of waiting for the whole scan
+        async for device, uuids in scan:
+            if SX3_SERVICE_UUID in uuids:
+                print("Found SX3:", device.address)
+                return device
+            if SX1_SX2_SERVICE_UUID in uuids:
+                print("Found SX1/SX2:", device.address, "but it's not supported")
+                raise Exception()
+            if SMART_SX1_SERVICE_UUID in uuids:
+                print("Found Smart SX1:", device.address, "but it's not supported")
+                raise Exception()
+    finally:
+        await scan.aclose()
     print("No Vanmoof bikes found")
 
 
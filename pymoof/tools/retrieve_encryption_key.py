@@ -1,49 +1,261 @@
+from __future__ import annotations
+
+import asyncio
 import base64
 import getpass
+import json
+import os
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import TYPE_CHECKING
 
-import requests
+if TYPE_CHECKING:
+    import requests
 
+API_URL = "https://my.vanmoof.com/api/v8"
 
-def query():
-    API_URL = "https://my.vanmoof.com/api/v8"
+# This api key is distributed by the official Vanmoof
+# app and as far as I can tell is universally the same on everyone's phone.
+API_KEY = "fcb38d47-f14b-30cf-843b-26283f6a5819"
 
-    # This api key is distributed by the official Vanmoof
-    # app and as far as I can tell is universally the same on everyone's phone.
-    API_KEY = "fcb38d47-f14b-30cf-843b-26283f6a5819"
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pymoof", "keys.json")
 
-    username = input("Username: ")
-    password = getpass.getpass()
+# Keys only change when a bike is reset or shared again, so a day old copy is good enough
+DEFAULT_TTL = 24 * 60 * 60
+
+
+class KeyRetrievalError(Exception):
+    """
+    Raised when the Vanmoof servers reject the credentials or return an error.
+    """
+
+
+class BikeKey(NamedTuple):
+    """
+    The encryption key of one bike on a Vanmoof account.
+    """
+
+    name: Optional[str]
+    frame_number: Optional[str]
+    mac_address: Optional[str]
+    encryption_key: str
+    user_key_id: int
+
+
+def _bike_keys(customer_data: Dict[str, Any]) -> List[BikeKey]:
+    return [
+        BikeKey(
+            name=bike.get("name"),
+            frame_number=bike.get("frameNumber"),
+            mac_address=bike.get("macAddress"),
+            encryption_key=bike["key"]["encryptionKey"],
+            user_key_id=bike["key"]["userKeyId"],
+        )
+        for bike in customer_data["data"]["bikeDetails"]
+    ]
 
-    headers = {
-        "Api-Key": API_KEY,
-        "Authorization": "Basic "
-        + base64.b64encode((username + ":" + password).encode()).decode("ascii"),
-    }
 
-    result = requests.post(API_URL + "/authenticate", headers=headers)
-    result = result.json()
+def _json(response: requests.Response) -> Dict[str, Any]:
+    try:
+        result = response.json()
+    except ValueError:
+        response.raise_for_status()
+        raise KeyRetrievalError("invalid response", response.text)
 
     if "error" in result:
-        raise Exception("error", result)
+        raise KeyRetrievalError("error", result)
+    response.raise_for_status()
+    return result
 
-    token = result["token"]
 
-    headers = {
-        "Api-Key": API_KEY,
-        "Authorization": "Bearer " + token,
-    }
+def _authenticate(session: requests.Session, api_url: str, username: str, password: str) -> str:
+    credentials = base64.b64encode((username + ":" + password).encode()).decode("ascii")
+    response = session.post(
+        api_url + "/authenticate",
+        headers={"Api-Key": API_KEY, "Authorization": "Basic " + credentials},
+    )
+    return _json(response)["token"]
+
 
-    result = requests.get(
-        API_URL + "/getCustomerData",
-        headers=headers,
+def _get_customer_data(session: requests.Session, api_url: str, token: str) -> Dict[str, Any]:
+    response = session.get(
+        api_url + "/getCustomerData",
+        headers={"Api-Key": API_KEY, "Authorization": "Bearer " + token},
         params={"includeBikeDetails": ""},
     )
-    result = result.json()
+    return _json(response)
+
+
+class KeyClient:
+    """
+    Retrieves bike encryption keys from the Vanmoof servers without blocking the event loop.
+
+    HTTP requests run in an executor, each thread with its own pooled ``requests.Session``.
+    Retrieved keys are cached on disk per username for ``ttl`` seconds, so restarts usually
+    need no network access at all. The cache file holds the keys in plain text and is only
+    protected by its permissions: it is only readable by the current user, and any process
+    running as that user can read the keys without knowing the password.
+
+    Example::
+
+        async with KeyClient() as key_client:
+            for bike in await key_client.fetch_keys(username, password):
+                print(bike.frame_number, bike.encryption_key, bike.user_key_id)
+
+    :param api_url: Base URL of the Vanmoof API.
+    :param cache_path: Path of the JSON file caching keys, or None to disable caching.
+    :param ttl: Number of seconds cached keys stay valid.
+    :param session_factory: Optional callable creating the session of each thread, defaults
+        to ``requests.Session``.
+    :param executor: Optional ``concurrent.futures.Executor`` running the blocking requests.
+        Defaults to the event loop's default executor.
+    """
+
+    def __init__(
+        self,
+        api_url: str = API_URL,
+        cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+        ttl: float = DEFAULT_TTL,
+        session_factory: Optional[Callable[[], requests.Session]] = None,
+        executor=None,
+    ) -> None:
+        self.api_url = api_url
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._session_factory = session_factory
+        self._executor = executor
+        # Sessions are not thread safe, so every executor thread gets its own
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._sessions_lock = threading.Lock()
+        # Serializes updates of the cache file, which executor threads write
+        self._cache_lock = threading.Lock()
+
+    async def __aenter__(self) -> "KeyClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the pooled HTTP connections.
+        """
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            if self._session_factory is None:
+                # Imported here, requests takes longer to import than the rest of pymoof
+                import requests
+
+                self._session_factory = requests.Session
+            session = self._local.session = self._session_factory()
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def _load_cache(self) -> Dict[str, Any]:
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save_cache(self, entries: Dict[str, Any]) -> None:
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temporary_path = self.cache_path + ".tmp"
+        fd = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.cache_path)
+
+    def cached_keys(self, username: str) -> Optional[List[BikeKey]]:
+        """
+        Returns the cached keys of an account, or None if they are missing or expired.
+        """
+        entry = self._load_cache().get(username)
+        if entry is None or entry.get("expires_at", 0) <= time.time():
+            return None
+        return [BikeKey(**bike) for bike in entry["bikes"]]
+
+    def forget(self, username: str) -> None:
+        """
+        Removes the cached keys of an account.
+        """
+        with self._cache_lock:
+            entries = self._load_cache()
+            if entries.pop(username, None) is not None:
+                self._save_cache(entries)
+
+    def _fetch(self, username: str, password: str) -> List[BikeKey]:
+        session = self._session()
+        token = _authenticate(session, self.api_url, username, password)
+        bikes = _bike_keys(_get_customer_data(session, self.api_url, token))
+
+        if self.cache_path is not None:
+            entry = {
+                "expires_at": time.time() + self.ttl,
+                "bikes": [bike._asdict() for bike in bikes],
+            }
+            with self._cache_lock:
+                entries = self._load_cache()
+                entries[username] = entry
+                self._save_cache(entries)
+        return bikes
+
+    async def fetch_keys(
+        self,
+        username: str,
+        password: str,
+        refresh: bool = False,
+    ) -> List[BikeKey]:
+        """
+        Returns the keys of every bike on an account.
+
+        :param username: The Vanmoof account email.
+        :param password: The Vanmoof account password. Only sent to the servers, cached keys
+            are returned without checking it.
+        :param refresh: Ignore cached keys and always ask the Vanmoof servers.
+        :raises KeyRetrievalError: if the servers reject the credentials.
+        """
+        if not refresh and self.cache_path is not None:
+            bikes = self.cached_keys(username)
+            if bikes is not None:
+                return bikes
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._fetch, username, password)
+
+
+def query():
+    username = input("Username: ")
+    password = getpass.getpass()
+
+    import requests
+
+    with requests.Session() as session:
+        token = _authenticate(session, API_URL, username, password)
+        bikes = _bike_keys(_get_customer_data(session, API_URL, token))
 
     # Only get the first bike's encryption key
-    encryption_key = result["data"]["bikeDetails"][0]["key"]["encryptionKey"]
-    user_key_id = result["data"]["bikeDetails"][0]["key"]["userKeyId"]
-    return encryption_key, user_key_id
+    return bikes[0].encryption_key, bikes[0].user_key_id
 
 
 if __name__ == "__main__":
@@ -1,28 +1,139 @@
-import bleak.backends.characteristic
-import bleak.backends.client
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from pymoof.profiles.registry import CharacteristicRegistry
+from pymoof.profiles.registry import lookup
+
+if TYPE_CHECKING:
+    import bleak.backends.characteristic
+    import bleak.backends.client
 
 
 async def get_characteristic(
     gatt_client: bleak.backends.client.BaseBleakClient,
     char_uuid,
 ) -> bleak.backends.characteristic.BleakGATTCharacteristic:
+    record = lookup(char_uuid)
     services = await gatt_client.get_services()
-    service = services.get_service(char_uuid.SERVICE_UUID.value)
-    return service.get_characteristic(char_uuid.value)
+    service = services.get_service(record.service_uuid)
+    return service.get_characteristic(record.uuid)
+
+
+class CharacteristicResolver:
+    """
+    Resolves characteristic enums to bleak characteristics for a single connection.
+
+    The first lookup walks the GATT services of the connected client once and indexes every
+    characteristic in the registry by enum member. Subsequent lookups are a dictionary hit.
+    The index must be invalidated whenever the connection drops or the bike's services change.
+
+    :param gatt_client: Connected bleak.backends.client.BaseBleakClient
+    :param services: A ``pymoof.profiles.registry.CharacteristicRegistry``, e.g.
+        ``SX3_CHARACTERISTICS``, or an iterable of service enums such as ``SX3Profile.SERVICES``
+    """
+
+    def __init__(
+        self,
+        gatt_client: bleak.backends.client.BaseBleakClient,
+        services,
+    ) -> None:
+        if not isinstance(services, CharacteristicRegistry):
+            services = CharacteristicRegistry(services)
+        self._gatt_client = gatt_client
+        self._registry = services
+        self._index = None
+
+    async def _build_index(self) -> dict:
+        index = {}
+        services = await self._gatt_client.get_services()
+        by_uuid = {uuid: services.get_service(uuid) for uuid in self._registry.service_uuids}
+        for record in self._registry:
+            service = by_uuid[record.service_uuid]
+            if service is None:
+                continue
+            characteristic = service.get_characteristic(record.uuid)
+            if characteristic is not None:
+                index[record.member] = characteristic
+
+        return index
+
+    async def get_characteristic(
+        self,
+        char_uuid,
+    ) -> bleak.backends.characteristic.BleakGATTCharacteristic:
+        """
+        Returns the bleak characteristic for a characteristic enum.
+
+        :param char_uuid: A characteristic enum member, e.g. ``SX3Profile.Defense.LOCK_STATE``
+        """
+        if self._index is None:
+            self._index = await self._build_index()
+
+        try:
+            return self._index[char_uuid]
+        except KeyError:
+            # Not part of the indexed profile, fall back to a full lookup
+            return await get_characteristic(self._gatt_client, char_uuid)
+
+    def invalidate(self) -> None:
+        """
+        Drops the resolved characteristics. The next lookup will walk the GATT services again.
+        """
+        self._index = None
+
+
+async def _resolve(
+    gatt_client: bleak.backends.client.BaseBleakClient,
+    uuid,
+    resolver: CharacteristicResolver = None,
+) -> bleak.backends.characteristic.BleakGATTCharacteristic:
+    if resolver is None:
+        return await get_characteristic(gatt_client, uuid)
+    return await resolver.get_characteristic(uuid)
 
 
 async def write_to_characteristic(
     gatt_client: bleak.backends.client.BaseBleakClient,
     uuid,
     data: bytes,
+    resolver: CharacteristicResolver = None,
+    response: bool = True,
 ) -> None:
-    characteristic = await get_characteristic(gatt_client, uuid)
-    await gatt_client.write_gatt_char(characteristic, data, response=True)
+    """
+    Writes to a characteristic.
+
+    :param response: If true, waits for the bike to acknowledge the write. Otherwise the write
+        is sent as a write command and returns as soon as it is queued, so several writes can
+        be sent back to back, but a write the bike rejects or never receives goes unnoticed.
+    """
+    characteristic = await _resolve(gatt_client, uuid, resolver)
+    await gatt_client.write_gatt_char(characteristic, data, response=response)
 
 
 async def read_from_characteristic(
     gatt_client: bleak.backends.client.BaseBleakClient,
     uuid,
+    resolver: CharacteristicResolver = None,
 ) -> bytes:
-    characteristic = await get_characteristic(gatt_client, uuid)
+    characteristic = await _resolve(gatt_client, uuid, resolver)
     return await gatt_client.read_gatt_char(characteristic)
+
+
+async def start_notify(
+    gatt_client: bleak.backends.client.BaseBleakClient,
+    uuid,
+    callback,
+    resolver: CharacteristicResolver = None,
+) -> None:
+    characteristic = await _resolve(gatt_client, uuid, resolver)
+    await gatt_client.start_notify(characteristic, callback)
+
+
+async def stop_notify(
+    gatt_client: bleak.backends.client.BaseBleakClient,
+    uuid,
+    resolver: CharacteristicResolver = None,
+) -> None:
+    characteristic = await _resolve(gatt_client, uuid, resolver)
+    await gatt_client.stop_notify(characteristic)
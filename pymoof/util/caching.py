@@ -0,0 +1,165 @@
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Any
+from typing import Dict
+from typing import Hashable
+from typing import Iterable
+from typing import Mapping
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from pymoof.profiles.sx3 import SX3Profile
+
+_HOUR = 60 * 60
+
+# Characteristics that only change with a firmware update or a repair, which both drop the
+# connection, and settings that only change when written over the connection
+DEFAULT_TTLS = {
+    SX3Profile.BikeInfo.FRAME_NUMBER: 24 * _HOUR,
+    SX3Profile.BikeInfo.BIKE_FIRMWARE_VERSION: _HOUR,
+    SX3Profile.BikeInfo.BLE_CHIP_FIRMWARE_VERSION: _HOUR,
+    SX3Profile.BikeInfo.CONTROLLER_FIRMWARE_VERSION: _HOUR,
+    SX3Profile.BikeInfo.PCBA_HARDWARE_VERSION: _HOUR,
+    SX3Profile.BikeInfo.GSM_FIRMWARE_VERSION: _HOUR,
+    SX3Profile.BikeInfo.E_SHIFTER_FIRMWARE_VERSION: _HOUR,
+    SX3Profile.BikeInfo.BATTERY_FIRMWARE_VERSION: _HOUR,
+    SX3Profile.BikeState.WHEEL_SIZE: _HOUR,
+    SX3Profile.Sound.BELL_SOUND: 5 * 60,
+}
+
+
+class ReadCache:
+    """
+    A read-through cache of characteristic values, shared by any number of ``SX3Client``
+    objects.
+
+    Only characteristics with a TTL are cached, each value for its characteristic's TTL in
+    seconds. Once ``max_entries`` values are cached, the least recently used one is evicted.
+    A client drops the cached values of its bike when it writes a characteristic, for the
+    written characteristic and the ones listed for it in ``related``, and when its connection
+    is reset with ``SX3Client.handle_disconnect``.
+
+    Example::
+
+        cache = ReadCache()
+        async with FleetManager(client_options={"cache": cache}) as fleet:
+            ...
+        print(cache.hits, cache.misses)
+
+    :param ttls: Optional mapping of characteristic enum to TTL in seconds, merged over
+        ``DEFAULT_TTLS``. A TTL of 0 disables caching of that characteristic.
+    :param max_entries: Maximum number of values to keep across every bike.
+    :param related: Optional mapping of characteristic enum to the characteristics a write to
+        it may change, besides itself.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Mapping[Enum, float]] = None,
+        max_entries: int = 4096,
+        related: Optional[Mapping[Enum, Iterable[Enum]]] = None,
+    ) -> None:
+        self.ttls = {
+            characteristic: ttl
+            for characteristic, ttl in {**DEFAULT_TTLS, **(ttls or {})}.items()
+            if ttl > 0
+        }
+        self.max_entries = max_entries
+        self.related = {
+            characteristic: tuple(others) for characteristic, others in (related or {}).items()
+        }
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: "OrderedDict[Tuple[Hashable, Enum], Tuple[float, Any]]" = OrderedDict()
+        self._by_bike: Dict[Hashable, Set[Enum]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cacheable(self, characteristic: Enum) -> bool:
+        """
+        Returns whether values of a characteristic are cached.
+        """
+        return characteristic in self.ttls
+
+    def get(self, bike: Hashable, characteristic: Enum, default=None) -> Any:
+        """
+        Returns a cached value, or ``default`` if it is missing or expired. Counts a hit or a
+        miss for cacheable characteristics.
+
+        :param bike: Identifies the bike, usually its address.
+        :param characteristic: A characteristic enum member.
+        """
+        if characteristic not in self.ttls:
+            return default
+
+        key = (bike, characteristic)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, bike: Hashable, characteristic: Enum, value: Any) -> None:
+        """
+        Caches a value read from a bike. Does nothing for characteristics without a TTL.
+        """
+        ttl = self.ttls.get(characteristic)
+        if ttl is None:
+            return
+
+        key = (bike, characteristic)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        self._by_bike.setdefault(bike, set()).add(characteristic)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Tuple[Hashable, Enum]) -> None:
+        del self._entries[key]
+        bike, characteristic = key
+        characteristics = self._by_bike[bike]
+        characteristics.discard(characteristic)
+        if not characteristics:
+            del self._by_bike[bike]
+
+    def invalidate(self, bike: Hashable, characteristic: Optional[Enum] = None) -> None:
+        """
+        Drops cached values of a bike.
+
+        :param bike: Identifies the bike, usually its address.
+        :param characteristic: Optional characteristic that was written. Only its value and
+            the values of its related characteristics are dropped. Without it, every value of
+            the bike is dropped.
+        """
+        if characteristic is None:
+            characteristics = tuple(self._by_bike.get(bike, ()))
+        else:
+            characteristics = (characteristic, *self.related.get(characteristic, ()))
+
+        for member in characteristics:
+            key = (bike, member)
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """
+        Drops every cached value. Counters are kept.
+        """
+        self._entries.clear()
+        self._by_bike.clear()
@@ -0,0 +1,221 @@
+import bisect
+import math
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Instrumentation:
+    """
+    Receives measurements from ``SX3Client`` and the fleet helpers.
+
+    This base class ignores everything and is the default. Clients check ``enabled`` before
+    taking any measurement, so the default costs a single attribute lookup per operation.
+    Subclass it and set ``enabled = True`` to collect metrics.
+
+    Operations are ``read``, ``write``, ``encrypt``, ``decrypt`` and ``connect``. The
+    characteristic is the enum member name, e.g. ``SPEED`` or ``CHALLENGE`` for nonce reads.
+    """
+
+    enabled = False
+
+    def labeled(self, **labels: str) -> "Instrumentation":
+        """
+        Returns an instrumentation that attaches extra labels, e.g. ``bike=address``, to
+        everything it records. Shares storage with this instrumentation.
+        """
+        return self
+
+    def record_operation(
+        self,
+        operation: str,
+        characteristic: str,
+        seconds: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """
+        Records one finished operation.
+
+        :param error: The exception the operation raised, if it failed.
+        """
+
+    def record_retry(self, operation: str, characteristic: str) -> None:
+        """
+        Records that an operation is retried, e.g. a write with a rejected cached nonce.
+        """
+
+    def record_auth_failure(self) -> None:
+        """
+        Records a failed authentication.
+        """
+
+
+NULL_INSTRUMENTATION = Instrumentation()
+
+
+class Histogram:
+    """
+    A cumulative histogram in the style of Prometheus.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """
+        Yields ``(upper_bound, count)`` pairs where count includes every smaller bucket.
+        """
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class OperationMetrics:
+    """
+    Everything recorded for one operation on one characteristic.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.latency = Histogram(buckets)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.errors = 0
+        self.retries = 0
+
+
+class InMemoryInstrumentation(Instrumentation):
+    """
+    Keeps latency histograms, byte counts, errors, retries and authentication failures in
+    memory, keyed by labels, operation and characteristic.
+
+    Example::
+
+        metrics = InMemoryInstrumentation()
+        client = SX3Client(bleak_client, key, user_key_id, instrumentation=metrics)
+        ...
+        print(metrics.operations[((), "read", "SPEED")].latency.sum)
+        print(prometheus_text(metrics))
+
+    :param buckets: Upper bounds in seconds of the latency histogram buckets.
+    """
+
+    enabled = True
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.operations: Dict[tuple, OperationMetrics] = {}
+        self.auth_failures: Dict[tuple, int] = {}
+        self._labels = ()
+
+    def labeled(self, **labels: str) -> "InMemoryInstrumentation":
+        child = InMemoryInstrumentation.__new__(InMemoryInstrumentation)
+        child.buckets = self.buckets
+        child.operations = self.operations
+        child.auth_failures = self.auth_failures
+        child._labels = tuple(sorted(dict(self._labels, **labels).items()))
+        return child
+
+    def _metrics(self, operation: str, characteristic: str) -> OperationMetrics:
+        key = (self._labels, operation, characteristic)
+        metrics = self.operations.get(key)
+        if metrics is None:
+            metrics = self.operations[key] = OperationMetrics(self.buckets)
+        return metrics
+
+    def record_operation(
+        self,
+        operation: str,
+        characteristic: str,
+        seconds: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        metrics = self._metrics(operation, characteristic)
+        metrics.latency.observe(seconds)
+        metrics.bytes_sent += bytes_sent
+        metrics.bytes_received += bytes_received
+        if error is not None:
+            metrics.errors += 1
+
+    def record_retry(self, operation: str, characteristic: str) -> None:
+        self._metrics(operation, characteristic).retries += 1
+
+    def record_auth_failure(self) -> None:
+        self.auth_failures[self._labels] = self.auth_failures.get(self._labels, 0) + 1
+
+
+def _format_labels(labels) -> str:
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == math.inf else repr(bound)
+
+
+def prometheus_text(metrics: InMemoryInstrumentation, prefix: str = "pymoof") -> str:
+    """
+    Renders collected metrics in the Prometheus text exposition format.
+
+    :param metrics: The instrumentation holding the metrics.
+    :param prefix: Prefix for every metric name.
+    """
+    lines = [
+        f"# HELP {prefix}_operation_seconds Latency of bike operations.",
+        f"# TYPE {prefix}_operation_seconds histogram",
+    ]
+    counters = {
+        "bytes_sent_total": ("Bytes written to the bike.", []),
+        "bytes_received_total": ("Bytes read from the bike.", []),
+        "operation_errors_total": ("Failed bike operations.", []),
+        "retries_total": ("Retried bike operations.", []),
+    }
+
+    for (labels, operation, characteristic), operation_metrics in sorted(
+        metrics.operations.items(),
+    ):
+        labels = labels + (("operation", operation), ("characteristic", characteristic))
+        histogram = operation_metrics.latency
+
+        for bound, count in histogram.cumulative():
+            bucket_labels = _format_labels(labels + (("le", _format_bound(bound)),))
+            lines.append(f"{prefix}_operation_seconds_bucket{bucket_labels} {count}")
+        lines.append(f"{prefix}_operation_seconds_sum{_format_labels(labels)} {histogram.sum!r}")
+        lines.append(f"{prefix}_operation_seconds_count{_format_labels(labels)} {histogram.count}")
+
+        for name, value in (
+            ("bytes_sent_total", operation_metrics.bytes_sent),
+            ("bytes_received_total", operation_metrics.bytes_received),
+            ("operation_errors_total", operation_metrics.errors),
+            ("retries_total", operation_metrics.retries),
+        ):
+            counters[name][1].append(f"{prefix}_{name}{_format_labels(labels)} {value}")
+
+    for name, (description, samples) in counters.items():
+        lines.append(f"# HELP {prefix}_{name} {description}")
+        lines.append(f"# TYPE {prefix}_{name} counter")
+        lines.extend(samples)
+
+    lines.append(f"# HELP {prefix}_authentication_failures_total Failed authentications.")
+    lines.append(f"# TYPE {prefix}_authentication_failures_total counter")
+    for labels, count in sorted(metrics.auth_failures.items()):
+        lines.append(f"{prefix}_authentication_failures_total{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,88 @@
+import asyncio
+import enum
+import heapq
+import itertools
+
+
+class Priority(enum.IntEnum):
+    """
+    Priorities for commands sent over one connection. Lower values run first.
+    """
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class _Hold:
+    def __init__(self, lock: "PriorityLock", priority: int) -> None:
+        self._lock = lock
+        self._priority = priority
+
+    async def __aenter__(self) -> None:
+        await self._lock.acquire(self._priority)
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._lock.release()
+
+
+class PriorityLock:
+    """
+    An asyncio lock that is handed to the waiter with the best priority when released.
+    Waiters with the same priority are served in the order they arrived.
+
+    Example::
+
+        lock = PriorityLock()
+        async with lock.hold(Priority.HIGH):
+            ...
+    """
+
+    def __init__(self) -> None:
+        self._locked = False
+        self._waiters = []
+        self._order = itertools.count()
+
+    def locked(self) -> bool:
+        return self._locked
+
+    @property
+    def waiting(self) -> int:
+        """
+        The number of coroutines waiting to acquire the lock.
+        """
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int = Priority.NORMAL) -> None:
+        if not self._locked and self.waiting == 0:
+            self._locked = True
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The lock was handed over just before the cancellation, pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        if not self._locked:
+            raise RuntimeError("Lock is not acquired")
+
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Ownership passes straight to the waiter, the lock stays locked
+                future.set_result(None)
+                return
+
+        self._locked = False
+
+    def hold(self, priority: int = Priority.NORMAL) -> _Hold:
+        """
+        Returns an async context manager that holds the lock with the given priority.
+        """
+        return _Hold(self, priority)
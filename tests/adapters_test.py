@@ -0,0 +1,179 @@
+import asyncio
+
+import pytest
+
+from pymoof.fleet.adapters import AdapterScheduler
+from pymoof.fleet.manager import FleetManager
+from pymoof.fleet.pool import ConnectionPool
+from pymoof.simulators.sx3 import Simulator
+
+KEY = "00112233445566778899aabbccddeeff"
+
+
+def make_simulator(bikes, **adapters):
+    simulator = Simulator(seed=0)
+    for address in bikes:
+        simulator.add_bike(address, KEY, 1)
+    for name, options in adapters.items():
+        simulator.add_adapter(name, **options)
+    return simulator
+
+
+def make_scheduler(simulator, **kwargs):
+    return AdapterScheduler(
+        simulator.adapters,
+        client_factory=simulator,
+        scan=simulator.discover,
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_connections_are_balanced():
+    bikes = [f"bike-{i}" for i in range(6)]
+    simulator = make_simulator(bikes, hci0={}, hci1={}, hci2={})
+    scheduler = make_scheduler(simulator)
+    await scheduler.discover()
+
+    async with FleetManager(pool=ConnectionPool(scheduler)) as fleet:
+        for address in bikes:
+            fleet.add_bike(address, KEY, 1)
+        clients = await fleet.connect_all()
+
+        assert [len(stats.connections) for stats in scheduler.adapters.values()] == [2, 2, 2]
+        for address, client in clients.items():
+            assert client._gatt_client.controller.name == scheduler.adapter(address)
+
+    assert [len(stats.connections) for stats in scheduler.adapters.values()] == [0, 0, 0]
+
+
+def test_faster_adapter_takes_more_connections():
+    bikes = [f"bike-{i}" for i in range(5)]
+    simulator = make_simulator(bikes, hci0={}, hci1={})
+    scheduler = make_scheduler(simulator)
+    scheduler.adapters["hci0"].latency = 0.01
+    scheduler.adapters["hci1"].latency = 0.04
+
+    for address in bikes:
+        scheduler(address)
+
+    # Expected waits are 5 * 10ms on hci0 and 1 * 40ms on hci1
+    assert len(scheduler.adapters["hci0"].connections) == 4
+    assert len(scheduler.adapters["hci1"].connections) == 1
+
+
+@pytest.mark.asyncio
+async def test_bikes_only_connect_through_adapters_in_range():
+    simulator = make_simulator(
+        ["near", "far"],
+        hci0={"reachable": ["near"]},
+        hci1={},
+    )
+    scheduler = make_scheduler(simulator)
+    assert await scheduler.discover() == {"near": ["hci0", "hci1"], "far": ["hci1"]}
+
+    async with ConnectionPool(scheduler) as pool:
+        pool.register("far", KEY, 1)
+        pool.register("near", KEY, 1)
+        await pool.acquire("far")
+        await pool.acquire("near")
+
+        assert scheduler.adapter("far") == "hci1"
+        assert scheduler.adapter("near") == "hci0"
+
+
+@pytest.mark.asyncio
+async def test_degraded_adapter_is_drained():
+    bikes = [f"bike-{i}" for i in range(4)]
+    simulator = make_simulator(bikes, hci0={}, hci1={})
+    scheduler = make_scheduler(simulator, max_latency=0.05, smoothing=1.0)
+    await scheduler.discover()
+
+    pool = ConnectionPool(scheduler, instrumentation=scheduler.instrumentation())
+    async with FleetManager(pool=pool) as fleet:
+        for address in bikes:
+            fleet.add_bike(address, KEY, 1)
+        await fleet.connect_all()
+        on_hci0 = set(scheduler.adapters["hci0"].connections)
+        assert len(on_hci0) == 2
+        assert await scheduler.rebalance(pool) == {}
+
+        simulator.adapters["hci0"].latency = 0.1
+        await fleet.run(next(iter(on_hci0)), lambda client: client.get_battery_level())
+        assert scheduler.degraded == ["hci0"]
+
+        assert await scheduler.rebalance(pool) == {address: "hci1" for address in on_hci0}
+        assert scheduler.adapters["hci0"].connections == set()
+        assert len(scheduler.adapters["hci1"].connections) == 4
+
+        levels = await fleet.run_all(lambda client: client.get_battery_level())
+        assert all(isinstance(level, int) for level in levels.values())
+        assert all(
+            fleet.client(address)._gatt_client.controller.name == "hci1" for address in bikes
+        )
+
+
+@pytest.mark.asyncio
+async def test_failed_scan_counts_against_adapter():
+    simulator = make_simulator(["bike"], hci0={}, hci1={})
+
+    def scan(adapter, timeout):
+        if adapter == "hci0":
+            raise OSError("Adapter hci0 is down")
+        return simulator.discover(adapter, timeout)
+
+    scheduler = AdapterScheduler(
+        simulator.adapters,
+        client_factory=simulator,
+        scan=scan,
+        max_failures=1,
+    )
+    assert await scheduler.discover() == {"bike": ["hci1"]}
+    assert scheduler.degraded == ["hci0"]
+    assert scheduler.choose("unknown") == "hci1"
+
+
+@pytest.mark.asyncio
+async def test_bike_without_healthy_adapter_is_not_moved():
+    simulator = make_simulator(["near", "far"], hci0={}, hci1={"reachable": ["near"]})
+    scheduler = make_scheduler(simulator, max_failures=1)
+    await scheduler.discover()
+
+    async with ConnectionPool(scheduler) as pool:
+        pool.register("far", KEY, 1)
+        client = await pool.acquire("far")
+        assert scheduler.adapter("far") == "hci0"
+
+        scheduler.record("far", 0.0, OSError("Adapter hci0 is flaky"))
+        assert scheduler.degraded == ["hci0"]
+
+        assert await scheduler.rebalance(pool) == {}
+        assert await pool.acquire("far") is client
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_per_adapter():
+    bikes = [f"bike-{i}" for i in range(6)]
+    simulator = make_simulator(bikes, hci0={}, hci1={})
+    scheduler = make_scheduler(simulator)
+    await scheduler.discover()
+    in_flight = {"hci0": 0, "hci1": 0}
+    peaks = {"hci0": 0, "hci1": 0, "total": 0}
+
+    async def operation(client):
+        adapter = client._gatt_client.controller.name
+        in_flight[adapter] += 1
+        peaks[adapter] = max(peaks[adapter], in_flight[adapter])
+        peaks["total"] = max(peaks["total"], sum(in_flight.values()))
+        await asyncio.sleep(0.01)
+        in_flight[adapter] -= 1
+
+    pool = ConnectionPool(scheduler, instrumentation=scheduler.instrumentation())
+    async with FleetManager(pool=pool, max_concurrency=1) as fleet:
+        for address in bikes:
+            fleet.add_bike(address, KEY, 1)
+        await fleet.connect_all()
+        await fleet.run_all(operation, return_exceptions=False)
+
+    # Each adapter runs one command at a time, but both run at once
+    assert peaks == {"hci0": 1, "hci1": 1, "total": 2}
@@ -0,0 +1,145 @@
+import json
+from unittest import mock
+
+import bleak.exc
+import pytest
+
+from pymoof.simulators.sx3 import Simulator
+from pymoof.tools import address_cache
+from pymoof.tools.address_cache import AddressCache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache" / "addresses.json")
+
+
+@pytest.fixture
+def cache(path):
+    return AddressCache(path)
+
+
+@pytest.fixture
+def simulator():
+    simulator = Simulator()
+    simulator.add_bike("AA", "a" * 32, 1, frame_number="FRAME-A")
+    simulator.add_bike("BB", "a" * 32, 1, frame_number="FRAME-B")
+    return simulator
+
+
+def devices(*addresses):
+    async def stream(**kwargs):
+        for address in addresses:
+            yield mock.Mock(address=address, rssi=-40)
+
+    return stream
+
+
+def test_cache_persists(cache, path):
+    assert cache.get("FRAME") is None
+
+    cache.put("FRAME", "AA", rssi=-40)
+
+    entry = AddressCache(path).get("FRAME")
+    assert entry["address"] == "AA"
+    assert entry["rssi"] == -40
+    assert json.load(open(path))["FRAME"]["address"] == "AA"
+
+    cache.remove("FRAME")
+    assert AddressCache(path).get("FRAME") is None
+
+
+def test_cache_ttl(cache, path):
+    with mock.patch("time.time", return_value=1000):
+        cache.put("OLD", "AA")
+    cache.put("NEW", "BB")
+
+    assert cache.get("OLD") is None
+    assert cache.most_recent() == "NEW"
+    assert cache.evict_expired() == 1
+    assert "OLD" not in json.load(open(path))
+
+
+def test_cache_ignores_corrupt_file(tmp_path):
+    path = tmp_path / "addresses.json"
+    path.write_text("{not json")
+
+    assert AddressCache(str(path)).get("FRAME") is None
+
+
+def test_most_recent_handles_entries_without_last_seen(tmp_path):
+    path = tmp_path / "addresses.json"
+    path.write_text(json.dumps({"FRAME": {"address": "AA"}}))
+    cache = AddressCache(str(path), ttl=float("inf"))
+
+    assert cache.most_recent() == "FRAME"
+
+
+@pytest.mark.asyncio
+async def test_connect_uses_cached_address(cache, simulator):
+    cache.put("FRAME-B", "BB")
+    stream = mock.Mock(side_effect=AssertionError("should not scan"))
+
+    with mock.patch.object(address_cache.discover_bike, "stream", stream):
+        bleak_client = await address_cache.connect("FRAME-B", cache, simulator)
+
+    assert bleak_client.bike is simulator.bikes["BB"]
+    assert bleak_client.is_connected
+
+
+@pytest.mark.asyncio
+async def test_connect_defaults_to_most_recent_bike(cache, simulator):
+    cache.put("FRAME-A", "AA")
+
+    with mock.patch.object(address_cache.discover_bike, "stream", devices()):
+        bleak_client = await address_cache.connect(cache=cache, client_factory=simulator)
+
+    assert bleak_client.bike is simulator.bikes["AA"]
+
+
+@pytest.mark.asyncio
+async def test_connect_scans_on_miss(cache, simulator):
+    with mock.patch.object(address_cache.discover_bike, "stream", devices("AA", "BB")):
+        bleak_client = await address_cache.connect("FRAME-B", cache, simulator)
+
+    assert bleak_client.bike is simulator.bikes["BB"]
+    # The bike that did not match was disconnected again
+    assert simulator.bikes["AA"].client is None
+    assert cache.get("FRAME-B")["address"] == "BB"
+    assert cache.get("FRAME-B")["rssi"] == -40
+
+
+@pytest.mark.asyncio
+async def test_connect_scans_when_cached_address_fails(cache, simulator):
+    cache.put("FRAME-A", "GONE")
+
+    with mock.patch.object(address_cache.discover_bike, "stream", devices("AA")):
+        bleak_client = await address_cache.connect("FRAME-A", cache, simulator)
+
+    assert bleak_client.bike is simulator.bikes["AA"]
+    assert cache.get("FRAME-A")["address"] == "AA"
+
+
+@pytest.mark.asyncio
+async def test_connect_skips_devices_that_are_not_bikes(cache, simulator):
+    # A device without the bike's services, its frame number lookup hits a missing service
+    other = mock.AsyncMock()
+    other.get_services.return_value.get_service = mock.Mock(return_value=None)
+
+    def client_factory(address):
+        return other if address == "OTHER" else simulator(address)
+
+    with mock.patch.object(address_cache.discover_bike, "stream", devices("OTHER", "BB")):
+        bleak_client = await address_cache.connect("FRAME-B", cache, client_factory)
+
+    assert bleak_client.bike is simulator.bikes["BB"]
+    other.disconnect.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_connect_not_found(cache, simulator):
+    with mock.patch.object(address_cache.discover_bike, "stream", devices("AA")):
+        with pytest.raises(bleak.exc.BleakError):
+            await address_cache.connect("FRAME-C", cache, simulator)
+
+    assert cache.get("FRAME-C") is None
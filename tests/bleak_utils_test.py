@@ -1,3 +1,4 @@
+import enum
 from unittest import mock
 
 import pytest
@@ -63,6 +64,17 @@ async def test_write_to_characteristic(bleak_client, uuid, characteristic, servi
     )
 
 
+@pytest.mark.asyncio
+async def test_write_without_response(bleak_client, uuid, characteristic, service):
+    data = b"deadbeef"
+    await bleak_utils.write_to_characteristic(bleak_client, uuid, data, response=False)
+    bleak_client.write_gatt_char.assert_called_once_with(
+        characteristic,
+        data,
+        response=False,
+    )
+
+
 @pytest.mark.asyncio
 async def test_read_from_characteristic(bleak_client, uuid, characteristic):
     data = b"deadbeef"
@@ -72,3 +84,72 @@ async def test_read_from_characteristic(bleak_client, uuid, characteristic):
     assert result == data
 
     bleak_client.read_gatt_char.assert_called_once_with(characteristic)
+
+
+@pytest.fixture
+def service_enum():
+    class FakeService(enum.Enum):
+        SERVICE_UUID = "service"
+
+        FIRST = "first"
+        SECOND = "second"
+
+    return FakeService
+
+
+@pytest.fixture
+def resolver(bleak_client, service_enum):
+    return bleak_utils.CharacteristicResolver(bleak_client, [service_enum])
+
+
+@pytest.mark.asyncio
+async def test_resolver_indexes_services_once(
+    bleak_client,
+    resolver,
+    service_enum,
+    services,
+    characteristic,
+):
+    assert await resolver.get_characteristic(service_enum.FIRST) == characteristic
+    assert await resolver.get_characteristic(service_enum.SECOND) == characteristic
+    assert await resolver.get_characteristic(service_enum.FIRST) == characteristic
+
+    bleak_client.get_services.assert_called_once_with()
+    services.get_service.assert_called_once_with("service")
+
+
+@pytest.mark.asyncio
+async def test_resolver_invalidate(bleak_client, resolver, service_enum):
+    await resolver.get_characteristic(service_enum.FIRST)
+    resolver.invalidate()
+    await resolver.get_characteristic(service_enum.FIRST)
+
+    assert bleak_client.get_services.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_resolver_falls_back_for_unknown_characteristic(
+    bleak_client,
+    resolver,
+    uuid,
+    service,
+    characteristic,
+):
+    assert await resolver.get_characteristic(uuid) == characteristic
+    service.get_characteristic.assert_called_with(uuid.value)
+
+
+@pytest.mark.asyncio
+async def test_read_from_characteristic_with_resolver(
+    bleak_client,
+    resolver,
+    service_enum,
+    characteristic,
+):
+    bleak_client.read_gatt_char.return_value = b"deadbeef"
+
+    await bleak_utils.read_from_characteristic(bleak_client, service_enum.FIRST, resolver)
+    await bleak_utils.write_to_characteristic(bleak_client, service_enum.FIRST, b"", resolver)
+
+    bleak_client.get_services.assert_called_once_with()
+    bleak_client.read_gatt_char.assert_called_once_with(characteristic)
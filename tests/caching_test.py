@@ -0,0 +1,64 @@
+from unittest import mock
+
+from pymoof.profiles.sx3 import SX3Profile
+from pymoof.util.caching import ReadCache
+
+FRAME_NUMBER = SX3Profile.BikeInfo.FRAME_NUMBER
+FIRMWARE = SX3Profile.BikeInfo.BIKE_FIRMWARE_VERSION
+SPEED = SX3Profile.Movement.SPEED
+
+
+def test_only_caches_characteristics_with_ttl():
+    cache = ReadCache(ttls={FIRMWARE: 0})
+    cache.put("bike", SPEED, 12)
+    cache.put("bike", FIRMWARE, "1.0")
+
+    assert len(cache) == 0
+    assert not cache.cacheable(SPEED)
+    assert cache.get("bike", SPEED) is None
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_values_expire():
+    cache = ReadCache(ttls={FRAME_NUMBER: 10})
+    with mock.patch("time.monotonic", return_value=100.0) as now:
+        cache.put("bike", FRAME_NUMBER, "ASY1")
+        assert cache.get("bike", FRAME_NUMBER) == "ASY1"
+        assert cache.get("other", FRAME_NUMBER) is None
+
+        now.return_value = 110.0
+        assert cache.get("bike", FRAME_NUMBER) is None
+
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = ReadCache(max_entries=2)
+    cache.put("a", FRAME_NUMBER, "A")
+    cache.put("b", FRAME_NUMBER, "B")
+    cache.get("a", FRAME_NUMBER)
+    cache.put("c", FRAME_NUMBER, "C")
+
+    assert cache.get("b", FRAME_NUMBER) is None
+    assert cache.get("a", FRAME_NUMBER) == "A"
+    assert cache.get("c", FRAME_NUMBER) == "C"
+    assert cache.evictions == 1
+
+
+def test_invalidate():
+    cache = ReadCache(related={SX3Profile.BikeState.MODULE_MODE: [FIRMWARE]})
+    for bike in ("a", "b"):
+        cache.put(bike, FRAME_NUMBER, bike)
+        cache.put(bike, FIRMWARE, "1.0")
+
+    cache.invalidate("a", SX3Profile.BikeState.MODULE_MODE)
+    assert cache.get("a", FIRMWARE) is None
+    assert cache.get("a", FRAME_NUMBER) == "a"
+
+    cache.invalidate("a")
+    assert cache.get("a", FRAME_NUMBER) is None
+    assert cache.get("b", FRAME_NUMBER) == "b"
+
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,97 @@
+import pytest
+
+from pymoof.profiles import codecs
+from pymoof.profiles.codecs import StructCodec
+from pymoof.profiles.registry import SX3_CHARACTERISTICS
+from pymoof.profiles.sx3 import SX3Profile
+
+
+def block(data):
+    return bytes(data).ljust(16, b"\x00")
+
+
+def test_registry_parsers_come_from_codecs():
+    for record in SX3_CHARACTERISTICS:
+        codec = codecs.CODECS.get(record.member)
+        assert record.parser == (codec.decode if codec is not None else None)
+
+
+@pytest.mark.parametrize(
+    "characteristic,data,expected",
+    [
+        (SX3Profile.Defense.LOCK_STATE, [1], 1),
+        (SX3Profile.Defense.LOCK_STATE, [0x42], 0x42),
+        (SX3Profile.Movement.DISTANCE, (12345).to_bytes(4, "little"), 1234.5),
+        (SX3Profile.Movement.SPEED, (23).to_bytes(2, "little"), 23),
+        (SX3Profile.Movement.POWER_LEVEL, [3, 1], 3),
+        (SX3Profile.BikeInfo.MOTOR_BATTERY_LEVEL, [87], 87),
+        (SX3Profile.Sound.BELL_SOUND, [0x17], 0x17),
+        (SX3Profile.Sound.SOUND_VOLUME, [7], 7),
+        (SX3Profile.Light.LIGHT_MODE, [2], 2),
+        (SX3Profile.BikeState.MODULE_STATE, [3], 3),
+        (SX3Profile.Movement.E_SHIFTER_GEAR, [2], 2),
+        (SX3Profile.Movement.E_SHIFTIG_POINTS, [12, 18, 23], (12, 18, 23)),
+        (SX3Profile.BikeState.CLOCK, (1700000000).to_bytes(4, "little"), 1700000000),
+        (SX3Profile.BikeInfo.BIKE_FIRMWARE_VERSION, b"1.4.1", "1.4.1"),
+        (SX3Profile.BikeInfo.PCBA_HARDWARE_VERSION, b"2.1", "2.1"),
+        # Formats that are not known yet stay bytes
+        (SX3Profile.BikeState.ERRORS, b"\x01\x02", b"\x01\x02" + bytes(14)),
+        (SX3Profile.Light.SENSOR, b"\x01\x02", b"\x01\x02" + bytes(14)),
+    ],
+)
+def test_decode(characteristic, data, expected):
+    assert codecs.decode(characteristic, block(data)) == expected
+
+
+def test_decode_unpadded_text():
+    assert codecs.decode(SX3Profile.BikeInfo.FRAME_NUMBER, b"ASY1234567") == "ASY1234567"
+
+
+def test_decode_non_ascii_text():
+    assert codecs.decode(SX3Profile.BikeInfo.FRAME_NUMBER, b"ASY\xff12") == "ASY\ufffd12"
+
+
+def test_speed_and_distance_use_the_whole_payload():
+    payload = (1 << 40).to_bytes(16, "little")
+
+    assert codecs.decode(SX3Profile.Movement.SPEED, payload) == 1 << 40
+    assert codecs.decode(SX3Profile.Movement.DISTANCE, payload) == (1 << 40) / 10
+
+
+@pytest.mark.parametrize(
+    "characteristic,records",
+    [
+        (SX3Profile.Movement.SPEED, [[1], [2], [3]]),
+        (SX3Profile.Movement.DISTANCE, [[10], [20]]),
+        (SX3Profile.Movement.POWER_LEVEL, [[1], [4]]),
+        (SX3Profile.BikeInfo.BIKE_FIRMWARE_VERSION, [b"1.0", b"1.1"]),
+        (SX3Profile.Movement.E_SHIFTIG_POINTS, [[12, 18, 23], [10, 15, 20]]),
+        (SX3Profile.Light.SENSOR, [b"\x01", b"\x02"]),
+    ],
+)
+def test_decode_many_matches_decode(characteristic, records):
+    payloads = [block(record) for record in records]
+
+    assert codecs.decode_many(characteristic, b"".join(payloads)) == [
+        codecs.decode(characteristic, payload) for payload in payloads
+    ]
+
+
+def test_decode_many_decrypted_buffer():
+    profile = SX3Profile("a" * 32, 1)
+    ciphertext = profile.encrypt_buffer(b"".join(block([speed]) for speed in range(50)))
+
+    speeds = codecs.decode_many(SX3Profile.Movement.SPEED, profile.decrypt_buffer(ciphertext))
+    assert speeds == list(range(50))
+
+
+def test_decode_many_rejects_partial_records():
+    with pytest.raises(ValueError):
+        codecs.decode_many(SX3Profile.Movement.SPEED, bytes(20))
+    with pytest.raises(ValueError):
+        codecs.decode_many(SX3Profile.Light.SENSOR, bytes(20))
+
+
+def test_struct_codec_must_fit_record():
+    with pytest.raises(ValueError):
+        StructCodec("<17B")
@@ -0,0 +1,126 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from pymoof.tools import discover_bike
+
+
+class FakeScanner:
+    """
+    Replays advertisements to the detection callback once scanning starts.
+    """
+
+    advertisements = []
+    instances = []
+
+    def __init__(self, detection_callback, service_uuids, **kwargs):
+        self.detection_callback = detection_callback
+        self.service_uuids = service_uuids
+        self.kwargs = kwargs
+        self.running = False
+        FakeScanner.instances.append(self)
+
+    async def _advertise(self):
+        for delay, address, rssi, uuids in FakeScanner.advertisements:
+            await asyncio.sleep(delay)
+            if not self.running:
+                return
+            device = mock.Mock(address=address, rssi=rssi)
+            self.detection_callback(device, mock.Mock(service_uuids=uuids))
+
+    async def start(self):
+        self.running = True
+        self.task = asyncio.ensure_future(self._advertise())
+
+    async def stop(self):
+        self.running = False
+        self.task.cancel()
+
+
+@pytest.fixture(autouse=True)
+def scanner():
+    FakeScanner.advertisements = []
+    FakeScanner.instances = []
+    with mock.patch.object(discover_bike, "BleakScanner", FakeScanner):
+        yield FakeScanner
+
+
+def advertise(address, rssi=-50, uuids=(discover_bike.SX3_SERVICE_UUID,), delay=0.001):
+    FakeScanner.advertisements.append((delay, address, rssi, list(uuids)))
+
+
+async def collect(iterator):
+    return [device.address async for device in iterator]
+
+
+@pytest.mark.asyncio
+async def test_stream_dedupes_and_filters():
+    advertise("AA")
+    advertise("AA")
+    advertise("BB", uuids=[discover_bike.SX1_SX2_SERVICE_UUID])
+    advertise("CC", rssi=-90)
+    advertise("DD", rssi=-60)
+
+    devices = await collect(discover_bike.stream(timeout=0.1, min_rssi=-70))
+
+    assert devices == ["AA", "DD"]
+    assert not FakeScanner.instances[0].running
+
+
+@pytest.mark.asyncio
+async def test_stream_stops_after_count():
+    advertise("AA")
+    advertise("BB")
+    advertise("CC", delay=10)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    devices = await collect(discover_bike.stream(timeout=10, count=2))
+
+    assert devices == ["AA", "BB"]
+    assert loop.time() - start < 1
+    assert not FakeScanner.instances[0].running
+
+
+@pytest.mark.asyncio
+async def test_stream_stops_when_addresses_found():
+    advertise("AA")
+    advertise("bb")
+    advertise("CC")
+    advertise("DD", delay=10)
+
+    devices = await collect(discover_bike.stream(timeout=10, addresses=["CC", "BB"]))
+
+    assert devices == ["bb", "CC"]
+    assert await collect(discover_bike.stream(addresses=[])) == []
+
+
+@pytest.mark.asyncio
+async def test_stream_passes_scanner_options():
+    await collect(discover_bike.stream(timeout=0.01, adapter="hci1"))
+
+    assert FakeScanner.instances[0].kwargs == {"adapter": "hci1"}
+    assert FakeScanner.instances[0].service_uuids == [discover_bike.SX3_SERVICE_UUID]
+
+
+@pytest.mark.asyncio
+async def test_query_returns_first_sx3():
+    advertise("AA")
+    advertise("BB", delay=10)
+
+    device = await discover_bike.query(timeout=10)
+
+    assert device.address == "AA"
+    assert not FakeScanner.instances[0].running
+
+
+@pytest.mark.asyncio
+async def test_query_rejects_older_bikes():
+    advertise("AA", uuids=[discover_bike.SX1_SX2_SERVICE_UUID])
+
+    with pytest.raises(Exception):
+        await discover_bike.query(timeout=1)
+
+    FakeScanner.advertisements = []
+    assert await discover_bike.query(timeout=0.01) is None
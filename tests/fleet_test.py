@@ -0,0 +1,321 @@
+import asyncio
+
+import bleak.exc
+import pytest
+
+from pymoof.fleet.manager import FleetManager
+from pymoof.fleet.manager import LatencyStats
+from pymoof.fleet.pool import ConnectionPool
+from pymoof.profiles.sx3 import SX3Profile
+from pymoof.util.instrumentation import Instrumentation
+
+KEY = "a" * 32
+
+# Zeroes encrypted with KEY, so reads decrypt to zero values
+ENCRYPTED_ZEROES = bytes(SX3Profile(KEY, 1).encrypt_buffer(bytes(16)))
+
+
+class FakeService:
+    def get_characteristic(self, uuid):
+        return uuid
+
+
+class FakeServices:
+    def get_service(self, uuid):
+        return FakeService()
+
+
+class FakeBleakClient:
+    """
+    In-process stand-in for a bleak client that answers every read with encrypted zeroes.
+    """
+
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, address, disconnected_callback=None, adapter=None, latency=0.001):
+        self.address = address
+        self.adapter = adapter
+        self.disconnected_callback = disconnected_callback
+        self.latency = latency
+        self.connected = False
+        self.writes = []
+
+    async def _round_trip(self):
+        FakeBleakClient.in_flight += 1
+        FakeBleakClient.max_in_flight = max(
+            FakeBleakClient.max_in_flight,
+            FakeBleakClient.in_flight,
+        )
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            FakeBleakClient.in_flight -= 1
+
+    async def connect(self):
+        await self._round_trip()
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    async def get_services(self):
+        return FakeServices()
+
+    async def read_gatt_char(self, characteristic):
+        await self._round_trip()
+        if characteristic == SX3Profile.Security.CHALLENGE.value:
+            return b"\x00\x01"
+        return ENCRYPTED_ZEROES
+
+    async def write_gatt_char(self, characteristic, data, response=True):
+        await self._round_trip()
+        self.writes.append((characteristic, data))
+
+
+@pytest.fixture(autouse=True)
+def reset_in_flight():
+    FakeBleakClient.in_flight = 0
+    FakeBleakClient.max_in_flight = 0
+
+
+@pytest.fixture
+def key():
+    return KEY
+
+
+def test_latency_stats():
+    stats = LatencyStats()
+    assert stats.mean is None
+
+    stats.record(1.0)
+    stats.record(3.0)
+
+    assert stats.count == 2
+    assert stats.mean == 2.0
+    assert stats.minimum == 1.0
+    assert stats.maximum == 3.0
+    assert stats.last == 3.0
+
+
+@pytest.mark.asyncio
+async def test_fleet_runs_commands_concurrently(key):
+    async with FleetManager(FakeBleakClient, max_concurrency=8) as fleet:
+        for i in range(50):
+            fleet.add_bike(f"bike-{i}", key, 1)
+
+        clients = await fleet.connect_all()
+        assert len(clients) == 50
+
+        await fleet.authenticate_all()
+        levels = await fleet.run_all(lambda client: client.get_battery_level())
+
+        assert list(levels) == [f"bike-{i}" for i in range(50)]
+        assert all(isinstance(level, int) for level in levels.values())
+        assert FakeBleakClient.max_in_flight == 8
+        assert fleet.latency("bike-0").count == 3
+
+
+@pytest.mark.asyncio
+async def test_fleet_limits_concurrency_per_adapter(key):
+    async with FleetManager(FakeBleakClient, max_concurrency=2) as fleet:
+        for i in range(10):
+            fleet.add_bike(f"bike-{i}", key, 1, adapter=f"hci{i % 2}")
+
+        await fleet.connect_all()
+
+        assert fleet.client("bike-1")._gatt_client.adapter == "hci1"
+        assert FakeBleakClient.max_in_flight == 4
+
+
+@pytest.mark.asyncio
+async def test_fleet_runs_commands_for_one_bike_in_order(key):
+    order = []
+
+    async def command(i):
+        await asyncio.sleep(0.001 * (5 - i))
+        order.append(i)
+
+    async with FleetManager(FakeBleakClient) as fleet:
+        fleet.add_bike("bike", key, 1)
+        await fleet.connect("bike")
+        await asyncio.gather(*[fleet.run("bike", lambda _, i=i: command(i)) for i in range(5)])
+
+    assert order == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_fleet_shares_slots_fairly(key):
+    order = []
+
+    async with FleetManager(FakeBleakClient, max_concurrency=1) as fleet:
+        fleet.add_bike("busy", key, 1)
+        fleet.add_bike("quiet", key, 1)
+        await fleet.connect_all()
+
+        async def command(name, client):
+            order.append(name)
+            await client.get_speed()
+
+        busy = [fleet.run("busy", lambda client: command("busy", client)) for _ in range(3)]
+        quiet = [fleet.run("quiet", lambda client: command("quiet", client))]
+        await asyncio.gather(*busy, *quiet)
+
+    assert order.index("quiet") <= 1
+
+
+@pytest.mark.asyncio
+async def test_fleet_reconnects_dropped_bike(key):
+    async with FleetManager(FakeBleakClient) as fleet:
+        fleet.add_bike("bike", key, 1)
+
+        with pytest.raises(RuntimeError):
+            fleet.client("bike")
+        with pytest.raises(KeyError):
+            fleet.client("unknown")
+
+        client = await fleet.connect("bike")
+        client._gatt_client.disconnected_callback(client._gatt_client)
+
+        await fleet.run("bike", lambda client: client.get_speed())
+        assert fleet.client("bike") is not client
+
+        with pytest.raises(ValueError):
+            fleet.add_bike("bike", key, 1)
+
+
+def test_fleet_rejects_options_for_given_pool():
+    with pytest.raises(ValueError):
+        FleetManager(pool=ConnectionPool(FakeBleakClient), instrumentation=Instrumentation())
+    with pytest.raises(ValueError):
+        FleetManager(pool=ConnectionPool(FakeBleakClient), client_options={"nonce_ttl": 60})
+
+
+def test_fleet_set_up_outside_event_loop(key):
+    fleet = FleetManager(FakeBleakClient)
+    fleet.add_bike("bike", key, 1)
+
+    async def main():
+        async with fleet:
+            return await fleet.run("bike", lambda client: client.get_speed())
+
+    assert asyncio.run(main()) == 0
+
+
+class FlakyBleakClient(FakeBleakClient):
+    failures = 0
+
+    async def connect(self):
+        if FlakyBleakClient.failures > 0:
+            FlakyBleakClient.failures -= 1
+            raise bleak.exc.BleakError("Device not found")
+        await super().connect()
+
+
+@pytest.fixture
+def pool():
+    FlakyBleakClient.failures = 0
+    return ConnectionPool(FlakyBleakClient, initial_backoff=0.001, max_attempts=3)
+
+
+@pytest.mark.asyncio
+async def test_fleet_releases_slot_during_backoff(key):
+    FlakyBleakClient.failures = 1
+    pool = ConnectionPool(FlakyBleakClient, initial_backoff=0.2, max_attempts=2)
+    async with FleetManager(pool=pool, max_concurrency=1) as fleet:
+        fleet.add_bike("flaky", key, 1)
+        fleet.add_bike("healthy", key, 1)
+
+        flaky = asyncio.ensure_future(fleet.connect("flaky"))
+        await asyncio.sleep(0.01)
+        # Connects while the flaky bike backs off, instead of waiting for its slot
+        await asyncio.wait_for(fleet.connect("healthy"), 0.05)
+        assert not flaky.done()
+        await flaky
+
+
+@pytest.mark.asyncio
+async def test_pool_acquire_connects_and_authenticates(pool, key):
+    pool.register("bike", key, 1)
+    assert pool.client("bike") is None
+
+    client = await pool.acquire("bike")
+    assert await pool.acquire("bike") is client
+    assert pool.connect_count("bike") == 1
+    # Authentication writes to the key index characteristic
+    assert client._gatt_client.writes[0][0] == SX3Profile.Security.KEY_INDEX.value
+
+    await pool.close()
+    assert pool.client("bike") is None
+
+
+@pytest.mark.asyncio
+async def test_pool_acquire_shares_connection_attempt(pool, key):
+    pool.register("bike", key, 1)
+    clients = await asyncio.gather(*[pool.acquire("bike") for _ in range(10)])
+
+    assert len(set(clients)) == 1
+    assert pool.connect_count("bike") == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_retries_with_backoff(pool, key):
+    pool.register("bike", key, 1)
+    FlakyBleakClient.failures = 2
+
+    assert await pool.acquire("bike") is not None
+
+    FlakyBleakClient.failures = 3
+    await pool.disconnect("bike")
+    with pytest.raises(bleak.exc.BleakError):
+        await pool.acquire("bike")
+
+
+def test_pool_set_up_outside_event_loop(pool, key):
+    pool.register("bike", key, 1)
+
+    async def main():
+        async with pool:
+            return await pool.acquire("bike")
+
+    assert asyncio.run(main()) is not None
+
+
+def test_pool_backoff_is_bounded():
+    pool = ConnectionPool(initial_backoff=1.0, max_backoff=4.0)
+
+    assert 0.5 <= pool.backoff(1) <= 1.0
+    assert 1.0 <= pool.backoff(2) <= 2.0
+    assert 2.0 <= pool.backoff(10) <= 4.0
+
+
+@pytest.mark.asyncio
+async def test_pool_reconnects_in_background(pool, key):
+    pool.register("bike", key, 1)
+    client = await pool.acquire("bike")
+
+    client._gatt_client.disconnected_callback(client._gatt_client)
+    assert pool.client("bike") is None
+
+    await asyncio.sleep(0.05)
+    assert pool.client("bike") is not None
+    assert pool.connect_count("bike") == 2
+
+    # Callbacks from replaced links are ignored
+    client._gatt_client.disconnected_callback(client._gatt_client)
+    assert pool.client("bike") is not None
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_does_not_reconnect_after_disconnect(pool, key):
+    pool.register("bike", key, 1)
+    client = await pool.acquire("bike")
+    await pool.disconnect("bike")
+
+    client._gatt_client.disconnected_callback(client._gatt_client)
+    await asyncio.sleep(0.01)
+
+    assert pool.client("bike") is None
+    with pytest.raises(ValueError):
+        pool.register("bike", key, 1)
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("bleak", "cryptography", "requests")
+
+
+def loaded_modules(code):
+    output = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint(' '.join(sys.modules))"],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return set(output.split())
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import pymoof",
+        "from pymoof import Sound",
+        "from pymoof.clients.sx3_enums import LockState",
+        "from pymoof.profiles.sx3 import SX3Profile",
+        "from pymoof.clients.sx3 import SX3Client",
+        "from pymoof.tools import retrieve_encryption_key",
+    ],
+)
+def test_import_does_not_load_heavy_dependencies(code):
+    assert not loaded_modules(code) & set(HEAVY_MODULES)
+
+
+def test_data_only_imports_skip_asyncio():
+    assert "asyncio" not in loaded_modules("from pymoof import LockState, Sound, SX3Profile")
+
+
+def test_offline_decrypt_loads_cryptography_only():
+    modules = loaded_modules(
+        "from pymoof.profiles.sx3 import SX3Profile\n"
+        "SX3Profile('a' * 32, 1).decrypt_payload(bytes(16))",
+    )
+    assert "cryptography" in modules
+    assert "bleak" not in modules
+
+
+def test_lazy_attributes():
+    import pymoof
+    from pymoof.clients.sx3 import SX3Client
+
+    assert pymoof.SX3Client is SX3Client
+    assert "SX3Client" in dir(pymoof)
+    with pytest.raises(AttributeError):
+        pymoof.Missing
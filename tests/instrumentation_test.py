@@ -0,0 +1,136 @@
+import bleak.exc
+import pytest
+
+from pymoof.clients.sx3 import LockState
+from pymoof.clients.sx3 import SX3Client
+from pymoof.fleet.manager import FleetManager
+from pymoof.simulators.sx3 import Simulator
+from pymoof.util.instrumentation import Histogram
+from pymoof.util.instrumentation import InMemoryInstrumentation
+from pymoof.util.instrumentation import Instrumentation
+from pymoof.util.instrumentation import NULL_INSTRUMENTATION
+from pymoof.util.instrumentation import prometheus_text
+
+
+@pytest.fixture
+def key():
+    return "00112233445566778899aabbccddeeff"
+
+
+@pytest.fixture
+def simulator(key):
+    simulator = Simulator(seed=0)
+    simulator.add_bike("bike", key, 3, rotate_nonce=True)
+    return simulator
+
+
+@pytest.fixture
+def metrics():
+    return InMemoryInstrumentation(buckets=(0.1, 1.0))
+
+
+def test_null_instrumentation():
+    assert not NULL_INSTRUMENTATION.enabled
+    assert NULL_INSTRUMENTATION.labeled(bike="a") is NULL_INSTRUMENTATION
+
+    instrumentation = Instrumentation()
+    instrumentation.record_operation("read", "SPEED", 1.0)
+    instrumentation.record_retry("write", "LOCK_STATE")
+    instrumentation.record_auth_failure()
+
+
+def test_histogram():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert list(histogram.cumulative()) == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+
+
+def test_labeled_shares_storage(metrics):
+    bike = metrics.labeled(bike="AA")
+    bike.record_operation("read", "SPEED", 0.5, bytes_received=16)
+    bike.labeled(adapter="hci0").record_auth_failure()
+
+    assert metrics.operations[((("bike", "AA"),), "read", "SPEED")].bytes_received == 16
+    assert metrics.auth_failures == {(("adapter", "hci0"), ("bike", "AA")): 1}
+
+
+def test_prometheus_text(metrics):
+    bike = metrics.labeled(bike='A"B')
+    bike.record_operation("read", "SPEED", 0.05, bytes_received=16)
+    bike.record_operation("write", "LOCK_STATE", 2.0, bytes_sent=16, error=Exception())
+    bike.record_retry("write", "LOCK_STATE")
+    bike.record_auth_failure()
+
+    text = prometheus_text(metrics).splitlines()
+
+    assert "# TYPE pymoof_operation_seconds histogram" in text
+    assert (
+        'pymoof_operation_seconds_bucket{bike="A\\"B",operation="read",'
+        'characteristic="SPEED",le="0.1"} 1'
+    ) in text
+    assert (
+        'pymoof_operation_seconds_bucket{bike="A\\"B",operation="write",'
+        'characteristic="LOCK_STATE",le="+Inf"} 1'
+    ) in text
+    assert (
+        'pymoof_operation_seconds_count{bike="A\\"B",operation="write",'
+        'characteristic="LOCK_STATE"} 1'
+    ) in text
+    assert (
+        'pymoof_bytes_sent_total{bike="A\\"B",operation="write",characteristic="LOCK_STATE"} 16'
+    ) in text
+    assert (
+        'pymoof_operation_errors_total{bike="A\\"B",operation="write",'
+        'characteristic="LOCK_STATE"} 1'
+    ) in text
+    assert (
+        'pymoof_retries_total{bike="A\\"B",operation="write",characteristic="LOCK_STATE"} 1'
+    ) in text
+    assert 'pymoof_authentication_failures_total{bike="A\\"B"} 1' in text
+
+
+@pytest.mark.asyncio
+async def test_client_records_operations(simulator, key, metrics):
+    async with simulator.client("bike") as bleak_client:
+        client = SX3Client(bleak_client, key, 3, nonce_ttl=60, instrumentation=metrics)
+        await client.authenticate()
+        await client.get_speed()
+        await client.set_lock_state(LockState.UNLOCKED)
+        # The bike rotated its nonce, so this write is retried
+        await client.set_lock_state(LockState.LOCKED)
+
+    operations = metrics.operations
+    # One nonce for authenticating and the first write, one for the retry
+    assert operations[((), "read", "CHALLENGE")].bytes_received == 2 * 2
+    assert operations[((), "read", "SPEED")].latency.count == 1
+    assert operations[((), "decrypt", "SPEED")].latency.count == 1
+    assert operations[((), "write", "KEY_INDEX")].bytes_sent == 20
+    assert operations[((), "write", "LOCK_STATE")].latency.count == 3
+    assert operations[((), "write", "LOCK_STATE")].errors == 1
+    assert operations[((), "write", "LOCK_STATE")].retries == 1
+    assert operations[((), "encrypt", "LOCK_STATE")].latency.count == 3
+
+
+@pytest.mark.asyncio
+async def test_client_records_auth_failures(simulator, metrics):
+    async with simulator.client("bike") as bleak_client:
+        client = SX3Client(bleak_client, "ff" * 16, 3, instrumentation=metrics)
+        with pytest.raises(bleak.exc.BleakError):
+            await client.authenticate()
+
+    assert metrics.auth_failures == {(): 1}
+
+
+@pytest.mark.asyncio
+async def test_fleet_labels_bikes(simulator, key, metrics):
+    async with FleetManager(simulator, instrumentation=metrics) as fleet:
+        fleet.add_bike("bike", key, 3)
+        await fleet.run("bike", lambda client: client.get_speed())
+
+    labels = (("bike", "bike"),)
+    assert metrics.operations[(labels, "connect", "")].latency.count == 1
+    assert metrics.operations[(labels, "read", "SPEED")].latency.count == 1
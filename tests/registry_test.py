@@ -0,0 +1,91 @@
+import enum
+
+import pytest
+
+from pymoof.clients.sx3_enums import LockState
+from pymoof.profiles.registry import CharacteristicRegistry
+from pymoof.profiles.registry import lookup
+from pymoof.profiles.registry import SX3_CHARACTERISTICS
+from pymoof.profiles.sx3 import SX3Profile
+
+
+class FakeService(enum.Enum):
+    SERVICE_UUID = "service"
+
+    FIRST = "first"
+    SECOND = "second"
+
+
+class OtherService(enum.Enum):
+    SERVICE_UUID = "other"
+
+    FIRST = "other-first"
+
+
+def test_registry_covers_every_characteristic():
+    expected = {
+        member
+        for service in SX3Profile.SERVICES
+        for member in service
+        if member is not service.SERVICE_UUID
+    }
+    assert {record.member for record in SX3_CHARACTERISTICS} == expected
+    assert len(SX3_CHARACTERISTICS) == len(expected)
+    assert SX3_CHARACTERISTICS.service_uuids == tuple(
+        service.SERVICE_UUID.value for service in SX3Profile.SERVICES
+    )
+
+
+def test_lookups():
+    record = SX3_CHARACTERISTICS[SX3Profile.Movement.SPEED]
+
+    assert record.name == "SPEED"
+    assert record.uuid == SX3Profile.Movement.SPEED.value
+    assert record.service is SX3Profile.Movement
+    assert record.service_uuid == SX3Profile.Movement.SERVICE_UUID.value
+    assert SX3_CHARACTERISTICS[record.uuid] is record
+    assert SX3_CHARACTERISTICS["SPEED"] is record
+    assert SX3_CHARACTERISTICS["Movement.SPEED"] is record
+    assert SX3_CHARACTERISTICS.get("missing") is None
+    assert "missing" not in SX3_CHARACTERISTICS
+
+
+def test_encryption_and_parsers():
+    assert not SX3_CHARACTERISTICS[SX3Profile.Security.CHALLENGE].encrypted
+    assert not SX3_CHARACTERISTICS[SX3Profile.BikeInfo.FRAME_NUMBER].encrypted
+    assert SX3_CHARACTERISTICS[SX3Profile.Defense.LOCK_STATE].encrypted
+    assert SX3_CHARACTERISTICS[SX3Profile.Defense.LOCK_STATE].readable
+    assert not SX3_CHARACTERISTICS[SX3Profile.Security.KEY_INDEX].readable
+
+    assert SX3_CHARACTERISTICS["LOCK_STATE"].parser(b"\x01") == LockState.LOCKED.value
+    assert SX3_CHARACTERISTICS["DISTANCE"].parser((1234).to_bytes(16, "little")) == 123.4
+    assert SX3_CHARACTERISTICS["FRAME_NUMBER"].parser(b"ASY1") == "ASY1"
+    assert SX3_CHARACTERISTICS["SENSOR"].parser is None
+    assert CharacteristicRegistry([FakeService])["FIRST"].parser is None
+
+
+def test_ambiguous_names_need_the_service():
+    registry = CharacteristicRegistry([FakeService, OtherService])
+
+    assert "FIRST" not in registry
+    assert registry["FakeService.FIRST"].uuid == "first"
+    assert registry["OtherService.FIRST"].uuid == "other-first"
+    assert registry["SECOND"].member is FakeService.SECOND
+
+
+def test_records_are_immutable():
+    record = SX3_CHARACTERISTICS["SPEED"]
+    with pytest.raises(AttributeError):
+        record.uuid = "changed"
+    with pytest.raises(AttributeError):
+        record.other = 1
+    with pytest.raises(AttributeError):
+        SX3_CHARACTERISTICS._index = {}
+
+
+def test_lookup_falls_back_for_other_profiles():
+    assert lookup(SX3Profile.Light.LIGHT_MODE) is SX3_CHARACTERISTICS["LIGHT_MODE"]
+
+    record = lookup(FakeService.FIRST)
+    assert record.service_uuid == "service"
+    assert record.encrypted
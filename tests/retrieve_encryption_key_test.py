@@ -0,0 +1,175 @@
+import asyncio
+import base64
+import concurrent.futures
+import http.server
+import json
+import os
+import threading
+import time
+import urllib.parse
+from unittest import mock
+
+import pytest
+
+from pymoof.tools import retrieve_encryption_key
+from pymoof.tools.retrieve_encryption_key import BikeKey
+from pymoof.tools.retrieve_encryption_key import KeyClient
+from pymoof.tools.retrieve_encryption_key import KeyRetrievalError
+
+CUSTOMER_DATA = {
+    "data": {
+        "bikeDetails": [
+            {
+                "name": "Commuter",
+                "frameNumber": "ASY1",
+                "macAddress": "AA:BB",
+                "key": {"encryptionKey": "a" * 32, "userKeyId": 1},
+            },
+            {
+                "name": "Spare",
+                "frameNumber": "ASY2",
+                "key": {"encryptionKey": "b" * 32, "userKeyId": 2},
+            },
+        ],
+    },
+}
+
+
+class VanmoofHandler(http.server.BaseHTTPRequestHandler):
+    # Keep-alive, so pooled connections can be observed
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.server.requests.append(("POST", self.path, self.client_address))
+        assert self.headers["Api-Key"] == retrieve_encryption_key.API_KEY
+        credentials = base64.b64decode(self.headers["Authorization"].split()[1]).decode()
+        if credentials != "user@example.com:secret":
+            self._respond(401, {"error": "Invalid credentials"})
+        else:
+            self._respond(200, {"token": "token"})
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path, self.client_address))
+        path = urllib.parse.urlparse(self.path).path
+        if path != "/getCustomerData" or self.headers["Authorization"] != "Bearer token":
+            self._respond(401, {"error": "Unauthorized"})
+        else:
+            self._respond(200, CUSTOMER_DATA)
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), VanmoofHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "keys.json")
+
+
+def key_client(server, cache_path, **kwargs):
+    api_url = "http://{}:{}".format(*server.server_address)
+    return KeyClient(api_url=api_url, cache_path=cache_path, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_fetch_keys_returns_every_bike(server, cache_path):
+    async with key_client(server, cache_path, ttl=60) as client:
+        bikes = await client.fetch_keys("user@example.com", "secret")
+
+    assert bikes == [
+        BikeKey("Commuter", "ASY1", "AA:BB", "a" * 32, 1),
+        BikeKey("Spare", "ASY2", None, "b" * 32, 2),
+    ]
+    assert [request[:2] for request in server.requests] == [
+        ("POST", "/authenticate"),
+        ("GET", "/getCustomerData?includeBikeDetails="),
+    ]
+    # Both requests went over the same pooled connection
+    assert server.requests[0][2] == server.requests[1][2]
+
+
+@pytest.mark.asyncio
+async def test_fetch_keys_uses_cache(server, cache_path):
+    async with key_client(server, cache_path, ttl=60) as client:
+        bikes = await client.fetch_keys("user@example.com", "secret")
+
+    async with key_client(server, cache_path, ttl=60) as client:
+        assert await client.fetch_keys("user@example.com", "secret") == bikes
+        assert len(server.requests) == 2
+
+        await client.fetch_keys("user@example.com", "secret", refresh=True)
+        assert len(server.requests) == 4
+
+    assert os.stat(cache_path).st_mode & 0o777 == 0o600
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_per_thread(server):
+    threads = []
+
+    def session_factory():
+        import requests
+
+        threads.append(threading.get_ident())
+        return requests.Session()
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        client = key_client(server, None, session_factory=session_factory, executor=executor)
+        async with client:
+            await asyncio.gather(
+                *(client.fetch_keys("user@example.com", "secret") for _ in range(4)),
+            )
+
+    # One session for each thread that sent requests
+    assert 1 <= len(threads) <= 2
+    assert len(set(threads)) == len(threads)
+
+
+@pytest.mark.asyncio
+async def test_cached_keys_expire(server, cache_path):
+    async with key_client(server, cache_path, ttl=60) as client:
+        await client.fetch_keys("user@example.com", "secret")
+        assert client.cached_keys("user@example.com") is not None
+
+        with mock.patch("time.time", return_value=time.time() + 61):
+            assert client.cached_keys("user@example.com") is None
+            await client.fetch_keys("user@example.com", "secret")
+        assert len(server.requests) == 4
+
+        client.forget("user@example.com")
+        assert client.cached_keys("user@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_keys_rejects_bad_credentials(server, cache_path):
+    async with key_client(server, cache_path) as client:
+        with pytest.raises(KeyRetrievalError):
+            await client.fetch_keys("user@example.com", "wrong")
+
+    assert not os.path.exists(cache_path)
+
+
+def test_query(server, monkeypatch):
+    monkeypatch.setattr(retrieve_encryption_key, "API_URL", key_client(server, None).api_url)
+    monkeypatch.setattr("builtins.input", lambda prompt: "user@example.com")
+    monkeypatch.setattr(retrieve_encryption_key.getpass, "getpass", lambda: "secret")
+
+    assert retrieve_encryption_key.query() == ("a" * 32, 1)
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from pymoof.clients.sx3 import LockState
+from pymoof.clients.sx3 import Sound
+from pymoof.clients.sx3 import SX3Client
+from pymoof.profiles.sx3 import SX3Profile
+from pymoof.simulators.sx3 import Simulator
+from pymoof.util.scheduling import Priority
+from pymoof.util.scheduling import PriorityLock
+
+
+@pytest.fixture
+def key():
+    return "00112233445566778899aabbccddeeff"
+
+
+async def hold(lock, priority, order, name):
+    async with lock.hold(priority):
+        order.append(name)
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_priority_lock_orders_waiters():
+    lock = PriorityLock()
+    order = []
+
+    await lock.acquire()
+    tasks = [
+        asyncio.ensure_future(hold(lock, Priority.LOW, order, "low")),
+        asyncio.ensure_future(hold(lock, Priority.NORMAL, order, "normal-1")),
+        asyncio.ensure_future(hold(lock, Priority.HIGH, order, "high")),
+        asyncio.ensure_future(hold(lock, Priority.NORMAL, order, "normal-2")),
+    ]
+    await asyncio.sleep(0)
+    assert lock.waiting == 4
+
+    lock.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["high", "normal-1", "normal-2", "low"]
+    assert not lock.locked()
+
+
+@pytest.mark.asyncio
+async def test_priority_lock_cancelled_waiter():
+    lock = PriorityLock()
+    order = []
+
+    await lock.acquire()
+    cancelled = asyncio.ensure_future(hold(lock, Priority.HIGH, order, "cancelled"))
+    waiting = asyncio.ensure_future(hold(lock, Priority.LOW, order, "waiting"))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    lock.release()
+    await waiting
+
+    assert order == ["waiting"]
+    assert not lock.locked()
+
+    with pytest.raises(RuntimeError):
+        lock.release()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_use_their_own_nonce(key):
+    simulator = Simulator(latency=0.001)
+    bike = simulator.add_bike("bike", key, 3, rotate_nonce=True)
+
+    async with simulator.client("bike") as bleak_client:
+        client = SX3Client(bleak_client, key, 3)
+        await client.authenticate()
+
+        await asyncio.gather(
+            client.set_lock_state(LockState.UNLOCKED),
+            client.play_sound(Sound.BEEP_POSITIVE),
+            client.set_power_level(2),
+            client.set_power_level(3),
+        )
+
+    assert bike.rejected_writes == 0
+    assert len(bike.commands) == 4
+
+
+@pytest.mark.asyncio
+async def test_lock_commands_jump_ahead_of_telemetry(key):
+    simulator = Simulator(latency=0.001)
+    bike = simulator.add_bike("bike", key, 3)
+
+    async with simulator.client("bike") as bleak_client:
+        client = SX3Client(
+            bleak_client,
+            key,
+            3,
+            priorities={SX3Profile.Sound.PLAY_SOUND: Priority.LOW},
+        )
+        await client.authenticate()
+
+        order = []
+
+        async def record(name, coroutine):
+            await coroutine
+            order.append(name)
+
+        await asyncio.gather(
+            record("speed", client.get_speed()),
+            record("sound", client.play_sound(Sound.BEEP_POSITIVE)),
+            record("battery", client.get_battery_level()),
+            record("power", client.set_power_level(1)),
+            record("unlock", client.set_lock_state(LockState.UNLOCKED)),
+        )
+
+    # The first read grabs the idle connection, then the queue drains by priority
+    assert order == ["speed", "unlock", "power", "sound", "battery"]
+    assert bike.lock_state == LockState.UNLOCKED
+
+
+@pytest.mark.asyncio
+async def test_unencrypted_reads_bypass_queue(key):
+    simulator = Simulator()
+    simulator.add_bike("bike", key, 3)
+
+    async with simulator.client("bike") as bleak_client:
+        client = SX3Client(bleak_client, key, 3)
+
+        async with client._command_lock.hold(Priority.HIGH):
+            assert await asyncio.wait_for(client.get_frame_number(), 1) == "ASY1234567"
+
+
+@pytest.mark.asyncio
+async def test_unlock_gets_in_during_snapshot(key):
+    simulator = Simulator(latency=0.001)
+    bike = simulator.add_bike("bike", key, 3)
+
+    async with simulator.client("bike") as bleak_client:
+        client = SX3Client(bleak_client, key, 3)
+        await client.authenticate()
+
+        snapshot = asyncio.ensure_future(client.snapshot())
+        await asyncio.sleep(0)
+        await client.set_lock_state(LockState.UNLOCKED)
+
+        # The unlock went through between two chunks of snapshot reads
+        assert not snapshot.done()
+        assert (await snapshot).complete
+    assert bike.lock_state == LockState.UNLOCKED
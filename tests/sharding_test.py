@@ -0,0 +1,92 @@
+import asyncio
+import operator
+
+import pytest
+import pytest_asyncio
+
+from pymoof.clients.sx3 import LockState
+from pymoof.fleet.sharding import ShardedFleet
+from pymoof.simulators.sx3 import Simulator
+from pymoof.telemetry.log import bike_id
+from pymoof.telemetry.log import unpack_records
+
+KEY = "00112233445566778899aabbccddeeff"
+BIKES = [f"bike-{i}" for i in range(5)]
+
+
+@pytest_asyncio.fixture
+async def fleet():
+    simulator = Simulator(seed=0)
+    for i, address in enumerate(BIKES):
+        bike = simulator.add_bike(address, KEY, 1)
+        bike.battery_level = 50 + i
+        bike.lock_state = LockState.UNLOCKED
+
+    async with ShardedFleet(simulator, workers=2) as fleet:
+        for address in BIKES:
+            fleet.add_bike(address, KEY, 1)
+        yield fleet
+
+
+@pytest.mark.asyncio
+async def test_bikes_are_sharded(fleet):
+    assert [fleet.shard(address) for address in BIKES] == [0, 1, 0, 1, 0]
+    assert await fleet.connect_all() == {address: None for address in BIKES}
+
+    levels = await fleet.run_all(operator.methodcaller("get_battery_level"))
+    assert levels == {address: 50 + i for i, address in enumerate(BIKES)}
+    assert await fleet.run("bike-3", operator.methodcaller("get_lock_state")) == (
+        LockState.UNLOCKED
+    )
+
+
+@pytest.mark.asyncio
+async def test_snapshots_are_sent_to_the_parent(fleet):
+    snapshots = await fleet.run_all(operator.methodcaller("snapshot"))
+
+    assert all(snapshot.complete for snapshot in snapshots.values())
+    assert snapshots["bike-2"]["MOTOR_BATTERY_LEVEL"] == 52
+    assert snapshots["bike-2"]["LOCK_STATE"] == LockState.UNLOCKED
+
+
+@pytest.mark.asyncio
+async def test_errors_are_returned_per_bike(fleet):
+    results = await fleet.run_all(operator.methodcaller("no_such_method"))
+    assert all(isinstance(result, AttributeError) for result in results.values())
+
+    with pytest.raises(AttributeError):
+        await fleet.run("bike-0", operator.methodcaller("no_such_method"))
+
+    with pytest.raises(TypeError):
+        await fleet.run("bike-0", lambda client: client.get_battery_level())
+
+
+@pytest.mark.asyncio
+async def test_telemetry(fleet):
+    records = []
+    fleet.start_telemetry(lambda batch: records.extend(unpack_records(batch)), interval=0.01)
+    while {record.bike for record in records} != {bike_id(address) for address in BIKES}:
+        await asyncio.sleep(0.01)
+    fleet.stop_telemetry()
+
+    record = next(record for record in records if record.bike == bike_id("bike-4"))
+    assert record[2:] == (0.0, 0, 54, LockState.UNLOCKED.value)
+
+
+@pytest.mark.asyncio
+async def test_worker_exit_fails_its_bikes(fleet):
+    fleet._shards[1].process.kill()
+    results = await fleet.run_all(operator.methodcaller("get_battery_level"))
+
+    assert results["bike-0"] == 50
+    assert isinstance(results["bike-1"], RuntimeError)
+
+
+@pytest.mark.asyncio
+async def test_bike_added_during_run_all(fleet):
+    await fleet.connect_all()
+    running = asyncio.ensure_future(fleet.run_all(operator.methodcaller("get_battery_level")))
+    await asyncio.sleep(0)
+    fleet.add_bike("bike-5", KEY, 1)
+
+    assert set(await running) == set(BIKES)
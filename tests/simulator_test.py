@@ -0,0 +1,402 @@
+import asyncio
+import functools
+import itertools
+
+import bleak.exc
+import pytest
+import pytest_asyncio
+
+from pymoof.clients.sx3 import AuthenticationError
+from pymoof.clients.sx3 import BellTone
+from pymoof.clients.sx3 import LockState
+from pymoof.clients.sx3 import SNAPSHOT_CHARACTERISTICS
+from pymoof.clients.sx3 import Sound
+from pymoof.clients.sx3 import SX3Client
+from pymoof.fleet.manager import FleetManager
+from pymoof.profiles.sx3 import SX3Profile
+from pymoof.simulators.sx3 import Simulator
+from pymoof.util.caching import ReadCache
+
+
+@pytest.fixture
+def key():
+    return "00112233445566778899aabbccddeeff"
+
+
+@pytest.fixture
+def simulator():
+    return Simulator(seed=0)
+
+
+@pytest.fixture
+def bike(simulator, key):
+    return simulator.add_bike("bike", key, 3)
+
+
+@pytest_asyncio.fixture
+async def bleak_client(simulator, bike):
+    async with simulator.client("bike") as bleak_client:
+        yield bleak_client
+
+
+@pytest.fixture
+def client(bleak_client, key):
+    return SX3Client(bleak_client, key, 3)
+
+
+@pytest.mark.asyncio
+async def test_unauthenticated(client, bike):
+    assert await client.get_frame_number() == "ASY1234567"
+
+    with pytest.raises(bleak.exc.BleakError):
+        await client.get_lock_state()
+
+    with pytest.raises(bleak.exc.BleakError):
+        await client.set_lock_state(LockState.UNLOCKED)
+
+    assert bike.lock_state == LockState.LOCKED
+
+
+@pytest.mark.asyncio
+async def test_wrong_key_fails_authentication(bleak_client, bike):
+    client = SX3Client(bleak_client, "ff" * 16, 3)
+
+    with pytest.raises(bleak.exc.BleakError):
+        await client.authenticate()
+    assert bike.rejected_writes == 1
+
+
+@pytest.mark.asyncio
+async def test_wrong_key_with_a_valid_lock_state_fails_verification(
+    bleak_client,
+    bike,
+    monkeypatch,
+):
+    # A wrong key that decrypts the lock state to a valid LockState byte followed by garbage
+    payload = bike.profile.encrypt_buffer(bytes([LockState.LOCKED.value]).ljust(16, b"\x00"))
+    candidates = (f"{index:032x}" for index in itertools.count(1))
+    wrong_key = next(
+        candidate
+        for candidate in candidates
+        if SX3Profile(candidate, 3).decrypt_payload(payload)[0] in (0, 1, 2)
+    )
+
+    # A bike that accepts any key index, so only the read after authenticating can catch it
+    write = bike.write
+
+    def accept_any_key(client, uuid, data):
+        if uuid == SX3Profile.Security.KEY_INDEX.value:
+            client.authenticated = True
+            return
+        write(client, uuid, data)
+
+    monkeypatch.setattr(bike, "write", accept_any_key)
+    client = SX3Client(bleak_client, wrong_key, 3)
+
+    with pytest.raises(AuthenticationError):
+        await client.authenticate()
+    assert not client.authenticated
+
+    with pytest.raises(AuthenticationError):
+        await client.authenticate(force=True)
+    assert not client.authenticated
+
+
+@pytest.mark.asyncio
+async def test_authentication_is_remembered(client, bike, bleak_client):
+    bleak_client.set_disconnected_callback(client.handle_disconnect)
+    await client.authenticate()
+    requests = bleak_client.requests
+    await client.authenticate()
+    assert bleak_client.requests == requests
+
+    # After the link resets, the next command authenticates again by itself
+    bike.drop_connection()
+    await bleak_client.connect()
+    assert not client.authenticated
+    await client.set_lock_state(LockState.UNLOCKED)
+
+    assert client.authenticated
+    assert bike.lock_state == LockState.UNLOCKED
+
+
+@pytest.mark.asyncio
+async def test_authenticated_reads_and_writes(client, bike):
+    bike.battery_level = 87
+    bike.speed = 23
+    bike.distance = 1234.5
+
+    await client.authenticate()
+
+    assert await client.get_battery_level() == 87
+    assert await client.get_speed() == 23
+    assert await client.get_distance_travelled() == 1234.5
+    assert await client.get_lock_state() == LockState.LOCKED
+
+    await client.set_lock_state(LockState.UNLOCKED)
+    await client.play_sound(Sound.BEEP_POSITIVE, 2)
+
+    assert bike.lock_state == LockState.UNLOCKED
+    assert await client.get_lock_state() == LockState.UNLOCKED
+    assert bike.commands[-1][0] == SX3Profile.Sound.PLAY_SOUND.value
+    assert bike.commands[-1][1][:2] == bytes([Sound.BEEP_POSITIVE.value, 2])
+
+
+@pytest.mark.asyncio
+async def test_settings_are_decoded(client, bike):
+    bike.set_value(SX3Profile.Movement.POWER_LEVEL, [3, 1])
+    bike.set_value(SX3Profile.Sound.SOUND_VOLUME, [7])
+    bike.set_value(SX3Profile.Light.LIGHT_MODE, [2])
+    # The light mode used to be read from the speed characteristic
+    bike.speed = 25
+
+    await client.authenticate()
+
+    assert await client.get_power_level() == 3
+    assert await client.get_sound_volume() == 7
+    assert await client.get_light_mode() == 2
+
+
+@pytest.mark.asyncio
+async def test_snapshot(client, bike):
+    bike.battery_level = 87
+    bike.speed = 23
+    bike.distance = 1234.5
+    bike.set_value(SX3Profile.Sound.BELL_SOUND, [BellTone.BELL.value])
+
+    await client.authenticate()
+    snapshot = await client.snapshot()
+
+    assert snapshot.complete
+    assert set(snapshot.values) == set(SNAPSHOT_CHARACTERISTICS)
+    assert snapshot["MOTOR_BATTERY_LEVEL"] == 87
+    assert snapshot[SX3Profile.Movement.SPEED] == 23
+    assert snapshot["DISTANCE"] == 1234.5
+    assert snapshot["LOCK_STATE"] == LockState.LOCKED
+    assert snapshot["FRAME_NUMBER"] == "ASY1234567"
+    assert snapshot.as_dict()["BELL_SOUND"] == BellTone.BELL
+
+    with pytest.raises(AttributeError):
+        snapshot.timestamp = 0
+
+
+@pytest.mark.asyncio
+async def test_snapshot_partial_results(client, bike):
+    bike.set_value(SX3Profile.Movement.SPEED, [5])
+    snapshot = await client.snapshot([SX3Profile.BikeInfo.FRAME_NUMBER, SX3Profile.Movement.SPEED])
+
+    # Not authenticated, so only the plaintext frame number can be read
+    assert not snapshot.complete
+    assert snapshot["FRAME_NUMBER"] == "ASY1234567"
+    assert "SPEED" not in snapshot
+    assert snapshot.get("SPEED") is None
+    assert isinstance(snapshot.errors[SX3Profile.Movement.SPEED], bleak.exc.BleakError)
+
+    await client.authenticate()
+    snapshot = await client.snapshot([SX3Profile.Sound.BELL_SOUND, SX3Profile.Movement.SPEED])
+
+    # Zero is not a known bell tone, so it is returned as an integer
+    assert snapshot.complete
+    assert snapshot["BELL_SOUND"] == 0
+    assert snapshot["SPEED"] == 5
+
+
+@pytest.mark.asyncio
+async def test_pipelined_writes_are_confirmed(client, bike, bleak_client):
+    await client.authenticate()
+    requests = bleak_client.requests
+
+    await client.batch(
+        [
+            functools.partial(client.set_bell_tone, BellTone.PARTY, response=False),
+            functools.partial(client.play_sound, Sound.BEEP_POSITIVE, response=False),
+        ],
+    )
+    # One nonce read, then both writes without waiting on the bike
+    assert bleak_client.requests - requests == 3
+    # Still in flight
+    assert bike.commands == []
+
+    assert await client.confirm({SX3Profile.Sound.BELL_SOUND: BellTone.PARTY}) == {}
+    assert len(bike.commands) == 2
+
+
+@pytest.mark.asyncio
+async def test_confirm_reports_lost_writes(simulator, key):
+    bike = simulator.add_bike("rotating", key, 3, rotate_nonce=True)
+    bike.set_value(SX3Profile.Sound.BELL_SOUND, [BellTone.BELL.value])
+    async with simulator.client("rotating") as bleak_client:
+        client = SX3Client(bleak_client, key, 3)
+        await client.authenticate()
+
+        # The second write reuses the nonce the first one rotated, so the bike drops it
+        await client.batch(
+            [
+                functools.partial(client.play_sound, Sound.BEEP_POSITIVE, response=False),
+                functools.partial(client.set_bell_tone, BellTone.PARTY, response=False),
+            ],
+        )
+
+        expected = {SX3Profile.Sound.BELL_SOUND: BellTone.PARTY}
+        assert await client.confirm(expected) == {SX3Profile.Sound.BELL_SOUND: BellTone.BELL}
+        assert bike.rejected_writes == 1
+
+        await client.set_bell_tone(BellTone.PARTY)
+        assert await client.confirm(expected) == {}
+
+
+@pytest.mark.asyncio
+async def test_confirm_forgets_stale_nonce(simulator, key):
+    bike = simulator.add_bike("rotating", key, 3, rotate_nonce=True)
+    bike.set_value(SX3Profile.Sound.BELL_SOUND, [BellTone.BELL.value])
+    async with simulator.client("rotating") as bleak_client:
+        client = SX3Client(bleak_client, key, 3)
+        await client.authenticate()
+        expected = {SX3Profile.Sound.BELL_SOUND: BellTone.PARTY}
+        set_bell_tone = functools.partial(client.set_bell_tone, BellTone.PARTY, response=False)
+
+        results = await client.batch(
+            [
+                functools.partial(client.play_sound, Sound.BEEP_POSITIVE, response=False),
+                set_bell_tone,
+                functools.partial(client.confirm, expected),
+                # Signed with a fresh nonce, as confirm found the shared one stale
+                set_bell_tone,
+            ],
+        )
+
+        assert results[2] == {SX3Profile.Sound.BELL_SOUND: BellTone.BELL}
+        assert await client.confirm(expected) == {}
+        assert bike.rejected_writes == 1
+
+
+@pytest.mark.asyncio
+async def test_read_cache(bleak_client, key, bike):
+    cache = ReadCache()
+    client = SX3Client(bleak_client, key, 3, cache=cache)
+    await client.authenticate()
+    bike.set_value(SX3Profile.Sound.BELL_SOUND, [BellTone.BELL.value])
+
+    requests = bleak_client.requests
+    assert await client.get_frame_number() == "ASY1234567"
+    assert await client.get_frame_number() == "ASY1234567"
+    snapshot = await client.snapshot([SX3Profile.BikeInfo.FRAME_NUMBER, SX3Profile.Movement.SPEED])
+    assert snapshot.complete
+    # Only the first frame number read and the speed went over the air
+    assert bleak_client.requests - requests == 2
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    # Writes drop the cached value of the written characteristic
+    assert (await client.snapshot([SX3Profile.Sound.BELL_SOUND]))["BELL_SOUND"] == BellTone.BELL
+    await client.set_bell_tone(BellTone.PARTY)
+    assert (await client.snapshot([SX3Profile.Sound.BELL_SOUND]))["BELL_SOUND"] == BellTone.PARTY
+
+    # So do reconnects
+    client.handle_disconnect()
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_fleet_shares_read_cache(key):
+    simulator = Simulator()
+    for i in range(3):
+        simulator.add_bike(f"bike-{i}", key, 3, frame_number=f"ASY{i}")
+
+    cache = ReadCache()
+    async with FleetManager(simulator, client_options={"cache": cache}) as fleet:
+        for address in simulator.bikes:
+            fleet.add_bike(address, key, 3)
+
+        for _ in range(2):
+            frame_numbers = await fleet.run_all(lambda client: client.get_frame_number())
+            assert frame_numbers == {f"bike-{i}": f"ASY{i}" for i in range(3)}
+
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+@pytest.mark.asyncio
+async def test_stale_nonce_is_rejected(simulator, key):
+    simulator.add_bike("rotating", key, 3, rotate_nonce=True)
+
+    async with simulator.client("rotating") as bleak_client:
+        client = SX3Client(bleak_client, key, 3, nonce_ttl=60)
+        await client.authenticate()
+
+        await client.set_lock_state(LockState.UNLOCKED)
+        # The cached nonce is stale now, session mode retries with a fresh one
+        await client.set_lock_state(LockState.LOCKED)
+
+        bike = simulator.bikes["rotating"]
+        assert bike.rejected_writes == 1
+        assert bike.lock_state == LockState.LOCKED
+
+
+@pytest.mark.asyncio
+async def test_notifications(client, bike):
+    await client.authenticate()
+
+    async with client.subscribe([SX3Profile.Movement.SPEED]) as notifications:
+        bike.speed = 12
+        bike.speed = 15
+
+        assert (await notifications.__anext__()).value == 12
+        assert (await notifications.__anext__()).value == 15
+
+
+@pytest.mark.asyncio
+async def test_latency_and_loss(key):
+    simulator = Simulator(latency=0.01, loss=1.0)
+    simulator.add_bike("bike", key, 3)
+
+    bleak_client = simulator.client("bike", loss=0.0)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await bleak_client.connect()
+    assert loop.time() - start >= 0.01
+
+    lossy = simulator.client("bike")
+    with pytest.raises(bleak.exc.BleakError):
+        await lossy.connect()
+
+    await bleak_client.disconnect()
+    with pytest.raises(bleak.exc.BleakError):
+        await bleak_client.read_gatt_char(SX3Profile.Security.CHALLENGE.value)
+
+    with pytest.raises(bleak.exc.BleakError):
+        simulator.client("unknown")
+
+
+@pytest.mark.asyncio
+async def test_single_central(simulator, bike, bleak_client):
+    with pytest.raises(bleak.exc.BleakError):
+        await simulator.client("bike").connect()
+
+
+@pytest.mark.asyncio
+async def test_drop_connection(bike, bleak_client):
+    dropped = []
+    bleak_client.set_disconnected_callback(dropped.append)
+
+    bike.drop_connection()
+
+    assert dropped == [bleak_client]
+    assert not bleak_client.is_connected
+    assert bike.client is None
+
+
+@pytest.mark.asyncio
+async def test_fleet_against_simulator(key):
+    simulator = Simulator(latency=0.001, seed=1)
+    for i in range(20):
+        simulator.add_bike(f"bike-{i}", key, 3).battery_level = i
+
+    async with FleetManager(simulator, max_concurrency=5) as fleet:
+        for address in simulator.bikes:
+            fleet.add_bike(address, key, 3)
+
+        levels = await fleet.run_all(lambda client: client.get_battery_level())
+        assert levels == {f"bike-{i}": i for i in range(20)}
+
+        simulator.bikes["bike-3"].drop_connection()
+        await fleet.run("bike-3", lambda client: client.set_lock_state(LockState.UNLOCKED))
+        assert simulator.bikes["bike-3"].lock_state == LockState.UNLOCKED
@@ -0,0 +1,104 @@
+import math
+import pickle
+
+import pytest
+from cryptography.hazmat.primitives.ciphers import algorithms
+from cryptography.hazmat.primitives.ciphers import Cipher
+from cryptography.hazmat.primitives.ciphers import modes
+
+from pymoof.profiles.sx3 import SX3Profile
+
+
+@pytest.fixture
+def key():
+    return "0123456789abcdef" * 2
+
+
+@pytest.fixture
+def cipher(key):
+    return Cipher(algorithms.AES(bytes.fromhex(key)), modes.ECB())
+
+
+@pytest.fixture
+def profile(key):
+    return SX3Profile(key, 7)
+
+
+def encrypt(cipher, data):
+    encryptor = cipher.encryptor()
+    return encryptor.update(data) + encryptor.finalize()
+
+
+def test_build_authentication_payload(profile, cipher):
+    for nonce in (b"\x00\x01", b"\xff\xfe"):
+        payload = profile.build_authentication_payload(nonce)
+        assert payload == encrypt(cipher, nonce + bytes(14)) + b"\x00\x00\x00\x07"
+
+
+@pytest.mark.parametrize("length", [0, 1, 13, 14, 15, 30, 40])
+def test_build_encrypted_payload(profile, cipher, length):
+    data = bytes(range(1, length + 1))
+    expected_size = math.ceil((2 + length) / 16) * 16
+    plaintext = (b"\xab\xcd" + data).ljust(expected_size, b"\x00")
+
+    # Run twice to make sure reused buffers are fully overwritten
+    profile.build_encrypted_payload(b"\xff\xff", bytes([0xFF] * 40))
+    assert profile.build_encrypted_payload(b"\xab\xcd", data) == encrypt(cipher, plaintext)
+    assert profile.build_encrypted_payload(b"\xab\xcd", list(data)) == encrypt(cipher, plaintext)
+
+
+def test_decrypt_payload(profile, cipher):
+    plaintext = bytes(range(48))
+    ciphertext = encrypt(cipher, plaintext)
+
+    assert profile.decrypt_payload(ciphertext) == plaintext
+    assert profile.decrypt_payload(bytearray(ciphertext[:16])) == plaintext[:16]
+    assert profile.decrypt_payload(memoryview(ciphertext)[16:32]) == plaintext[16:32]
+
+
+def test_decrypt_payload_rejects_partial_blocks(profile, cipher):
+    with pytest.raises(ValueError):
+        profile.decrypt_payload(b"a" * 17)
+
+    # A rejected payload must not corrupt later calls
+    plaintext = bytes(range(16))
+    assert profile.decrypt_payload(encrypt(cipher, plaintext)) == plaintext
+
+
+def test_decrypt_buffer(profile, cipher):
+    plaintext = bytes(range(256)) * 4
+    result = profile.decrypt_buffer(encrypt(cipher, plaintext))
+
+    assert isinstance(result, memoryview)
+    assert result == plaintext
+    assert result.cast("B", (len(plaintext) // 16, 16))[3, 5] == plaintext[3 * 16 + 5]
+
+    with pytest.raises(ValueError):
+        profile.decrypt_buffer(b"a" * 15)
+
+
+def test_encrypt_buffer(profile, cipher):
+    plaintext = bytes(range(64))
+    assert profile.encrypt_buffer(plaintext) == encrypt(cipher, plaintext)
+    assert profile.decrypt_buffer(profile.encrypt_buffer(plaintext)) == plaintext
+
+
+def test_decrypt_payloads(profile, cipher):
+    plaintexts = [bytes([i]) * 16 * (i % 3 + 1) for i in range(10)]
+    results = profile.decrypt_payloads(encrypt(cipher, p) for p in plaintexts)
+
+    assert [bytes(result) for result in results] == plaintexts
+    assert profile.decrypt_payloads([]) == []
+
+    with pytest.raises(ValueError):
+        profile.decrypt_payloads([b"a" * 16, b"a" * 15, b"a"])
+
+
+def test_pickle(profile, cipher):
+    unpickled = pickle.loads(pickle.dumps(profile))
+    ciphertext = encrypt(cipher, bytes(range(32)))
+
+    assert unpickled.decrypt_payload(ciphertext) == profile.decrypt_payload(ciphertext)
+    assert unpickled.build_authentication_payload(b"\xab\xcd") == (
+        profile.build_authentication_payload(b"\xab\xcd")
+    )
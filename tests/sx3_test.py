@@ -1,11 +1,20 @@
+import asyncio
+import functools
 from unittest import mock
 
+import bleak.exc
 import pytest
+from cryptography.hazmat.primitives.ciphers import algorithms
+from cryptography.hazmat.primitives.ciphers import Cipher
+from cryptography.hazmat.primitives.ciphers import modes
 
+from pymoof.clients.sx3 import AuthenticationError
 from pymoof.clients.sx3 import BellTone
+from pymoof.clients.sx3 import IDEMPOTENT_WRITES
 from pymoof.clients.sx3 import LockState
 from pymoof.clients.sx3 import Sound
 from pymoof.clients.sx3 import SX3Client
+from pymoof.profiles.sx3 import SX3Profile
 
 
 @pytest.fixture
@@ -42,10 +51,79 @@ def client(bleak_client, key, user_key_id):
     return SX3Client(bleak_client, key, user_key_id)
 
 
+@pytest.fixture
+def lock_state(key):
+    # Read back by authenticate to verify the session
+    return encrypt(key, bytes([LockState.LOCKED.value]))
+
+
 @pytest.mark.asyncio
-async def test_authenticate(bleak_client, client, services, service):
-    bleak_client.read_gatt_char.return_value = b"ab"
+async def test_authenticate(bleak_client, client, lock_state):
+    bleak_client.read_gatt_char.side_effect = [b"ab", lock_state]
     await client.authenticate()
+    assert client.authenticated
+
+    # Already authenticated, nothing is sent
+    await client.authenticate()
+    assert bleak_client.read_gatt_char.call_count == 2
+    assert bleak_client.write_gatt_char.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_authenticate_detects_wrong_key(bleak_client, client):
+    wrong_key = encrypt("b" * 32, bytes([LockState.LOCKED.value]))
+    bleak_client.read_gatt_char.side_effect = [b"ab", wrong_key]
+
+    with pytest.raises(AuthenticationError):
+        await client.authenticate()
+    assert not client.authenticated
+
+
+@pytest.mark.asyncio
+async def test_unknown_lock_state_is_returned_as_integer(bleak_client, client, key):
+    bleak_client.read_gatt_char.return_value = encrypt(key, b"\x42")
+
+    assert await client.get_lock_state() == 0x42
+    # A value that fails to decode is not mistaken for a lost session
+    assert bleak_client.write_gatt_char.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_malformed_payload_reauthenticates(bleak_client, client, key, lock_state):
+    unlocked = encrypt(key, bytes([LockState.UNLOCKED.value]))
+    bleak_client.read_gatt_char.side_effect = [
+        b"ab",
+        lock_state,
+        b"\x01\x02\x03",
+        b"ab",
+        lock_state,
+        unlocked,
+    ]
+    await client.authenticate()
+
+    assert await client.get_lock_state() == LockState.UNLOCKED
+    assert bleak_client.write_gatt_char.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_snapshot_reauthenticates(bleak_client, client, key, lock_state):
+    characteristics = [SX3Profile.Defense.LOCK_STATE, SX3Profile.BikeInfo.MOTOR_BATTERY_LEVEL]
+    bleak_client.read_gatt_char.side_effect = [
+        b"ab",
+        lock_state,
+        b"\x01\x02\x03",
+        encrypt(key, b"\x32"),
+        b"ab",
+        lock_state,
+        lock_state,
+    ]
+    await client.authenticate()
+
+    snapshot = await client.snapshot(characteristics)
+    assert snapshot.complete
+    assert snapshot["LOCK_STATE"] == LockState.LOCKED
+    assert snapshot["MOTOR_BATTERY_LEVEL"] == 0x32
+    assert bleak_client.write_gatt_char.call_count == 2
 
 
 # Smoke tests
@@ -108,3 +186,246 @@ async def test_sound_volume(bleak_client, client):
 async def test_get_speed(bleak_client, client):
     bleak_client.read_gatt_char.return_value = b"a" * 32
     await client.get_speed()
+
+
+@pytest.mark.asyncio
+async def test_characteristics_resolved_once(bleak_client, client, lock_state):
+    bleak_client.read_gatt_char.side_effect = [b"ab", lock_state, b"ab"]
+    await client.authenticate()
+    await client.set_lock_state(LockState.LOCKED)
+
+    bleak_client.get_services.assert_called_once_with()
+
+
+@pytest.mark.asyncio
+async def test_handle_disconnect_invalidates_characteristics(
+    bleak_client,
+    client,
+    lock_state,
+):
+    bleak_client.read_gatt_char.side_effect = [b"ab", lock_state] * 2
+    await client.authenticate()
+    client.handle_disconnect(bleak_client)
+    assert not client.authenticated
+    await client.authenticate()
+
+    assert bleak_client.get_services.call_count == 2
+
+
+@pytest.fixture
+def session_client(bleak_client, key, user_key_id):
+    return SX3Client(bleak_client, key, user_key_id, nonce_ttl=60)
+
+
+@pytest.mark.asyncio
+async def test_writes_read_nonce_every_time_by_default(bleak_client, client):
+    bleak_client.read_gatt_char.return_value = b"ab"
+    await client.set_lock_state(LockState.LOCKED)
+    await client.play_sound(Sound.BEEP_POSITIVE)
+
+    assert bleak_client.read_gatt_char.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_session_mode_reuses_nonce(bleak_client, session_client):
+    bleak_client.read_gatt_char.return_value = b"ab"
+    await session_client.set_lock_state(LockState.LOCKED)
+    await session_client.play_sound(Sound.BEEP_POSITIVE)
+    await session_client.set_power_level(2)
+
+    assert bleak_client.read_gatt_char.call_count == 1
+    assert bleak_client.write_gatt_char.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_session_mode_nonce_expires(bleak_client, key, user_key_id):
+    client = SX3Client(bleak_client, key, user_key_id, nonce_ttl=0)
+    bleak_client.read_gatt_char.return_value = b"ab"
+    await client.set_lock_state(LockState.LOCKED)
+    await client.set_lock_state(LockState.UNLOCKED)
+
+    assert bleak_client.read_gatt_char.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_session_mode_retries_rejected_nonce(bleak_client, session_client):
+    bleak_client.read_gatt_char.return_value = b"ab"
+    await session_client.set_lock_state(LockState.LOCKED)
+
+    bleak_client.write_gatt_char.side_effect = [bleak.exc.BleakError(), None]
+    await session_client.set_lock_state(LockState.UNLOCKED)
+
+    assert bleak_client.read_gatt_char.call_count == 2
+    assert bleak_client.write_gatt_char.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_session_mode_raises_with_fresh_nonce(bleak_client, session_client):
+    bleak_client.read_gatt_char.return_value = b"ab"
+    bleak_client.write_gatt_char.side_effect = bleak.exc.BleakError()
+
+    with pytest.raises(bleak.exc.BleakError):
+        await session_client.set_lock_state(LockState.UNLOCKED)
+
+    assert bleak_client.write_gatt_char.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_write_without_response(bleak_client, key, user_key_id):
+    client = SX3Client(bleak_client, key, user_key_id, write_without_response=IDEMPOTENT_WRITES)
+    bleak_client.read_gatt_char.return_value = b"ab"
+
+    await client.play_sound(Sound.BEEP_POSITIVE)
+    await client.set_bell_tone(BellTone.BELL, response=True)
+    await client.set_lock_state(LockState.LOCKED)
+
+    responses = [call.kwargs["response"] for call in bleak_client.write_gatt_char.call_args_list]
+    assert responses == [False, True, True]
+
+
+@pytest.mark.asyncio
+async def test_write_without_response_does_not_use_session_nonce(bleak_client, session_client):
+    bleak_client.read_gatt_char.return_value = b"ab"
+    await session_client.set_lock_state(LockState.LOCKED)
+    await session_client.play_sound(Sound.BEEP_POSITIVE, response=False)
+    await session_client.play_sound(Sound.BEEP_POSITIVE, response=False)
+    await session_client.set_power_level(2)
+
+    # Both writes without response read their own nonce, the others share one
+    assert bleak_client.read_gatt_char.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_batch(bleak_client, client):
+    bleak_client.read_gatt_char.return_value = b"\x01" + b"\x00" * 15
+
+    results = await client.batch(
+        [
+            functools.partial(client.set_lock_state, LockState.LOCKED),
+            client.get_frame_number,
+            functools.partial(client.play_sound, Sound.BEEP_POSITIVE),
+            functools.partial(client.set_power_level, 1),
+        ],
+    )
+
+    assert results[0] is None
+    assert isinstance(results[1], str)
+    # One nonce read shared by all three writes plus the frame number read
+    assert bleak_client.read_gatt_char.call_count == 2
+    assert bleak_client.write_gatt_char.call_count == 3
+    bleak_client.get_services.assert_called_once_with()
+
+
+@pytest.mark.asyncio
+async def test_batch_does_not_leak_nonce(bleak_client, client):
+    bleak_client.read_gatt_char.return_value = b"ab"
+    await client.batch([functools.partial(client.set_lock_state, LockState.LOCKED)])
+    await client.set_lock_state(LockState.UNLOCKED)
+
+    assert bleak_client.read_gatt_char.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_nonce_is_not_shared_with_other_tasks(bleak_client, client):
+    nonces = iter([b"n1", b"n2", b"n3"])
+    bleak_client.read_gatt_char.side_effect = lambda *args, **kwargs: next(nonces)
+    written = asyncio.Event()
+
+    async def write_twice():
+        await client.set_lock_state(LockState.LOCKED)
+        written.set()
+        await asyncio.sleep(0)
+        await client.set_power_level(1)
+
+    async def write_elsewhere():
+        await written.wait()
+        await client.play_sound(Sound.BEEP_POSITIVE)
+
+    await asyncio.gather(client.batch([write_twice]), write_elsewhere())
+
+    # The batch reads one nonce for both writes, the other task reads its own
+    assert bleak_client.read_gatt_char.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_return_exceptions(bleak_client, client):
+    bleak_client.read_gatt_char.return_value = b"ab"
+    bleak_client.write_gatt_char.side_effect = bleak.exc.BleakError()
+
+    results = await client.batch(
+        [functools.partial(client.set_lock_state, LockState.LOCKED)],
+        return_exceptions=True,
+    )
+    assert isinstance(results[0], bleak.exc.BleakError)
+
+    with pytest.raises(bleak.exc.BleakError):
+        await client.batch([functools.partial(client.set_lock_state, LockState.LOCKED)])
+
+
+def encrypt(key, data):
+    encryptor = Cipher(algorithms.AES(bytes.fromhex(key)), modes.ECB()).encryptor()
+    return encryptor.update(data.ljust(16, b"\x00")) + encryptor.finalize()
+
+
+@pytest.mark.asyncio
+async def test_subscribe(bleak_client, client, key):
+    characteristics = [SX3Profile.Movement.SPEED, SX3Profile.Defense.LOCK_STATE]
+
+    async with client.subscribe(characteristics) as notifications:
+        assert bleak_client.start_notify.call_count == 2
+        speed_handler = bleak_client.start_notify.call_args_list[0][0][1]
+        lock_handler = bleak_client.start_notify.call_args_list[1][0][1]
+
+        speed_handler(1, bytearray(encrypt(key, b"\x19")))
+        lock_handler(2, bytearray(encrypt(key, b"\x01")))
+
+        speed = await notifications.__anext__()
+        assert speed.characteristic == SX3Profile.Movement.SPEED
+        assert speed.value == 25
+
+        lock_state = await notifications.__anext__()
+        assert lock_state.value == LockState.LOCKED
+
+    assert bleak_client.stop_notify.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_subscribe_stops_started_notifications_on_failure(bleak_client, client):
+    characteristics = [SX3Profile.Movement.SPEED, SX3Profile.Defense.LOCK_STATE]
+    bleak_client.start_notify.side_effect = [None, bleak.exc.BleakError("Notify failed")]
+
+    with pytest.raises(bleak.exc.BleakError):
+        async with client.subscribe(characteristics):
+            pass
+
+    speed = bleak_client.start_notify.call_args_list[0][0][0]
+    bleak_client.stop_notify.assert_called_once_with(speed)
+
+
+@pytest.mark.asyncio
+async def test_subscribe_drops_oldest_when_full(bleak_client, client, key):
+    subscription = client.subscribe([SX3Profile.Movement.SPEED], max_queue_size=2)
+    await subscription.start()
+    handler = bleak_client.start_notify.call_args[0][1]
+
+    for speed in (b"\x01", b"\x02", b"\x03"):
+        handler(1, bytearray(encrypt(key, speed)))
+
+    assert subscription.dropped == 1
+    assert (await subscription.__anext__()).value == 2
+    assert (await subscription.__anext__()).value == 3
+    await subscription.stop()
+
+
+@pytest.mark.asyncio
+async def test_subscribe_callback(bleak_client, client, key):
+    received = []
+    subscription = client.subscribe(
+        [SX3Profile.Sound.SOUND_VOLUME],
+        callback=received.append,
+    )
+    await subscription.start()
+    handler = bleak_client.start_notify.call_args[0][1]
+    handler(1, bytearray(encrypt(key, b"\x05")))
+
+    assert received[0].value == 5
@@ -0,0 +1,247 @@
+import asyncio
+import os
+from unittest import mock
+
+import pytest
+import pytest_asyncio
+
+from pymoof.clients.sx3 import LockState
+from pymoof.clients.sx3 import SX3Client
+from pymoof.simulators.sx3 import Simulator
+from pymoof.telemetry import log
+from pymoof.telemetry.log import bike_id
+from pymoof.telemetry.log import Record
+from pymoof.telemetry.log import TelemetryLog
+from pymoof.telemetry.log import TelemetryWriter
+from pymoof.telemetry.recorder import TelemetryRecorder
+
+KEY = "00112233445566778899aabbccddeeff"
+
+
+def test_roundtrip(tmp_path):
+    with TelemetryWriter(str(tmp_path)) as writer:
+        writer.append(1.5, 7, distance=12.3, speed=25, battery=80, lock_state=LockState.LOCKED)
+        writer.append(2.5, 7, speed=26)
+        path = writer.path
+
+    assert os.path.getsize(path) == log.HEADER_SIZE + 2 * log.RECORD.size
+    with TelemetryLog(path) as telemetry:
+        assert len(telemetry) == 2
+        assert list(telemetry) == [
+            Record(1.5, 7, 12.3, 25, 80, LockState.LOCKED.value),
+            Record(2.5, 7, None, 26, None, None),
+        ]
+
+
+def test_to_numpy(tmp_path):
+    numpy = pytest.importorskip("numpy")
+
+    with TelemetryWriter(str(tmp_path)) as writer:
+        for i in range(100):
+            writer.append(float(i), bike_id("bike"), distance=i / 10, speed=i, battery=50)
+        path = writer.path
+
+    with TelemetryLog(path) as telemetry:
+        records = telemetry.to_numpy()
+        assert records.dtype.itemsize == log.RECORD.size
+        assert numpy.array_equal(records["speed"], numpy.arange(100))
+        assert records["distance"][42] == 42
+        assert (records["missing"] == log.MISSING["lock_state"]).all()
+        assert not records.flags.owndata
+        del records
+
+
+def test_close_while_records_are_in_use(tmp_path):
+    numpy = pytest.importorskip("numpy")
+
+    with TelemetryWriter(str(tmp_path)) as writer:
+        for i in range(10):
+            writer.append(float(i), 1, speed=i)
+        path = writer.path
+
+    telemetry = TelemetryLog(path)
+    records = iter(telemetry)
+    assert next(records).speed == 0
+    array = telemetry.to_numpy()
+    telemetry.close()
+
+    # Both keep the file mapped until they are released
+    assert [record.speed for record in records] == list(range(1, 10))
+    assert numpy.array_equal(array["speed"], numpy.arange(10))
+    with pytest.raises(ValueError):
+        len(telemetry)
+    telemetry.close()
+
+
+def test_rotation(tmp_path):
+    max_bytes = log.HEADER_SIZE + 10 * log.RECORD.size
+    with TelemetryWriter(str(tmp_path), max_bytes=max_bytes) as writer:
+        for i in range(25):
+            writer.append(float(i), 1, speed=i)
+
+    paths = log.log_files(str(tmp_path))
+    assert [os.path.basename(path) for path in paths] == [
+        "telemetry-000000.bin",
+        "telemetry-000001.bin",
+        "telemetry-000002.bin",
+    ]
+    assert [record.speed for record in log.read_directory(str(tmp_path))] == list(range(25))
+
+    # A new writer continues the last file
+    with TelemetryWriter(str(tmp_path), max_bytes=max_bytes) as writer:
+        writer.append(25.0, 1, speed=25)
+        assert writer.path == paths[-1]
+
+
+def test_partial_record_is_ignored(tmp_path):
+    with TelemetryWriter(str(tmp_path)) as writer:
+        writer.append(1.0, 1, speed=1)
+        path = writer.path
+
+    with open(path, "ab") as f:
+        f.write(b"\x01" * 10)
+
+    with TelemetryLog(path) as telemetry:
+        assert [record.speed for record in telemetry] == [1]
+
+    with TelemetryWriter(str(tmp_path)) as writer:
+        writer.append(2.0, 1, speed=2)
+
+    with TelemetryLog(path) as telemetry:
+        assert [record.speed for record in telemetry] == [1, 2]
+
+
+def test_invalid_file(tmp_path):
+    path = tmp_path / "telemetry-000000.bin"
+    path.write_bytes(b"not a telemetry log")
+
+    with pytest.raises(ValueError):
+        TelemetryLog(str(path))
+
+
+def test_fsync_interval(tmp_path):
+    with mock.patch("os.fsync") as fsync, mock.patch("time.monotonic", return_value=0.0) as now:
+        writer = TelemetryWriter(str(tmp_path), fsync_interval=1.0)
+        writer.append(1.0, 1)
+        writer.append(2.0, 1)
+        assert fsync.call_count == 0
+        assert os.path.getsize(writer.path) == log.HEADER_SIZE
+
+        now.return_value = 1.0
+        writer.append(3.0, 1)
+        assert fsync.call_count == 1
+        assert os.path.getsize(writer.path) == log.HEADER_SIZE + 3 * log.RECORD.size
+
+        writer.close()
+        assert fsync.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_autosync(tmp_path):
+    max_bytes = log.HEADER_SIZE + 10 * log.RECORD.size
+    with mock.patch("os.fsync") as fsync:
+        with TelemetryWriter(str(tmp_path), max_bytes=max_bytes, fsync_interval=0.01) as writer:
+            autosync = asyncio.ensure_future(writer.autosync())
+            await asyncio.sleep(0)
+            for i in range(15):
+                writer.append(float(i), 1, speed=i)
+            # Only buffered, rotating did not sync either
+            assert fsync.call_count == 0
+
+            while fsync.call_count < 2:
+                await asyncio.sleep(0.01)
+            autosync.cancel()
+            assert os.path.getsize(writer.path) == log.HEADER_SIZE + 5 * log.RECORD.size
+
+    assert [record.speed for record in log.read_directory(str(tmp_path))] == list(range(15))
+
+
+@pytest.fixture
+def simulator():
+    simulator = Simulator(seed=0)
+    for address in ("bike-1", "bike-2"):
+        bike = simulator.add_bike(address, KEY, 3)
+        bike.speed = 20
+        bike.distance = 123.4
+        bike.battery_level = 90
+        bike.lock_state = LockState.UNLOCKED
+    return simulator
+
+
+@pytest_asyncio.fixture
+async def clients(simulator):
+    clients = {}
+    for address in simulator.bikes:
+        bleak_client = simulator.client(address)
+        await bleak_client.connect()
+        clients[address] = SX3Client(bleak_client, KEY, 3)
+        await clients[address].authenticate()
+    yield clients
+    for client in clients.values():
+        await client._gatt_client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_recorder_samples_every_bike(tmp_path, simulator, clients):
+    with TelemetryWriter(str(tmp_path)) as writer:
+        recorder = TelemetryRecorder(writer, interval=0.01)
+        for address, client in clients.items():
+            recorder.add(address, client)
+
+        assert await recorder.sample() == 2
+        simulator.bikes["bike-2"].drop_connection()
+        assert await recorder.sample() == 2
+
+    records = list(log.read_directory(str(tmp_path)))
+    assert {record.bike for record in records[:2]} == {bike_id("bike-1"), bike_id("bike-2")}
+    assert records[0][2:] == (123.4, 20, 90, LockState.UNLOCKED.value)
+
+    # The disconnected bike is recorded with every field missing
+    failed = [record for record in records[2:] if record.bike == bike_id("bike-2")]
+    assert failed[0][2:] == (None, None, None, None)
+
+
+@pytest.mark.asyncio
+async def test_recorder_run(tmp_path, clients):
+    with TelemetryWriter(str(tmp_path)) as writer:
+        recorder = TelemetryRecorder(writer, interval=0.01)
+        recorder.add("bike-1", clients["bike-1"])
+
+        task = asyncio.create_task(recorder.run())
+        await asyncio.sleep(0.05)
+        recorder.stop()
+        await task
+
+    assert len(list(log.read_directory(str(tmp_path)))) >= 2
+
+
+@pytest.mark.asyncio
+async def test_recorder_follow(tmp_path, simulator, clients):
+    bike = simulator.bikes["bike-1"]
+    with TelemetryWriter(str(tmp_path)) as writer:
+        recorder = TelemetryRecorder(writer)
+        async with recorder.follow("bike-1", clients["bike-1"]):
+            bike.speed = 12
+            bike.battery_level = 89
+            bike.lock_state = LockState.LOCKED
+
+    records = list(log.read_directory(str(tmp_path)))
+    assert [record[2:] for record in records] == [
+        (None, 12, None, None),
+        (None, 12, 89, None),
+        (None, 12, 89, LockState.LOCKED.value),
+    ]
+
+
+def test_extend_with_packed_records(tmp_path):
+    packed = b"".join(log.pack_record(float(i), 1, speed=i) for i in range(25))
+    assert [record.speed for record in log.unpack_records(packed)] == list(range(25))
+
+    max_bytes = log.HEADER_SIZE + 10 * log.RECORD.size
+    with TelemetryWriter(str(tmp_path), max_bytes=max_bytes) as writer:
+        writer.extend(packed)
+        with pytest.raises(ValueError):
+            writer.extend(packed[:-1])
+
+    assert len(log.log_files(str(tmp_path))) == 3
+    assert [record.speed for record in log.read_directory(str(tmp_path))] == list(range(25))